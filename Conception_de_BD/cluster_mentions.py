@@ -0,0 +1,342 @@
+# cluster_mentions.py
+#
+# Regroupement automatique des mentions de la base de connaissances en concepts.
+# build_kb.py ne fusionne que les mentions identiques en minuscules : "seizures", "Seizure"
+# et "epileptic seizures" restent des concepts distincts. Ici, pour chaque type d'entité :
+#   1. normalisation (minuscules, ponctuation retirée, pluriel simple → singulier) ;
+#   2. blocage : chaque mention reçoit comme clés ses mots et ses n-grammes de caractères
+#      les plus rares ; seules les mentions partageant une clé sont comparées, et les clés
+#      trop fréquentes (blocs de plus de `max_block` mentions) sont ignorées ;
+#   3. similarité cosinus TF-IDF (n-grammes de caractères, matrice creuse), calculée
+#      uniquement pour les paires candidates ;
+#   4. veto : une paire au-dessus du seuil n'est pas fusionnée si les deux formes diffèrent par un
+#      identifiant ("interleukin 1" / "interleukin 2", "caspase 3" / "caspase 7"), par un modificateur
+#      de latéralité, de position, d'évolution ou de négation ("left" / "right hemisphere", "acute" /
+#      "chronic", "no toxic effect"), ou si la forme courte perd la tête de la forme longue
+#      ("exophytic" / "exophytic tumor") : le cosinus de n-grammes de caractères ne voit pas ces écarts ;
+#   5. union-find sur les paires retenues → concepts.
+# Le nombre de paires comparées est borné par n × clés × max_block : le coût reste quasi
+# linéaire dans le nombre de mentions uniques, au lieu de n² pour une comparaison exhaustive.
+
+import re
+import json
+import time
+import argparse
+from pathlib import Path
+from collections import Counter, defaultdict
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from enrichment_engine import write_json_atomic
+
+STOPWORDS = {"of", "the", "and", "in", "on", "to", "with", "for", "by", "a", "an", "or", "at", "from"}
+# modificateurs qui changent le concept désigné : latéralité, position, évolution, sévérité, négation
+MODIFIERS = {
+    "left", "right", "bilateral", "unilateral", "contralateral", "ipsilateral",
+    "upper", "lower", "anterior", "posterior", "superior", "inferior", "medial", "lateral",
+    "proximal", "distal", "internal", "external",
+    "acute", "chronic", "subacute", "primary", "secondary", "benign", "malignant",
+    "mild", "moderate", "severe", "high", "higher", "low",
+    "no", "non", "not", "anti", "without",
+}
+_NON_WORD = re.compile(r"[^\w\s]+")
+# identifiants : nombres, chiffres romains et lettres isolées ("il 6", "stage iii", "hepatitis c", "interferon α")
+_NUMBER = re.compile(r"\d+")
+_MARKER_TOKEN = re.compile(r"^(?:[ivx]+|[^\W\d_])$")
+
+
+def singularize(token: str) -> str:
+    """Pluriel anglais simple ("seizures" → "seizure", "arteries" → "artery"), sans toucher à "-ss", "-us", "-is"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def normalize_mention(text: str) -> str:
+    tokens = _NON_WORD.sub(" ", text.lower()).split()
+    return " ".join(singularize(t) for t in tokens)
+
+
+# ════════════════════ BLOCAGE ════════════════════
+
+def char_ngrams(text: str, n: int = 4) -> set:
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+def blocking_keys(mentions: list, n: int = 4, rare_ngrams: int = 3) -> list:
+    """
+    Clés de blocage de chaque mention normalisée : ses mots (hors mots vides) et ses
+    `rare_ngrams` n-grammes de caractères les moins fréquents dans l'ensemble des mentions
+    (deux mentions proches partagent presque toujours un de leurs n-grammes rares).
+    """
+    grams = [char_ngrams(m, n) for m in mentions]
+    df = Counter(g for gs in grams for g in gs)
+    keys = []
+    for mention, gs in zip(mentions, grams):
+        words = {f"w:{w}" for w in mention.split() if w not in STOPWORDS and len(w) > 2}
+        rare = sorted(gs, key=lambda g: (df[g], g))[:rare_ngrams]
+        keys.append(words | {f"c:{g}" for g in rare})
+    return keys
+
+
+def candidate_pairs(keys: list, max_block: int = 100) -> tuple:
+    """Paires (i < j) partageant au moins une clé de bloc ; les blocs trop grands sont ignorés."""
+    blocks = defaultdict(list)
+    for i, ks in enumerate(keys):
+        for k in ks:
+            blocks[k].append(i)
+    n = len(keys)
+    codes, skipped = [], 0
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) > max_block:
+            skipped += 1
+            continue
+        members = np.asarray(members, dtype=np.int64)
+        a, b = np.triu_indices(len(members), k=1)
+        codes.append(members[a] * n + members[b])
+    if not codes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), skipped
+    codes = np.unique(np.concatenate(codes))  # une paire présente dans plusieurs blocs n'est gardée qu'une fois
+    return codes // n, codes % n, skipped
+
+
+# ════════════════════ VETO ════════════════════
+
+def form_signature(form: str) -> tuple:
+    """(identifiants, modificateurs, mots pleins, tête) d'une forme normalisée."""
+    tokens = [t for t in form.split() if t != "s"]  # "s" : reste du génitif ("patient's")
+    markers = set(_NUMBER.findall(form)) | {t for t in tokens if _MARKER_TOKEN.match(t)}
+    content = [t for t in tokens if t not in STOPWORDS and t not in markers and not t.isdigit()]
+    # tête : dernier mot plein avant un éventuel "of" ("polyp of the vocal fold" → "polyp")
+    before_of = tokens[:tokens.index("of", 1)] if "of" in tokens[1:] else tokens
+    heads = [t for t in before_of if t in content]
+    return frozenset(markers), frozenset(content) & MODIFIERS, frozenset(content), heads[-1] if heads else None
+
+
+def veto_reason(a: tuple, b: tuple):
+    """Motif de refus de fusion de deux signatures ("marker", "modifier", "head"), None si la fusion est permise."""
+    if a[0] != b[0]:
+        return "marker"
+    if a[1] != b[1]:
+        return "modifier"
+    if (a[2] < b[2] or b[2] < a[2]) and a[3] != b[3]:
+        return "head"
+    return None
+
+
+# ════════════════════ SIMILARITÉ + UNION-FIND ════════════════════
+
+def pair_similarity(matrix, left: np.ndarray, right: np.ndarray, batch: int = 200_000) -> np.ndarray:
+    """Cosinus des paires (lignes L2-normalisées) : produit terme à terme des lignes creuses, par lots."""
+    sims = np.empty(len(left), dtype=np.float32)
+    for start in range(0, len(left), batch):
+        a, b = left[start:start + batch], right[start:start + batch]
+        sims[start:start + batch] = np.asarray(matrix[a].multiply(matrix[b]).sum(axis=1)).ravel()
+    return sims
+
+
+def union_find(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Racine de chaque élément après fusion des paires (compression de chemin, union par taille)."""
+    parent = list(range(n))
+    size = [1] * n
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            if size[ra] < size[rb]:
+                ra, rb = rb, ra
+            parent[rb] = ra
+            size[ra] += size[rb]
+    return np.array([find(x) for x in range(n)], dtype=np.int64)
+
+
+def cluster_mentions(mentions: list, threshold: float = 0.85, max_block: int = 100,
+                     rare_ngrams: int = 3, ngram_range=(2, 4)) -> dict:
+    """
+    Regroupe une liste de mentions (d'un même type). Retourne les racines union-find
+    (`roots[i]` : représentant du groupe de la mention i) et les statistiques de la passe.
+    """
+    t0 = time.perf_counter()
+    normalized = [normalize_mention(m) for m in mentions]
+    # les mentions de même forme normalisée sont fusionnées d'office
+    form_list = list(dict.fromkeys(normalized))
+    form_index = {form: k for k, form in enumerate(form_list)}
+    form_of = np.array([form_index[f] for f in normalized], dtype=np.int64)
+
+    keys = blocking_keys(form_list, rare_ngrams=rare_ngrams)
+    left, right, skipped = candidate_pairs(keys, max_block)
+    matrix = TfidfVectorizer(analyzer="char_wb", ngram_range=ngram_range, sublinear_tf=True).fit_transform(form_list) \
+        if form_list else None
+    sims = pair_similarity(matrix, left, right) if len(left) else np.empty(0, dtype=np.float32)
+    keep = sims >= threshold
+    signatures, vetoed = {}, []
+    for p in np.flatnonzero(keep).tolist():
+        a, b = int(left[p]), int(right[p])
+        for k in (a, b):
+            if k not in signatures:
+                signatures[k] = form_signature(form_list[k])
+        reason = veto_reason(signatures[a], signatures[b])
+        if reason:
+            keep[p] = False
+            vetoed.append({"a": form_list[a], "b": form_list[b], "cosine": round(float(sims[p]), 4), "reason": reason})
+    form_roots = union_find(len(form_list), left[keep], right[keep])
+    roots = form_roots[form_of]
+
+    n_forms = len(form_list)
+    stats = {
+        "mentions": len(mentions),
+        "normalized_forms": n_forms,
+        "candidate_pairs": int(len(left)),
+        "all_pairs": n_forms * (n_forms - 1) // 2,
+        "skipped_blocks": skipped,
+        "merged_pairs": int(keep.sum()),
+        "vetoed_pairs": len(vetoed),
+        **{f"vetoed_{reason}": sum(v["reason"] == reason for v in vetoed) for reason in ("marker", "modifier", "head")},
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return {"roots": roots, "stats": stats, "matrix": matrix, "form_of": form_of, "vetoed": vetoed}
+
+
+def cluster_quality(result: dict) -> dict:
+    """
+    Taille des groupes et cohésion : pour chaque groupe fusionné, cosinus de sa forme la plus
+    éloignée au centroïde du groupe (minimum et moyenne sur les groupes). Une cohésion basse
+    signale un enchaînement de fusions (A~B, B~C, mais A et C éloignés).
+    """
+    matrix, form_of, roots = result["matrix"], result["form_of"], result["roots"]
+    form_roots = np.empty(matrix.shape[0], dtype=np.int64)
+    form_roots[form_of] = roots
+    _, labels, sizes = np.unique(form_roots, return_inverse=True, return_counts=True)
+    multi = sizes[labels] > 1
+    order = np.argsort(labels, kind="stable")
+    bounds = np.r_[0, np.cumsum(sizes)]
+    cohesion = []
+    for c in np.flatnonzero(sizes > 1):
+        rows = matrix[order[bounds[c]:bounds[c + 1]]]
+        centroid = np.asarray(rows.mean(axis=0)).ravel()
+        centroid /= np.linalg.norm(centroid) or 1.0
+        cohesion.append(float((rows @ centroid).min()))
+    return {
+        "clusters": int(len(sizes)),
+        "singletons": int((sizes == 1).sum()),
+        "merged_clusters": int((sizes > 1).sum()),
+        "forms_in_merged_clusters": int(multi.sum()),
+        "largest_cluster": int(sizes.max()) if len(sizes) else 0,
+        "mean_cluster_size": round(float(sizes.mean()), 3) if len(sizes) else 0.0,
+        "min_cohesion": round(min(cohesion), 4) if cohesion else None,
+        "mean_min_cohesion": round(float(np.mean(cohesion)), 4) if cohesion else None,
+    }
+
+
+# ════════════════════ KB ════════════════════
+
+def mention_counts(documents: list) -> Counter:
+    """Fréquence de chaque (mention en minuscules, code) dans un corpus au format fulldata.json."""
+    counts = Counter()
+    for doc in documents:
+        for entity in doc.get("entities", []):
+            text, code = entity.get("entity", "").strip(), entity.get("code_entity", "").strip()
+            if text and code:
+                counts[(text.lower(), code)] += 1
+    return counts
+
+
+def cluster_knowledge_base(knowledge_base: list, counts: Counter = None, threshold: float = 0.85,
+                           max_block: int = 100) -> tuple:
+    """
+    Fusionne les concepts d'un même type dont les labels tombent dans le même groupe.
+    Le concept fusionné garde le plus petit kb_id du groupe (les identifiants existants ne
+    sont pas renumérotés), prend pour label la mention la plus fréquente (puis la plus courte)
+    et réunit synonymes, définitions et concepts liés.
+    Retourne (nouvelle KB, rapport par type, liste des groupes fusionnés, paires refusées par le veto).
+    """
+    counts = counts or Counter()
+    by_type = defaultdict(list)
+    for concept in knowledge_base:
+        by_type[concept["type"]].append(concept)
+
+    merged_kb, report, groups, vetoed = [], {}, [], []
+    for entity_type, concepts in sorted(by_type.items()):
+        result = cluster_mentions([c["label"] for c in concepts], threshold, max_block)
+        report[entity_type] = {**result["stats"], **cluster_quality(result)}
+        vetoed += [{"type": entity_type, **v} for v in result["vetoed"]]
+        members = defaultdict(list)
+        for concept, root in zip(concepts, result["roots"].tolist()):
+            members[root].append(concept)
+
+        for group in members.values():
+            if len(group) == 1:
+                merged_kb.append(group[0])
+                continue
+            group.sort(key=lambda c: c["kb_id"])
+            head = max(group, key=lambda c: (counts[(c["label"].lower(), entity_type)], -len(c["label"])))
+            definitions = [c.get("definition", "") for c in [head] + group if c.get("definition")]
+            related, seen = [], set()
+            for c in group:
+                for r in c.get("related_concepts", []):
+                    key = (r.get("label"), r.get("type"))
+                    if key not in seen:
+                        seen.add(key)
+                        related.append(r)
+            merged_kb.append({
+                "kb_id": group[0]["kb_id"],
+                "label": head["label"],
+                "type": entity_type,
+                "synonyms": sorted({s for c in group for s in c.get("synonyms", [])} | {c["label"] for c in group}),
+                "definition": definitions[0] if definitions else "",
+                "related_concepts": related,
+            })
+            groups.append({"kb_id": group[0]["kb_id"], "type": entity_type, "label": head["label"],
+                           "merged_kb_ids": [c["kb_id"] for c in group], "labels": [c["label"] for c in group]})
+
+    merged_kb.sort(key=lambda c: c["kb_id"])
+    return merged_kb, report, groups, vetoed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regroupement des mentions de la KB en concepts (blocage + union-find)")
+    parser.add_argument("--input", type=Path, default=Path("knowledge_base.json"))
+    parser.add_argument("--output", type=Path, default=Path("knowledge_base_clustered.json"))
+    parser.add_argument("--data", type=Path, default=None,
+                        help="corpus au format fulldata.json, pour choisir le label le plus fréquent")
+    parser.add_argument("--threshold", type=float, default=0.85, help="cosinus minimal pour fusionner deux mentions")
+    parser.add_argument("--max-block", type=int, default=100, help="taille au-delà de laquelle un bloc est ignoré")
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8") as f:
+        knowledge_base = json.load(f)
+    counts = None
+    if args.data:
+        with open(args.data, encoding="utf-8") as f:
+            counts = mention_counts(json.load(f))
+
+    t0 = time.perf_counter()
+    clustered, report, groups, vetoed = cluster_knowledge_base(knowledge_base, counts, args.threshold, args.max_block)
+    elapsed = time.perf_counter() - t0
+
+    for entity_type, stats in report.items():
+        print(f"  {entity_type:<18} {stats['mentions']:>5} mentions → {stats['clusters']:>5} concepts  "
+              f"({stats['candidate_pairs']} paires comparées sur {stats['all_pairs']}, "
+              f"{stats['vetoed_pairs']} refusées, cohésion min {stats['min_cohesion']}, {stats['seconds']} s)")
+    print(f"{len(knowledge_base)} concepts → {len(clustered)} après regroupement ({elapsed:.2f} s)")
+
+    write_json_atomic(clustered, args.output)
+    report_path = args.output.with_suffix(".report.json")
+    write_json_atomic({"params": vars(args) | {"input": str(args.input), "output": str(args.output),
+                                               "data": str(args.data) if args.data else None},
+                       "types": report, "groups": groups, "vetoed": vetoed}, report_path)
+    print(f"KB regroupée : {args.output}  |  rapport : {report_path}")
@@ -0,0 +1,252 @@
+# enrichment_engine.py
+#
+# Moteur d'enrichissement asynchrone de la base de connaissances par un LLM :
+#   - client interchangeable (Gemini, HTTP générique, serveur simulé) : tout objet exposant
+#     `async generate(prompt) -> str` et un attribut `name` ;
+#   - nombre de requêtes simultanées borné (sémaphore) et débit limité (seau à jetons) ;
+#   - reprise sur erreurs transitoires (429, 5xx, délai dépassé) avec attente exponentielle + aléa ;
+#   - cache des réponses indexé par le hash (modèle + prompt), en JSONL ajouté au fil de l'eau ;
+#   - point de reprise : chaque concept traité est ajouté immédiatement à un JSONL ; une relance
+#     ne retraite que les concepts absents (un arrêt brutal ne perd que les requêtes en vol).
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import tempfile
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+
+class TransientError(Exception):
+    """Erreur qui justifie une nouvelle tentative (quota, surcharge, délai)."""
+
+
+# ════════════════════ CLIENTS ════════════════════
+
+class HttpClient:
+    """POST JSON {"prompt": ...} → {"text": ...} (ex. stub_llm_server.py), via un thread par requête."""
+
+    def __init__(self, url: str, timeout: float = 30.0, name: str = "http"):
+        self.url, self.timeout, self.name = url, timeout, name
+
+    def _post(self, prompt: str) -> str:
+        request = urllib.request.Request(self.url, data=json.dumps({"prompt": prompt}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())["text"]
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise TransientError(f"HTTP {e.code}") from e
+            raise
+        except (urllib.error.URLError, TimeoutError) as e:
+            raise TransientError(str(e)) from e
+
+    async def generate(self, prompt: str) -> str:
+        return await asyncio.to_thread(self._post, prompt)
+
+
+class GeminiClient:
+    """google.generativeai en mode asynchrone ; quotas et indisponibilités → TransientError."""
+
+    def __init__(self, model_name: str = "gemini-2.0-flash", api_key: str = None):
+        import google.generativeai as genai
+        if api_key or os.environ.get("GOOGLE_API_KEY"):
+            genai.configure(api_key=api_key or os.environ["GOOGLE_API_KEY"])
+        self.model = genai.GenerativeModel(model_name)
+        self.name = model_name
+
+    async def generate(self, prompt: str) -> str:
+        from google.api_core import exceptions
+        try:
+            response = await self.model.generate_content_async(prompt)
+        except (exceptions.ResourceExhausted, exceptions.ServiceUnavailable,
+                exceptions.DeadlineExceeded, exceptions.InternalServerError) as e:
+            raise TransientError(str(e)) from e
+        return response.text
+
+
+# ════════════════════ DÉBIT ════════════════════
+
+class TokenBucket:
+    """Au plus `rate` requêtes par seconde en moyenne, rafales jusqu'à `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# ════════════════════ PROMPT / RÉPONSE ════════════════════
+
+def build_prompt(concept: dict) -> str:
+    label = concept.get("label", "Concept Inconnu")
+    concept_type = concept.get("type", "Non Spécifié")
+    synonyms = ", ".join(concept.get("synonyms", []))
+    return (
+        f"Fournis une brève définition encyclopédique pour le concept médical/scientifique '{label}' "
+        f"(type : {concept_type}, synonymes : {synonyms}). "
+        "Inclue également 3 à 5 concepts étroitement liés à celui-ci, avec leur 'label' et 'type' si possible. "
+        "La réponse doit être au format JSON avec les clés 'definition' (string) et 'related_concepts' (liste de dictionnaires). "
+        "Chaque dictionnaire dans 'related_concepts' doit avoir 'label' et 'type' (ex: {\"label\": \"Épilepsie\", \"type\": \"DISO\"}).\n"
+        "Assure-toi que la réponse est un JSON valide et propre, sans aucun texte supplémentaire avant ou après le bloc JSON.\n"
+        "Exemple de format JSON attendu:\n"
+        "{\n"
+        "  \"definition\": \"Une brève explication du concept ici.\",\n"
+        "  \"related_concepts\": [\n"
+        "    {\"label\": \"Concept lié 1\", \"type\": \"TYPE_DU_CONCEP\"},\n"
+        "    {\"label\": \"Concept lié 2\", \"type\": \"TYPE_DU_CONCEP\"}\n"
+        "  ]\n"
+        "}"
+    )
+
+
+def parse_response(text: str) -> dict:
+    """Retire les balises ```json éventuelles ; lève json.JSONDecodeError si le contenu n'est pas du JSON."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[len("```json"):].strip()
+    if text.endswith("```"):
+        text = text[:-len("```")].strip()
+    data = json.loads(text)
+    return {"definition": data.get("definition", ""), "related_concepts": data.get("related_concepts", [])}
+
+
+def prompt_hash(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+# ════════════════════ FICHIERS JSONL ════════════════════
+
+def read_jsonl(path: Path) -> list:
+    """Lignes valides d'un JSONL ; une dernière ligne tronquée (arrêt brutal) est ignorée."""
+    if not path.exists():
+        return []
+    records = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def append_jsonl(f, record: dict):
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+
+
+# ════════════════════ MOTEUR ════════════════════
+
+async def _call_with_retries(client, prompt: str, bucket: TokenBucket, stats: dict,
+                             max_retries: int, base_delay: float, max_delay: float) -> str:
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        try:
+            stats["calls"] += 1
+            return await client.generate(prompt)
+        except TransientError:
+            if attempt == max_retries:
+                raise
+            stats["retries"] += 1
+            # attente exponentielle avec aléa complet (évite que les requêtes repartent ensemble)
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+async def enrich_concepts(concepts: list, client, checkpoint_path: Path, cache_path: Path,
+                          concurrency: int = 8, rate: float = 5.0, max_retries: int = 5,
+                          base_delay: float = 1.0, max_delay: float = 30.0, retry_failed: bool = False) -> dict:
+    """
+    Enrichit les concepts absents du point de reprise et ajoute chaque résultat
+    ({"kb_id", "status", "definition", "related_concepts"}) au JSONL dès qu'il arrive.
+    Retourne les statistiques (appels, reprises, cache, échecs).
+    """
+    done = {r["kb_id"]: r for r in read_jsonl(checkpoint_path)}
+    if retry_failed:
+        done = {kb_id: r for kb_id, r in done.items() if r["status"] == "ok"}
+    cache = {r["hash"]: r["text"] for r in read_jsonl(cache_path)}
+    todo = [c for c in concepts if c["kb_id"] not in done]
+    stats = {"todo": len(todo), "skipped": len(concepts) - len(todo), "calls": 0, "retries": 0,
+             "cache_hits": 0, "ok": 0, "failed": 0}
+    print(f"  {len(todo)} concepts à enrichir ({stats['skipped']} déjà traités, {len(cache)} réponses en cache)")
+
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    bucket = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    with checkpoint_path.open("a", encoding="utf-8") as checkpoint, cache_path.open("a", encoding="utf-8") as cache_f:
+        async def process(concept):
+            prompt = build_prompt(concept)
+            key = prompt_hash(prompt, client.name)
+            record = {"kb_id": concept["kb_id"]}
+            async with semaphore:
+                try:
+                    if key in cache:
+                        stats["cache_hits"] += 1
+                        text = cache[key]
+                    else:
+                        text = await _call_with_retries(client, prompt, bucket, stats,
+                                                        max_retries, base_delay, max_delay)
+                    parsed = parse_response(text)
+                    if key not in cache:
+                        cache[key] = text  # seules les réponses exploitables sont mises en cache
+                        append_jsonl(cache_f, {"hash": key, "text": text})
+                    record.update(status="ok", **parsed)
+                    stats["ok"] += 1
+                except json.JSONDecodeError as e:
+                    record.update(status="bad_json", error=str(e))
+                    stats["failed"] += 1
+                except Exception as e:
+                    record.update(status="error", error=f"{type(e).__name__}: {e}")
+                    stats["failed"] += 1
+            append_jsonl(checkpoint, record)
+            finished = stats["ok"] + stats["failed"]
+            if finished % 100 == 0:
+                print(f"  {finished}/{len(todo)} ({time.perf_counter() - started:.1f} s)")
+
+        await asyncio.gather(*(process(c) for c in todo))
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def merge_checkpoint(knowledge_base: list, checkpoint_path: Path) -> list:
+    """Applique les enrichissements réussis du point de reprise (le dernier l'emporte) à la KB."""
+    results = {r["kb_id"]: r for r in read_jsonl(checkpoint_path) if r["status"] == "ok"}
+    merged = []
+    for concept in knowledge_base:
+        result = results.get(concept["kb_id"])
+        if result:
+            concept = {**concept, "definition": result["definition"], "related_concepts": result["related_concepts"]}
+        merged.append(concept)
+    return merged
+
+
+def write_json_atomic(data, path: Path):
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
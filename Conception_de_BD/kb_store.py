@@ -0,0 +1,278 @@
+# kb_store.py
+#
+# Stockage SQLite de la base de connaissances, à la place des deux gros fichiers JSON :
+#   - concepts (kb_id, type, label, definition), index sur type ;
+#   - synonyms et related_concepts, une ligne par élément ;
+#   - concept_keys : forme en minuscules + type → kb_id (la clé de regroupement de build_kb.py) ;
+#   - id_counters : prochain numéro par type. Un kb_id attribué n'est jamais réutilisé ni renuméroté :
+#     les ajouts incrémentaux (nouveaux documents) ne décalent pas les identifiants existants ;
+#   - kb_fts : index plein texte FTS5 sur label, synonymes et définition.
+# L'export reproduit le format de knowledge_base(_enriched).json.
+
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+
+from enrichment_engine import write_json_atomic
+
+DB_PATH = Path("knowledge_base.sqlite")
+
+ENTITY_TYPES = {
+    "DISO":  ["disease", "disorder", "syndrome", "pathology"],
+    "CHEM":  ["chemical", "compound", "substance", "medication", "drug"],
+    "DEVICE": ["device", "apparatus", "equipment"],
+    "LABPROC": ["procedure", "test", "examination"],
+    "PHYS":  ["physiology", "biological process", "bodily function"],
+    "ANATOMY": ["anatomy", "body part", "organ"],
+    "FINDING": ["finding", "observation", "result"],
+    "INJURY_POISONING": ["injury", "poisoning", "tension of ligaments"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS concepts (
+    kb_id      TEXT PRIMARY KEY,
+    type       TEXT NOT NULL,
+    label      TEXT NOT NULL,
+    definition TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_concepts_type ON concepts(type);
+CREATE TABLE IF NOT EXISTS synonyms (
+    kb_id   TEXT NOT NULL REFERENCES concepts(kb_id) ON DELETE CASCADE,
+    synonym TEXT NOT NULL,
+    PRIMARY KEY (kb_id, synonym)
+);
+CREATE INDEX IF NOT EXISTS idx_synonyms_synonym ON synonyms(synonym COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS related_concepts (
+    kb_id    TEXT NOT NULL REFERENCES concepts(kb_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    label    TEXT,
+    type     TEXT,
+    PRIMARY KEY (kb_id, position)
+);
+CREATE TABLE IF NOT EXISTS concept_keys (
+    norm_key TEXT NOT NULL,
+    type     TEXT NOT NULL,
+    kb_id    TEXT NOT NULL REFERENCES concepts(kb_id) ON DELETE CASCADE,
+    PRIMARY KEY (norm_key, type)
+);
+CREATE TABLE IF NOT EXISTS id_counters (
+    type TEXT PRIMARY KEY,
+    next INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS kb_fts USING fts5(kb_id UNINDEXED, label, synonyms, definition);
+"""
+
+
+def connect(db_path: Path = DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def normalize_key(text: str) -> str:
+    """Clé de regroupement de build_kb.py : texte nettoyé, en minuscules."""
+    return text.strip().lower()
+
+
+# ════════════════════ ÉCRITURE ════════════════════
+
+def _bump_counter(conn, entity_type: str, at_least: int):
+    conn.execute("INSERT INTO id_counters (type, next) VALUES (?, ?) "
+                 "ON CONFLICT(type) DO UPDATE SET next = MAX(next, excluded.next)", (entity_type, at_least))
+
+
+def allocate_kb_id(conn, entity_type: str) -> str:
+    """Prochain identifiant du type (DISO_000, DISO_001, ...), jamais réattribué."""
+    row = conn.execute("SELECT next FROM id_counters WHERE type = ?", (entity_type,)).fetchone()
+    number = row[0] if row else 0
+    _bump_counter(conn, entity_type, number + 1)
+    return f"{entity_type}_{str(number).zfill(3)}"
+
+
+def _refresh_fts(conn, kb_id: str):
+    conn.execute("DELETE FROM kb_fts WHERE kb_id = ?", (kb_id,))
+    conn.execute("""
+        INSERT INTO kb_fts (kb_id, label, synonyms, definition)
+        SELECT c.kb_id, c.label, COALESCE((SELECT group_concat(synonym, ' | ') FROM synonyms s WHERE s.kb_id = c.kb_id), ''),
+               c.definition
+        FROM concepts c WHERE c.kb_id = ?""", (kb_id,))
+
+
+def upsert_concept(conn, concept: dict):
+    """
+    Insère ou remplace un concept au format JSON de la KB (kb_id, label, type, synonyms,
+    definition, related_concepts). Le compteur du type est avancé au-delà de son numéro.
+    """
+    kb_id, entity_type = concept["kb_id"], concept["type"]
+    conn.execute("INSERT INTO concepts (kb_id, type, label, definition) VALUES (?, ?, ?, ?) "
+                 "ON CONFLICT(kb_id) DO UPDATE SET type = excluded.type, label = excluded.label, "
+                 "definition = excluded.definition",
+                 (kb_id, entity_type, concept["label"], concept.get("definition", "")))
+    conn.execute("DELETE FROM synonyms WHERE kb_id = ?", (kb_id,))
+    conn.executemany("INSERT OR IGNORE INTO synonyms (kb_id, synonym) VALUES (?, ?)",
+                     [(kb_id, s) for s in concept.get("synonyms", [])])
+    conn.execute("DELETE FROM related_concepts WHERE kb_id = ?", (kb_id,))
+    conn.executemany("INSERT INTO related_concepts (kb_id, position, label, type) VALUES (?, ?, ?, ?)",
+                     [(kb_id, i, r.get("label"), r.get("type"))
+                      for i, r in enumerate(concept.get("related_concepts", []))])
+    # la clé de regroupement est celle du label (build_kb.py : premier texte rencontré)
+    conn.execute("INSERT OR IGNORE INTO concept_keys (norm_key, type, kb_id) VALUES (?, ?, ?)",
+                 (normalize_key(concept["label"]), entity_type, kb_id))
+    suffix = kb_id.rsplit("_", 1)[-1]
+    if kb_id.startswith(f"{entity_type}_") and suffix.isdigit():
+        _bump_counter(conn, entity_type, int(suffix) + 1)
+    _refresh_fts(conn, kb_id)
+
+
+def import_json(conn, knowledge_base: list) -> int:
+    """Charge une KB au format JSON (knowledge_base.json ou la version enrichie)."""
+    with conn:
+        for concept in knowledge_base:
+            upsert_concept(conn, concept)
+    return len(knowledge_base)
+
+
+def add_mention(conn, text: str, entity_type: str) -> tuple:
+    """
+    Rattache une mention à son concept (même clé en minuscules, même type) ou crée un concept
+    avec un nouvel identifiant. Retourne (kb_id, créé ?).
+    """
+    key = normalize_key(text)
+    row = conn.execute("SELECT kb_id FROM concept_keys WHERE norm_key = ? AND type = ?", (key, entity_type)).fetchone()
+    created = row is None
+    if created:
+        kb_id = allocate_kb_id(conn, entity_type)
+        conn.execute("INSERT INTO concepts (kb_id, type, label) VALUES (?, ?, ?)", (kb_id, entity_type, text.strip()))
+        conn.execute("INSERT INTO concept_keys (norm_key, type, kb_id) VALUES (?, ?, ?)", (key, entity_type, kb_id))
+    else:
+        kb_id = row[0]
+    inserted = conn.execute("INSERT OR IGNORE INTO synonyms (kb_id, synonym) VALUES (?, ?)",
+                            (kb_id, text.strip())).rowcount
+    if created or inserted:
+        _refresh_fts(conn, kb_id)
+    return kb_id, created
+
+
+def add_documents(conn, documents: list, entity_types: dict = None) -> dict:
+    """
+    Ajout incrémental (même logique que build_kb.build_knowledge_base) : mentions des documents,
+    puis synonymes de ENTITY_TYPES. Les concepts existants gardent leur kb_id.
+    """
+    stats = {"mentions": 0, "new_concepts": 0}
+    with conn:
+        for doc in documents:
+            for entity in doc.get("entities", []):
+                text, code = entity.get("entity", "").strip(), entity.get("code_entity", "").strip()
+                if not text or not code:
+                    continue
+                stats["mentions"] += 1
+                stats["new_concepts"] += add_mention(conn, text, code)[1]
+        for entity_type, synonyms in (entity_types or {}).items():
+            for synonym in synonyms:
+                stats["new_concepts"] += add_mention(conn, synonym, entity_type)[1]
+    return stats
+
+
+# ════════════════════ LECTURE ════════════════════
+
+def _concepts(conn, where: str = "", params=()) -> list:
+    rows = conn.execute(f"SELECT kb_id, label, type, definition FROM concepts {where} ORDER BY kb_id", params).fetchall()
+    ids = [row[0] for row in rows]
+    synonyms, related = {kb_id: [] for kb_id in ids}, {kb_id: [] for kb_id in ids}
+    if ids:
+        marks = ",".join("?" * len(ids)) if len(ids) < 900 else None
+        filt = f"WHERE kb_id IN ({marks})" if marks else ""
+        args = ids if marks else ()
+        for kb_id, synonym in conn.execute(f"SELECT kb_id, synonym FROM synonyms {filt} ORDER BY kb_id, synonym", args):
+            if kb_id in synonyms:
+                synonyms[kb_id].append(synonym)
+        for kb_id, label, entity_type in conn.execute(
+                f"SELECT kb_id, label, type FROM related_concepts {filt} ORDER BY kb_id, position", args):
+            if kb_id in related:
+                related[kb_id].append({"label": label, "type": entity_type})
+    return [{"kb_id": kb_id, "label": label, "type": entity_type, "synonyms": synonyms[kb_id],
+             "definition": definition, "related_concepts": related[kb_id]}
+            for kb_id, label, entity_type, definition in rows]
+
+
+def get_concept(conn, kb_id: str) -> dict:
+    found = _concepts(conn, "WHERE kb_id = ?", (kb_id,))
+    return found[0] if found else None
+
+
+def concepts_of_type(conn, entity_type: str) -> list:
+    return _concepts(conn, "WHERE type = ?", (entity_type,))
+
+
+def lookup(conn, text: str, entity_type: str = None) -> list:
+    """kb_id dont un synonyme est égal à `text` (sans casse), via l'index des synonymes."""
+    sql = ("SELECT DISTINCT s.kb_id FROM synonyms s JOIN concepts c ON c.kb_id = s.kb_id "
+           "WHERE s.synonym = ? COLLATE NOCASE")
+    params = [text.strip()]
+    if entity_type:
+        sql += " AND c.type = ?"
+        params.append(entity_type)
+    return [row[0] for row in conn.execute(sql + " ORDER BY s.kb_id", params)]
+
+
+def search(conn, query: str, entity_type: str = None, limit: int = 10, raw: bool = False) -> list:
+    """
+    Recherche plein texte (FTS5, classement bm25) dans labels, synonymes et définitions.
+    Par défaut la requête est cherchée comme une phrase ; raw=True passe la syntaxe FTS5 telle quelle.
+    """
+    match = query if raw else '"' + query.replace('"', '""') + '"'
+    sql = ("SELECT f.kb_id, c.type, c.label, bm25(kb_fts) AS score FROM kb_fts f "
+           "JOIN concepts c ON c.kb_id = f.kb_id WHERE kb_fts MATCH ?")
+    params = [match]
+    if entity_type:
+        sql += " AND c.type = ?"
+        params.append(entity_type)
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+    return [{"kb_id": kb_id, "type": t, "label": label, "score": round(score, 4)}
+            for kb_id, t, label, score in conn.execute(sql, params)]
+
+
+def export_json(conn, output_path: Path = None) -> list:
+    """KB complète au format JSON actuel, triée par kb_id ; écriture atomique si un chemin est donné."""
+    knowledge_base = _concepts(conn)
+    if output_path:
+        write_json_atomic(knowledge_base, Path(output_path))
+    return knowledge_base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Base de connaissances SQLite (FTS5)")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="charge un fichier JSON de KB (ex. knowledge_base_enriched.json)")
+    p.add_argument("path", type=Path)
+    p = sub.add_parser("add-docs", help="ajoute les mentions d'un corpus (format fulldata.json)")
+    p.add_argument("path", type=Path)
+    p.add_argument("--no-config-synonyms", action="store_true", help="n'ajoute pas les synonymes de ENTITY_TYPES")
+    p = sub.add_parser("search", help="recherche plein texte")
+    p.add_argument("query")
+    p.add_argument("--type", default=None)
+    p.add_argument("--limit", type=int, default=10)
+    p = sub.add_parser("export", help="exporte la KB au format JSON")
+    p.add_argument("path", type=Path)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "import":
+        with open(args.path, encoding="utf-8") as f:
+            n = import_json(conn, json.load(f))
+        print(f"{n} concepts importés dans {args.db}")
+    elif args.command == "add-docs":
+        with open(args.path, encoding="utf-8") as f:
+            stats = add_documents(conn, json.load(f), None if args.no_config_synonyms else ENTITY_TYPES)
+        print(f"{stats['mentions']} mentions, {stats['new_concepts']} nouveaux concepts")
+    elif args.command == "search":
+        for hit in search(conn, args.query, args.type, args.limit):
+            print(f"  {hit['kb_id']:<22} {hit['type']:<18} {hit['label']}  ({hit['score']})")
+    elif args.command == "export":
+        print(f"{len(export_json(conn, args.path))} concepts exportés vers {args.path}")
+    conn.close()
@@ -0,0 +1,81 @@
+# stub_llm_server.py
+#
+# Faux serveur LLM local pour tester enrichment_engine.py sans clé API ni quota :
+# latence aléatoire, erreurs 429/503 et réponses non-JSON à des taux configurables.
+#   POST /generate  {"prompt": "..."}  →  {"text": "```json {...} ```"}
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(latency=(0.05, 0.3), error_rate=0.1, malformed_rate=0.02, seed=None):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    stats = {"requests": 0, "errors": 0, "malformed": 0}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            prompt = json.loads(body or b"{}").get("prompt", "")
+            with lock:
+                stats["requests"] += 1
+                delay = rng.uniform(*latency)
+                draw = rng.random()
+            time.sleep(delay)
+
+            if draw < error_rate:
+                with lock:
+                    stats["errors"] += 1
+                status = 429 if draw < error_rate / 2 else 503
+                return self._reply(status, {"error": "simulated failure"})
+            if draw < error_rate + malformed_rate:
+                with lock:
+                    stats["malformed"] += 1
+                return self._reply(200, {"text": "Désolé, je ne peux pas répondre en JSON."})
+
+            # Réponse déterministe pour un prompt donné (le label est repris entre apostrophes)
+            label = prompt.split("'")[1] if prompt.count("'") >= 2 else "concept"
+            payload = {
+                "definition": f"Définition simulée de {label}.",
+                "related_concepts": [{"label": f"{label} (lié)", "type": "FINDING"}],
+            }
+            self._reply(200, {"text": "```json\n" + json.dumps(payload, ensure_ascii=False) + "\n```"})
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    StubHandler.stats = stats
+    return StubHandler
+
+
+def start_stub_server(port=0, **options):
+    """Démarre le serveur dans un thread ; retourne (serveur, url). port=0 : port libre choisi par l'OS."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(**options))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/generate"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur LLM simulé (latence et erreurs configurables)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.05, 0.3), metavar=("MIN", "MAX"))
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--malformed-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(tuple(args.latency), args.error_rate, args.malformed_rate))
+    print(f"Serveur simulé sur http://127.0.0.1:{args.port}/generate")
+    server.serve_forever()
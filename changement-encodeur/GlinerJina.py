@@ -90,70 +90,154 @@ class ManualGLiNER(nn.Module):
         self.label_rnn = nn.LSTM(input_size=768, hidden_size=384, batch_first=True, bidirectional=True).to(self.device)
         self.label_rnn.load_state_dict(load_weights("gliner_label_rnn.pt"))
 
+        # Inference only: disable the Dropout(0.3) layers, otherwise span/label vectors are random
+        self.eval()
+
     def generate_spans(self, seq_len, max_length=10):
         return [(start, end) for start in range(seq_len) for end in range(start, min(seq_len, start + max_length))]
 
-    def predict(self, text, labels, threshold=0.3, max_span_length=10):
-        print("\n=== Step 1: Text Encoding ===")
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512).to(self.device)
-        outputs = self.encoder(**inputs)
-        hidden = outputs.last_hidden_state.squeeze(0)
-        print(f"Text hidden shape: {hidden.shape}")
-        hidden = self.projection(hidden)
-        print(f"Projected hidden shape: {hidden.shape}")
-
-        print("\n=== Step 2: Label Encoding ===")
-        task = "text-matching"
-        label_embeds = self.label_encoder.encode(labels, task=task, prompt_name=task, convert_to_tensor=True).to(torch.float32).unsqueeze(0).to(self.device)
-        print(f"Raw label embeddings shape: {label_embeds.shape}")
-
-        pooled = self.pooler(label_embeds)
-        print(f"Pooled label embeddings shape: {pooled.shape}")
-
-        rnn_out, _ = self.label_rnn(pooled)
-        print(f"LSTM output shape: {rnn_out.shape}")
-        label_vectors = self.prompt_rep_layer(rnn_out.squeeze(0))
-        print(f"Label vectors shape after prompt layer: {label_vectors.shape}")
-
-        print("\n=== Step 3: Span Generation ===")
-        spans = self.generate_spans(hidden.size(0), max_span_length)
-        print(f"Generated {len(spans)} spans")
-
-        span_vectors = []
-        for idx, (start, end) in enumerate(spans):
-            start_vec = hidden[start]
-            end_vec = hidden[end]
-            span_embed = self.span_rep_layer(start_vec.unsqueeze(0), end_vec.unsqueeze(0))
-            span_vectors.append(span_embed)
-            if idx < 1:
-                print(f"Span {start}-{end} embedding shape: {span_embed.shape}")
-
-        span_vectors = torch.cat(span_vectors, dim=0)
-        print(f"All span vectors shape: {span_vectors.shape}")
-
-        print("\n=== Step 4: Similarity Computation ===")
-        scores = torch.matmul(span_vectors, label_vectors.T)
-        print(f"Similarity scores shape: {scores.shape}")
-        probs = torch.sigmoid(scores)
-        print(f"Example probabilities (first 5):\n{probs[:5]}")
-
-        print("\n=== Step 5: Threshold Filtering ===")
-        predictions = []
-        for i, (start, end) in enumerate(spans):
-            for j, label in enumerate(labels):
-                score = probs[i, j].item()
-                if score >= threshold:
-                    token_span = self.tokenizer.convert_ids_to_tokens(inputs["input_ids"][0][start:end + 1])
-                    span_text = self.tokenizer.convert_tokens_to_string(token_span)
-                    prediction = {
-                        "text": span_text,
-                        "start": start,
-                        "end": end,
-                        "label": label,
-                        "score": round(score, 4)
-                    }
-                    print(f"[{label} @ {start}-{end}] → {span_text} (score={score:.4f})")
-                    predictions.append(prediction)
-
-        print(f"\n✅ Total predictions: {len(predictions)}")
-        return predictions
\ No newline at end of file
+    def span_rep(self, hidden, max_span_length=10):
+        """All span representations in one forward: (starts, ends, span vectors), same order as generate_spans."""
+        starts, ends = span_indices(hidden.size(0), max_span_length, hidden.device)
+        return starts, ends, self.span_rep_layer(hidden[starts], hidden[ends])
+
+    def predict(self, text, labels, threshold=0.3, max_span_length=10, verbose=True):
+        log = print if verbose else (lambda *args, **kwargs: None)
+        with torch.inference_mode():
+            log("\n=== Step 1: Text Encoding ===")
+            inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512).to(self.device)
+            outputs = self.encoder(**inputs)
+            hidden = outputs.last_hidden_state.squeeze(0)
+            log(f"Text hidden shape: {hidden.shape}")
+            hidden = self.projection(hidden)
+            log(f"Projected hidden shape: {hidden.shape}")
+
+            log("\n=== Step 2: Label Encoding ===")
+            task = "text-matching"
+            label_embeds = self.label_encoder.encode(labels, task=task, prompt_name=task, convert_to_tensor=True).to(torch.float32).unsqueeze(0).to(self.device)
+            log(f"Raw label embeddings shape: {label_embeds.shape}")
+
+            pooled = self.pooler(label_embeds)
+            log(f"Pooled label embeddings shape: {pooled.shape}")
+
+            rnn_out, _ = self.label_rnn(pooled)
+            log(f"LSTM output shape: {rnn_out.shape}")
+            label_vectors = self.prompt_rep_layer(rnn_out.squeeze(0))
+            log(f"Label vectors shape after prompt layer: {label_vectors.shape}")
+
+            log("\n=== Step 3: Span Representation ===")
+            # start/end vectors gathered with index tensors: one span_rep_layer forward for every span
+            starts, ends, span_vectors = self.span_rep(hidden, max_span_length)
+            log(f"All span vectors shape: {span_vectors.shape} ({len(starts)} spans)")
+
+            log("\n=== Step 4: Similarity Computation ===")
+            probs = torch.sigmoid(torch.matmul(span_vectors, label_vectors.T))
+            log(f"Similarity scores shape: {probs.shape}")
+            log(f"Example probabilities (first 5):\n{probs[:5]}")
+
+            log("\n=== Step 5: Threshold Filtering ===")
+            predictions = decode_predictions(probs, starts, ends, labels, threshold,
+                                             inputs["input_ids"][0], self.tokenizer)
+        for p in predictions:
+            log(f"[{p['label']} @ {p['start']}-{p['end']}] → {p['text']} (score={p['score']:.4f})")
+        log(f"\n✅ Total predictions: {len(predictions)}")
+        return predictions
+
+
+def span_indices(seq_len, max_length=10, device=None):
+    """(starts, ends) of every span of at most max_length tokens, start-major like generate_spans."""
+    offsets = torch.arange(max_length, device=device)
+    starts = torch.arange(seq_len, device=device).repeat_interleave(max_length)
+    ends = starts + offsets.repeat(seq_len)
+    valid = ends < seq_len
+    return starts[valid], ends[valid]
+
+
+def decode_predictions(probs, starts, ends, labels, threshold, input_ids, tokenizer):
+    """Cells above threshold found with one nonzero; only those spans are moved to the CPU and decoded."""
+    rows, cols = (probs >= threshold).nonzero(as_tuple=True)
+    scores = probs[rows, cols].tolist()
+    span_starts, span_ends = starts[rows].tolist(), ends[rows].tolist()
+    tokens = tokenizer.convert_ids_to_tokens(input_ids.tolist())
+    return [
+        {
+            "text": tokenizer.convert_tokens_to_string(tokens[start:end + 1]),
+            "start": start,
+            "end": end,
+            "label": labels[j],
+            "score": round(score, 4),
+        }
+        for start, end, j, score in zip(span_starts, span_ends, cols.tolist(), scores)
+    ]
+
+
+def span_scores_loop(span_rep_layer, hidden, label_vectors, max_span_length=10):
+    """Previous implementation (one span_rep_layer forward per span), kept as the benchmark baseline."""
+    seq_len = hidden.size(0)
+    spans = [(start, end) for start in range(seq_len) for end in range(start, min(seq_len, start + max_span_length))]
+    span_vectors = torch.cat([span_rep_layer(hidden[s].unsqueeze(0), hidden[e].unsqueeze(0)) for s, e in spans], dim=0)
+    probs = torch.sigmoid(torch.matmul(span_vectors, label_vectors.T))
+    cells = []
+    for i, (start, end) in enumerate(spans):
+        for j in range(label_vectors.size(0)):
+            score = probs[i, j].item()
+            cells.append((start, end, j, score))
+    return probs, cells
+
+
+def benchmark_span_scoring(seq_len=512, n_labels=8, max_span_length=10, hidden_size=768, threshold=0.5,
+                           repeats=3, device=None):
+    """
+    Latency of span scoring + threshold decoding, loop vs vectorized, on random hidden states
+    and a randomly initialised SpanMarkerV0 (no weights needed). Checks both give the same cells.
+    """
+    import time
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    torch.manual_seed(0)
+    layer = SpanMarkerV0(hidden_size).to(device).eval()
+    hidden = torch.randn(seq_len, hidden_size, device=device)
+    label_vectors = torch.randn(n_labels, hidden_size, device=device) / hidden_size ** 0.5
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeats):
+            if device == "cuda":
+                torch.cuda.synchronize()
+            t0 = time.perf_counter()
+            result = fn()
+            if device == "cuda":
+                torch.cuda.synchronize()
+            best = min(best, time.perf_counter() - t0)
+        return best, result
+
+    with torch.inference_mode():
+        t_loop, (probs_loop, cells) = timed(lambda: span_scores_loop(layer, hidden, label_vectors, max_span_length))
+        kept_loop = [(s, e, j) for s, e, j, score in cells if score >= threshold]
+
+        def vectorized():
+            starts, ends = span_indices(seq_len, max_span_length, device)
+            probs = torch.sigmoid(layer(hidden[starts], hidden[ends]) @ label_vectors.T)
+            rows, cols = (probs >= threshold).nonzero(as_tuple=True)
+            return probs, list(zip(starts[rows].tolist(), ends[rows].tolist(), cols.tolist()))
+        t_vec, (probs_vec, kept_vec) = timed(vectorized)
+
+    result = {
+        "device": device, "spans": probs_vec.size(0), "labels": n_labels,
+        "loop_ms": round(t_loop * 1000, 1), "vectorized_ms": round(t_vec * 1000, 1),
+        "speedup": round(t_loop / t_vec, 1),
+        "max_abs_diff": float((probs_loop - probs_vec).abs().max()),
+        "same_predictions": kept_loop == kept_vec,
+    }
+    print(result)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark: per-span loop vs vectorized span scoring")
+    parser.add_argument("--seq-len", type=int, default=512)
+    parser.add_argument("--labels", type=int, default=8)
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+    benchmark_span_scoring(args.seq_len, args.labels, args.width, threshold=args.threshold)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# ── BIONNE → corpus JSONL fragmenté, lu directement dans les archives .zip ──────
+import io, json, re, argparse, zipfile
+from pathlib import Path
+from typing  import Dict, Iterator, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+# ──────────────────────────────────────────────
+_DATA = Path(__file__).resolve().parent.parent / "data"
+_TRAIN_ZIP = _DATA / "BioASQ_BIONNE_training_2024.zip"
+_TEST_ZIP = _DATA / "BioASQ_BIONNE_test_2024.zip"
+_OUT_DIR = _DATA / "bionne_jsonl"
+
+_LANGS = ["en", "ru"]
+_SUBSETS = ["train", "dev", "test"]               # test : textes seuls, sans .ann
+_SHARD_SIZE = 200                                 # documents par fichier .jsonl
+
+ID_RE = re.compile(r"^(\d+)")                     # n° avant “_” ou “.”
+# DATASET_BIONNE/en/train/26281196_en.ann  ou  test/en/29377000_en.txt
+MEMBER_RE = re.compile(r"^(?:DATASET_BIONNE/)?(?:test/)?(?P<lang>en|ru)/(?:(?P<split>train|dev)/)?"
+                       r"(?P<name>[^/]+)\.(?P<ext>txt|ann)$")
+
+_ZIP = None                                       # archive ouverte une fois par processus
+
+
+# ══════════════════════════════════════════════
+def list_documents(zip_path: Path) -> Dict[Tuple[str, str], List[Dict]]:
+    """
+    Parcourt l'index de l'archive (sans extraction) et regroupe les paires .txt/.ann
+    par (langue, split), triées par nom de fichier. Les entrées __MACOSX et .DS_Store sont ignorées.
+    """
+    docs = {}
+    with zipfile.ZipFile(zip_path) as zf:
+        for member in zf.namelist():
+            if member.startswith("__MACOSX/"):
+                continue
+            m = MEMBER_RE.match(member)
+            if not m:
+                continue
+            split = m.group("split") or "test"
+            key = (m.group("lang"), split)
+            text_id = ID_RE.match(m.group("name"))
+            if not text_id:
+                print(f"  Nom de fichier inattendu → ignoré : {member}")
+                continue
+            entry = docs.setdefault(key, {}).setdefault(
+                m.group("name"), {"text_id": text_id.group(1), "txt": None, "ann": None})
+            entry[m.group("ext")] = member
+
+    return {key: [entries[name] for name in sorted(entries)] for key, entries in docs.items()}
+
+
+def parse_ann(ann: str, text: str) -> List[Dict]:
+    """
+    Lit le contenu d'un .ann (lignes T uniquement). Une entité discontinue
+    ("T59	LABPROC 1387 1410;1419 1423	...") donne un fragment par segment ;
+    les fragments partagent le même ann_id (T-id) pour pouvoir être recomposés.
+    """
+    ents = []
+    for line in ann.splitlines():
+        if not line.lstrip().startswith("T"):
+            continue
+        tid, infos, _surface = line.rstrip("\n").split("\t")
+        label, *coords = infos.split()
+        for chunk in " ".join(coords).split(";"):
+            start, end = map(int, chunk.split())
+            ents.append({
+                "code_entity": label,
+                "spans": [start, end],
+                "entity": text[start:end],
+                "ann_id": tid,
+            })
+    return ents
+
+
+def _open_zip(zip_path: str):
+    global _ZIP
+    _ZIP = zipfile.ZipFile(zip_path)
+
+
+def _read(member: str) -> str:
+    # mêmes conventions que Path.read_text (utf-8, fins de ligne universelles) : offsets inchangés
+    return io.TextIOWrapper(_ZIP.open(member), encoding="utf-8").read()
+
+
+def _build_document(entry: Dict) -> Dict:
+    """Lit .txt/.ann dans l'archive ouverte par le processus et construit l'exemple."""
+    if entry["txt"] is None:
+        print(f"  .ann sans .txt → ignoré : {entry['ann']}")
+        return None
+    text = _read(entry["txt"])
+    entities = parse_ann(_read(entry["ann"]), text) if entry["ann"] else []
+    return {"text_id": entry["text_id"], "text": text, "entities": entities}
+
+
+def iter_documents(zip_path: Path, entries: List[Dict], workers: int = None) -> Iterator[Dict]:
+    """
+    Documents dans l'ordre des entrées. Chaque processus du pool ouvre l'archive une fois
+    et lit/décode/analyse ses propres membres : seuls les noms de membres transitent.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_zip, initargs=(str(zip_path),)) as pool:
+        chunksize = max(1, len(entries) // (4 * (workers or 8)))
+        for doc in pool.map(_build_document, entries, chunksize=chunksize):
+            if doc is not None:
+                yield doc
+
+
+# ══════════════════════════════════════════════
+def write_shards(docs: Iterator[Dict], out_dir: Path, shard_size: int = _SHARD_SIZE) -> int:
+    """
+    Écrit les documents en JSONL fragmenté (shard-00000.jsonl, ...) et un index
+    text_id → [fichier, offset en octets, longueur] pour l'accès direct à un document.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    index, n, shard = {}, 0, None
+    for doc in docs:
+        if n % shard_size == 0:
+            if shard:
+                shard.close()
+            name = f"shard-{n // shard_size:05d}.jsonl"
+            shard = (out_dir / name).open("wb")
+        line = (json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8")
+        index[doc["text_id"]] = [name, shard.tell(), len(line)]
+        shard.write(line)
+        n += 1
+    if shard:
+        shard.close()
+    (out_dir / "index.json").write_text(json.dumps(index), encoding="utf-8")
+    return n
+
+
+def read_document(out_dir: Path, text_id: str) -> Dict:
+    """Relit un seul document grâce à l'index (seek direct, sans parcourir les shards)."""
+    index = json.loads((out_dir / "index.json").read_text(encoding="utf-8"))
+    name, offset, length = index[text_id]
+    with (out_dir / name).open("rb") as f:
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+
+def iter_shards(out_dir: Path) -> Iterator[Dict]:
+    """Parcourt tous les documents d'un corpus fragmenté, ligne à ligne."""
+    for path in sorted(out_dir.glob("shard-*.jsonl")):
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+# ══════════════════════════════════════════════
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert BIONNE .zip archives into a sharded GLiNER JSONL corpus")
+    parser.add_argument("--train-zip", default=_TRAIN_ZIP, type=Path)
+    parser.add_argument("--test-zip", default=_TEST_ZIP, type=Path)
+    parser.add_argument("--out", default=_OUT_DIR, type=Path, help="dossier de sortie (<lang>_<split>/)")
+    parser.add_argument("--langs", nargs="+", default=_LANGS, choices=_LANGS)
+    parser.add_argument("--splits", nargs="+", default=_SUBSETS, choices=_SUBSETS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=_SHARD_SIZE)
+    parser.add_argument("--fulldata", type=Path, default=None,
+                        help="écrit aussi un corpus JSON unique (format fulldata.json) des splits demandés")
+    args = parser.parse_args()
+
+    full = []
+    for zip_path in (args.train_zip, args.test_zip):
+        if not zip_path.exists():
+            print(f"  Archive absente : {zip_path}")
+            continue
+        for (lang, split), entries in sorted(list_documents(zip_path).items(),
+                                             key=lambda kv: (kv[0][0], _SUBSETS.index(kv[0][1]))):
+            if lang not in args.langs or split not in args.splits:
+                continue
+            docs = iter_documents(zip_path, entries, workers=args.workers)
+            if args.fulldata:
+                docs = list(docs)
+                full.extend(docs)
+            n = write_shards(docs, args.out / f"{lang}_{split}", args.shard_size)
+            print(f"✅ {n} exemples → {args.out / f'{lang}_{split}'}")
+
+    if args.fulldata:
+        args.fulldata.write_text(json.dumps(full, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"✅ {len(full)} exemples → {args.fulldata}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-import re, json, pathlib
+import re, json, time, pathlib, argparse
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from tqdm.auto import tqdm
 
 # ------------------------------------------------------------------
@@ -13,53 +15,172 @@ def tokenize(text: str):
         offsets.append((m.start(), m.end()))
     return tokens, offsets
 
+def alignment_index(offset_table):
+    """Sorted token start / end arrays: tokens never overlap, so both are increasing."""
+    return [s for s, _ in offset_table], [e for _, e in offset_table]
+
+def align_span(char_span, index):
+    """
+    Map a char-level (start, end) span to (start_tok, end_tok) inclusive by binary search:
+      start_tok = first token whose start >= char_start
+      end_tok   = last token whose end <= char_end
+    Same result as the former linear scan. Returns (start_tok, end_tok, None) on success,
+    or (None, None, reason) when the span cannot be aligned.
+    """
+    starts, ends = index
+    c_start, c_end = char_span
+    start_tok = bisect_left(starts, c_start)
+    end_tok = bisect_right(ends, c_end) - 1
+    if start_tok >= len(starts):
+        return None, None, "no token starts at or after span start"
+    if end_tok < 0:
+        return None, None, "no token ends at or before span end"
+    if start_tok > end_tok:
+        return None, None, "span falls inside a single token"
+    return start_tok, end_tok, None
+
 def char_span_to_token_span(char_span, offset_table):
     """Map a char-level (start, end) span to (start_tok, end_tok) inclusive."""
-    c_start, c_end = char_span            
+    start_tok, end_tok, reason = align_span(char_span, alignment_index(offset_table))
+    if reason:
+        raise ValueError(f"Span {char_span} does not align with tokens ({reason}).")
+    return start_tok, end_tok
+
+def _char_span_to_token_span_linear(char_span, offset_table):
+    """Former O(tokens) scan per entity, kept only as the benchmark reference."""
+    c_start, c_end = char_span
     start_tok = end_tok = None
     for idx, (t_start, t_end) in enumerate(offset_table):
-        # First token whose start >= char_start
         if start_tok is None and t_start >= c_start:
             start_tok = idx
-        # Last token whose end <= char_end
         if t_start < c_end and t_end <= c_end:
             end_tok = idx
-    if start_tok is None or end_tok is None:
-        raise ValueError(f"Span {char_span} does not align with tokens.")
     return start_tok, end_tok
 # ------------------------------------------------------------------
 
-SOURCE_FILE = "data.json"   
-DEST_FILE   = "gliner--style.json"
+SOURCE_FILE = "data.json"
+DEST_FILE   = "gliner--style.jsonl"
+LABEL_KEY   = "text"          # entity field used as the GLiNER label
 
+def read_text(path: pathlib.Path) -> str:
+    """UTF-8 first; chardet only on a 64 KB sample if the file is not valid UTF-8."""
+    raw = path.read_bytes()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        import chardet
+        guess = chardet.detect(raw[:65536])["encoding"] or "utf-8"
+        print("Best guess:", guess)
+        return raw.decode(guess, errors="replace")
 
-import chardet
-raw = pathlib.Path(SOURCE_FILE).read_bytes()
-guess = chardet.detect(raw)["encoding"]
-print("Best guess:", guess)
-src_examples = json.loads(raw.decode(guess, errors="replace"))
+def iter_examples(path: pathlib.Path):
+    """Source examples: a JSON array, or JSON Lines read one line at a time."""
+    if path.suffix == ".jsonl":
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from json.loads(read_text(path))
 
-dest_examples = []
-
-for ex in tqdm(src_examples, desc="Converting examples"):
+def convert_example(ex, label_key: str = LABEL_KEY):
+    """Returns ({"tokenized_text", "ner"}, [alignment failures])."""
     tokens, offsets = tokenize(ex["text"])
-    triples = []
+    index = alignment_index(offsets)
+    triples, failures = [], []
 
     for ent in ex["entities"]:
-        label = ent["text"]             
+        label = ent[label_key]
         # Some datasets list multiple (discontinuous) spans in `ent["spans"]`
         spans = (ent["spans"]
                  if isinstance(ent["spans"][0], (list, tuple))
                  else [ent["spans"]])      # normalise to list[list[int,int]]
         for c_start, c_end in spans:
-            t_start, t_end = char_span_to_token_span((c_start, c_end), offsets)
+            t_start, t_end, reason = align_span((c_start, c_end), index)
+            if reason:
+                failures.append({"text_id": ex.get("text_id"), "span": [c_start, c_end],
+                                 "surface": ex["text"][c_start:c_end], "label": label, "reason": reason})
+                continue
             triples.append([t_start, t_end, label])
 
-    dest_examples.append({"tokenized_text": tokens, "ner": triples})
+    return {"tokenized_text": tokens, "ner": triples}, failures
 
-# ------------------------------------------------------------------
-pathlib.Path(DEST_FILE).write_text(
-    json.dumps(dest_examples, ensure_ascii=False, indent=2),
-    encoding="utf-8"      )   
-    
-print(f"  Wrote {len(dest_examples)} examples to {DEST_FILE}")
+def _convert_batch(args):
+    batch, label_key = args
+    return [convert_example(ex, label_key) for ex in batch]
+
+def _batches(examples, size: int, label_key: str):
+    batch = []
+    for ex in examples:
+        batch.append(ex)
+        if len(batch) == size:
+            yield batch, label_key
+            batch = []
+    if batch:
+        yield batch, label_key
+
+def convert_file(source: pathlib.Path, dest: pathlib.Path, label_key: str = LABEL_KEY,
+                 workers: int = None, batch_size: int = 64):
+    """
+    Converts batches of examples in a process pool and streams one JSON line per example
+    to `dest` (order preserved). Unalignable spans are skipped and listed in
+    <dest>.failures.json instead of aborting the whole conversion.
+    """
+    n_examples, failures = 0, []
+    with ProcessPoolExecutor(max_workers=workers) as pool, dest.open("w", encoding="utf-8") as out:
+        results = pool.map(_convert_batch, _batches(iter_examples(source), batch_size, label_key))
+        for batch in tqdm(results, desc="Converting batches"):
+            for example, example_failures in batch:
+                out.write(json.dumps(example, ensure_ascii=False) + "\n")
+                failures.extend(example_failures)
+                n_examples += 1
+
+    report = dest.with_suffix(".failures.json")
+    report.write_text(json.dumps(failures, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"  Wrote {n_examples} examples to {dest}")
+    print(f"  {len(failures)} span(s) could not be aligned → {report}")
+    return n_examples, failures
+
+def benchmark(source: pathlib.Path, label_key: str, repeat: int = 3):
+    """Linear scan vs binary search on every entity span of `source` (same alignments expected)."""
+    docs = [(tokenize(ex["text"])[1], [tuple(s) for ent in ex["entities"]
+             for s in (ent["spans"] if isinstance(ent["spans"][0], (list, tuple)) else [ent["spans"]])])
+            for ex in iter_examples(source)]
+    n_spans = sum(len(spans) for _, spans in docs)
+
+    def run(align):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = [align(span, offsets, index) for offsets, spans in docs
+                   for index in (alignment_index(offsets),) for span in spans]
+            best = min(best, time.perf_counter() - t0)
+        return best, out
+
+    t_linear, linear = run(lambda span, offsets, index: _char_span_to_token_span_linear(span, offsets))
+    t_bisect, bisected = run(lambda span, offsets, index: align_span(span, index)[:2])
+    agree = sum(a == b for a, b in zip(linear, bisected) if b != (None, None))
+    aligned = sum(b != (None, None) for b in bisected)
+    print(f"  {len(docs)} documents, {n_spans} spans")
+    print(f"  linear scan   : {t_linear * 1000:8.1f} ms")
+    print(f"  binary search : {t_bisect * 1000:8.1f} ms  (x{t_linear / t_bisect:.0f})")
+    print(f"  identical alignments : {agree}/{aligned} aligned spans")
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert char-span NER data to GLiNER tokenized JSONL")
+    parser.add_argument("--source", default=SOURCE_FILE, type=pathlib.Path)
+    parser.add_argument("--dest", default=DEST_FILE, type=pathlib.Path)
+    parser.add_argument("--label-key", default=LABEL_KEY,
+                        help="entity field used as label (e.g. 'code_entity' for fulldata.json)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--benchmark", action="store_true", help="linear vs bisect alignment timing")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.source, args.label_key)
+    else:
+        convert_file(args.source, args.dest, args.label_key, args.workers, args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# ── Réécriture en flux des labels d'un dataset GLiNER (tokenized_text / ner) ─────
+import os, json, argparse, tempfile
+from pathlib import Path
+from typing  import Dict, Iterator, List
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# ──────────────────────────────────────────────
+_MAPPINGS = Path(__file__).resolve().parent / "mappings"
+_DEFAULT_MAPPING = _MAPPINGS / "definitions_en.json"   # code → définition
+# mappings/synonyms_en.json : code → [synonymes], choisis avec --pick
+
+
+# ══════════════════════════════════════════════
+def load_mapping(path: Path, pick: int = 0) -> Dict[str, str]:
+    """
+    Fichier JSON {code: label} ou {code: [labels]} ; pour une liste, le label d'indice
+    `pick` est retenu (le dernier si la liste est plus courte).
+    """
+    raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    mapping = {}
+    for code, value in raw.items():
+        if isinstance(value, list):
+            mapping[code] = value[min(pick, len(value) - 1)] if value else code
+        else:
+            mapping[code] = value
+    return mapping
+
+
+def rewrite_example(example: Dict, mapping: Dict[str, str], stats: Counter) -> Dict:
+    """Remplace le label de chaque triplet [start, end, label] ; un label absent du mapping est conservé."""
+    new_ner = []
+    for start, end, label in example.get("ner", []):
+        if label in mapping:
+            stats[label] += 1
+            label = mapping[label]
+        else:
+            stats["<unchanged>"] += 1
+        new_ner.append([start, end, label])
+    return {**example, "ner": new_ner}
+
+
+def iter_records(path: Path) -> Iterator[Dict]:
+    """JSONL lu ligne à ligne ; un tableau JSON (.json) est chargé d'un bloc, faute de mieux."""
+    if path.suffix == ".jsonl":
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from json.loads(path.read_text(encoding="utf-8"))
+
+
+def transform_file(src: Path, dst: Path, mapping: Dict[str, str]) -> Counter:
+    """
+    Réécrit src vers dst (dst peut être src). L'écriture se fait dans un fichier temporaire
+    du même dossier, renommé atomiquement à la fin : un arrêt en cours de route laisse
+    le fichier d'origine intact.
+    """
+    src, dst = Path(src), Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    stats = Counter()
+    fd, tmp = tempfile.mkstemp(prefix=f".{dst.name}.", suffix=".tmp", dir=dst.parent)
+    try:
+        # JSONL, ou tableau JSON écrit élément par élément : mémoire bornée dans les deux cas
+        as_array = dst.suffix == ".json"
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("[\n" if as_array else "")
+            for record in iter_records(src):
+                line = json.dumps(rewrite_example(record, mapping, stats), ensure_ascii=False)
+                if as_array:
+                    line = (",\n" if stats["<examples>"] else "") + line
+                f.write(line if as_array else line + "\n")
+                stats["<examples>"] += 1
+            f.write("\n]\n" if as_array else "")
+        os.replace(tmp, dst)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return stats
+
+
+def _transform_job(args):
+    src, dst, mapping = args
+    return str(src), transform_file(src, dst, mapping)
+
+
+def transform_shards(sources: List[Path], out_dir: Path, mapping: Dict[str, str], workers: int = None) -> Counter:
+    """Un fichier (shard) par tâche dans un pool de processus ; out_dir=None réécrit sur place."""
+    jobs = [(src, (out_dir / src.name) if out_dir else src, mapping) for src in sources]
+    total = Counter()
+    if len(jobs) == 1:
+        results = [_transform_job(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_transform_job, jobs))
+    for src, stats in results:
+        print(f"  {src} : {stats['<examples>']} exemples")
+        total.update(stats)
+    return total
+
+
+# ══════════════════════════════════════════════
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rewrite GLiNER ner labels (codes → definitions / synonyms), streaming and atomic")
+    parser.add_argument("inputs", nargs="+", type=Path, help="fichiers .jsonl/.json (un shard par fichier) ; seul le JSONL est lu en flux, "
+                             "un tableau .json est chargé entièrement en mémoire")
+    parser.add_argument("--mapping", default=_DEFAULT_MAPPING, type=Path)
+    parser.add_argument("--pick", type=int, default=0, help="indice du synonyme si le mapping donne une liste")
+    parser.add_argument("--out-dir", type=Path, default=None, help="dossier de sortie (défaut : sur place)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    mapping = load_mapping(args.mapping, args.pick)
+    stats = transform_shards(args.inputs, args.out_dir, mapping, args.workers)
+    replaced = sum(n for label, n in stats.items() if not label.startswith("<"))
+    print(f"✅ {stats['<examples>']} exemples, {replaced} labels remplacés, "
+          f"{stats['<unchanged>']} inchangés (absents du mapping)")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,12 +18,22 @@ scripts=(
 # Seuil par défaut pour l'indice de Jaccard
 JACCARD_THRESHOLD=0.5
 
+# NO_PLOTS=1 ./run_all.sh : métriques seules, sans graphiques (mode CI)
+PLOT_ARGS=""
+if [[ "${NO_PLOTS:-0}" == "1" ]]; then
+    PLOT_ARGS="--no-plots"
+fi
+
+# Un seul run du stockage des métriques (outputs/metrics.sqlite) pour tout le pipeline
+export METRICS_RUN_ID=$(python src/metrics_store.py new-run --script run_all.sh --jaccard $JACCARD_THRESHOLD)
+echo "🗄️  Run de métriques : $METRICS_RUN_ID"
+
 for script in "${scripts[@]}"; do
     echo ""
     echo "▶️  Exécution de : $script"
     
     if [[ "$script" == *"evaluate_union.py" ]] || [[ "$script" == *"evaluate_intersection.py" ]]; then
-        python "$script" --threshold $JACCARD_THRESHOLD
+        python "$script" --threshold $JACCARD_THRESHOLD $PLOT_ARGS
     else
         python "$script"
     fi
@@ -38,3 +48,4 @@ done
 
 echo ""
 echo "🎉 Pipeline complet terminé avec succès."
+echo "   Export Excel à la demande : python src/metrics_store.py export --run $METRICS_RUN_ID"
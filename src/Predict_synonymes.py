@@ -1,9 +1,13 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForMaskedLM
-from sentence_transformers import SentenceTransformer, util
-import torch
+import time
+import argparse
+from pathlib import Path
+
 import numpy as np
 import pandas as pd # Ajout de l'importation de pandas pour la gestion des DataFrames
 
+from src.config import OUTPUT_DIR
+from src.utils import atomic_path
+
 # --- 1. Définir les phrases et mots cibles pour l'expérience ---
 test_cases = [
 
@@ -41,89 +45,161 @@ test_cases = [
     }
 ]
 
-
-# --- 2. Configuration du Modèle de Langage Masqué (MLM) ---
-
+# --- 2. Modèles : MLM pour proposer des mots, Sentence Transformer pour la similarité sémantique ---
 model_name_mlm = "bert-base-uncased"
-tokenizer_mlm = AutoTokenizer.from_pretrained(model_name_mlm)
-model_mlm = AutoModelForMaskedLM.from_pretrained(model_name_mlm)
-
-# Création d'un pipeline pour faciliter l'utilisation du modèle de remplissage de masque
-unmasker = pipeline('fill-mask', model=model_mlm, tokenizer=tokenizer_mlm)
-
-# --- 3. Configuration du Modèle Sentence Transformer pour la similarité sémantique ---
-
 model_name_st = "all-MiniLM-L6-v2"
-model_st = SentenceTransformer(model_name_st)
-
 
-# --- 4. Fonction principale pour exécuter l'analyse pour un cas donné ---
-def analyze_word_in_sentence(sentence, target_word, unmasker, model_st):
+RESULTS_XLSX = OUTPUT_DIR / "mlm_synonym_discovery_results.xlsx"
+EMBEDDING_CACHE = OUTPUT_DIR / "embedding_cache"  # un fichier .npz par modèle : mots + vecteurs normalisés
 
-    # Masquer le mot cible dans la phrase
-    # Remplace la première occurrence du mot cible par le token de masque du tokenizer
-    masked_sentence = sentence.replace(target_word, unmasker.tokenizer.mask_token, 1)
-
-    print(f"\n--- Traitement du mot '{target_word}' dans la phrase ---")
-    print(f"Phrase originale : {sentence}")
-    print(f"Phrase masquée : {masked_sentence}")
-
-    # Obtenir les prédictions du MLM pour le mot masqué
-    predictions = unmasker(masked_sentence, top_k=10)
-
-    # Obtenir l'embedding du mot original
-    original_word_embedding = model_st.encode(target_word, convert_to_tensor=True)
 
-    case_results = []
-    # Pour chaque mot prédit par le MLM, calculer sa similarité avec le mot original
-    for pred in predictions:
-        predicted_word = pred['token_str']
-        prediction_score = pred['score']
+def load_models(mlm_name: str = model_name_mlm, st_name: str = model_name_st):
+    """Chargement (lent) des deux modèles, seulement à l'exécution."""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForMaskedLM
+    from sentence_transformers import SentenceTransformer
 
-        # Obtenir l'embedding du mot prédit
-        predicted_word_embedding = model_st.encode(predicted_word, convert_to_tensor=True)
+    tokenizer_mlm = AutoTokenizer.from_pretrained(mlm_name)
+    model_mlm = AutoModelForMaskedLM.from_pretrained(mlm_name).eval()
+    if torch.cuda.is_available():
+        model_mlm = model_mlm.to("cuda")
+    return tokenizer_mlm, model_mlm, SentenceTransformer(st_name)
 
-        # Calculer la similarité cosinus entre les deux embeddings.
-        similarity = util.cos_sim(original_word_embedding, predicted_word_embedding).item()
 
-        case_results.append({
-            'original_sentence': sentence,
-            'target_word': target_word,
-            'predicted_word': predicted_word,
-            'prediction_score_mlm': prediction_score,
-            'semantic_similarity_score': similarity
-        })
-
-    # Trier les résultats par similarité sémantique décroissante pour ce cas
-    case_results = sorted(case_results, key=lambda x: x['semantic_similarity_score'], reverse=True)
-
-    print(f"Résultats pour '{target_word}' :")
-    for res in case_results:
-        print(f"- Mot: '{res['predicted_word']}', Score MLM: {res['prediction_score_mlm']:.4f}, Sim. Sémantique: {res['semantic_similarity_score']:.4f}")
-    
-    return case_results
-
-# --- 5. Fonction pour sauvegarder tous les résultats dans un fichier Excel ---
-def save_all_results_to_excel(all_results_list, file_path="mlm_synonym_discovery_results.xlsx"):
+# --- 3. Remplissage des masques : toutes les phrases en un seul passage par lot ---
+def mask_sentence(sentence, target_word, mask_token):
+    # Remplace la première occurrence du mot cible par le token de masque du tokenizer
+    return sentence.replace(target_word, mask_token, 1)
+
+
+def fill_masks(masked_sentences, tokenizer, model, top_k=10, batch_size=32):
+    """
+    Top-k des mots proposés pour le (premier) masque de chaque phrase : les phrases sont
+    tokenisées avec remplissage et passées par lots dans le MLM, au lieu d'un appel de
+    pipeline par phrase. Retourne une liste (par phrase) de (mot, score).
+    """
+    import torch
+
+    results = []
+    for start in range(0, len(masked_sentences), batch_size):
+        batch = masked_sentences[start:start + batch_size]
+        encoded = tokenizer(batch, return_tensors="pt", padding=True, truncation=True).to(model.device)
+        with torch.no_grad():
+            logits = model(**encoded).logits
+        rows, cols = (encoded["input_ids"] == tokenizer.mask_token_id).nonzero(as_tuple=True)
+        # un seul masque par phrase : on garde la première position trouvée pour chaque ligne
+        no_mask = encoded["input_ids"].shape[1]
+        first = torch.full((len(batch),), no_mask, dtype=torch.long, device=rows.device)
+        first.scatter_reduce_(0, rows, cols, reduce="amin")
+        if (first == no_mask).any():
+            missing = [batch[i] for i in (first == no_mask).nonzero().flatten().tolist()]
+            raise ValueError(f"Aucun token de masque dans : {missing}")
+        probs = logits[torch.arange(len(batch), device=logits.device), first].softmax(dim=-1)
+        scores, ids = probs.topk(top_k, dim=-1)
+        for row_scores, row_ids in zip(scores.tolist(), ids.tolist()):
+            results.append([(tokenizer.decode([i]).strip(), s) for i, s in zip(row_ids, row_scores)])
+    return results
+
+
+# --- 4. Embeddings des mots, avec cache sur disque ---
+def _cache_path(cache_dir: Path, st_name: str) -> Path:
+    return cache_dir / f"{st_name.replace('/', '__')}.npz"
+
+
+def load_embedding_cache(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    data = np.load(path, allow_pickle=False)
+    return dict(zip(data["words"].tolist(), data["vectors"]))
+
+
+def save_embedding_cache(cache: dict, path: Path):
+    words = list(cache)
+    with atomic_path(path, suffix=".npz") as tmp:
+        np.savez(tmp, words=np.array(words, dtype=str), vectors=np.stack([cache[w] for w in words]).astype(np.float32))
+
+
+def encode_words(words, model_st, cache_path: Path = None, batch_size=64):
+    """
+    Matrice (len(words), dim) des embeddings normalisés. Les mots absents du cache sont
+    encodés en un seul appel puis ajoutés au cache ; retourne aussi le nombre de mots encodés.
+    """
+    cache = load_embedding_cache(cache_path) if cache_path else {}
+    missing = [w for w in dict.fromkeys(words) if w not in cache]
+    if missing:
+        vectors = model_st.encode(missing, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+        cache.update(zip(missing, np.asarray(vectors, dtype=np.float32)))
+        if cache_path:
+            save_embedding_cache(cache, cache_path)
+    return np.stack([cache[w] for w in words]), len(missing)
+
+
+# --- 5. Moteur : MLM par lots, mots dédupliqués, une seule multiplication matricielle ---
+def discover_synonyms(cases, tokenizer, model_mlm, model_st, top_k=10, batch_size=32,
+                      cache_path: Path = None):
+    t0 = time.perf_counter()
+    masked = [mask_sentence(c["sentence"], c["target_word"], tokenizer.mask_token) for c in cases]
+    predictions = fill_masks(masked, tokenizer, model_mlm, top_k, batch_size)
+    t_mlm = time.perf_counter() - t0
+
+    # Vocabulaire unique : mots cibles + tous les mots prédits, encodés une seule fois
+    vocabulary = list(dict.fromkeys([c["target_word"] for c in cases] + [w for preds in predictions for w, _ in preds]))
+    position = {w: i for i, w in enumerate(vocabulary)}
+    t0 = time.perf_counter()
+    embeddings, n_encoded = encode_words(vocabulary, model_st, cache_path)
+    t_encode = time.perf_counter() - t0
+
+    # Similarité cosinus de chaque cible avec tout le vocabulaire (vecteurs normalisés)
+    targets = np.array([position[c["target_word"]] for c in cases])
+    similarity = embeddings[targets] @ embeddings.T
+
+    rows = []
+    for case_index, (case, masked_sentence, preds) in enumerate(zip(cases, masked, predictions)):
+        for predicted_word, prediction_score in preds:
+            rows.append({
+                '_case': case_index,
+                'original_sentence': case["sentence"],
+                'masked_sentence': masked_sentence,
+                'target_word': case["target_word"],
+                'predicted_word': predicted_word,
+                'prediction_score_mlm': prediction_score,
+                'semantic_similarity_score': float(similarity[case_index, position[predicted_word]]),
+            })
+    df = pd.DataFrame(rows)
+    # Trier les résultats par similarité sémantique décroissante pour chaque cas
+    if not df.empty:
+        df = df.sort_values(["_case", "semantic_similarity_score"], ascending=[True, False]).drop(columns="_case")
+    stats = {"cases": len(cases), "unique_words": len(vocabulary), "encoded": n_encoded,
+             "cached": len(vocabulary) - n_encoded, "mlm_s": round(t_mlm, 3), "encode_s": round(t_encode, 3)}
+    return df.reset_index(drop=True), stats
+
+
+# --- 6. Sauvegarde : Excel (comme avant) + Parquet ---
+def save_results(df, file_path: Path = RESULTS_XLSX):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_excel(file_path, index=False)
+    df.to_parquet(file_path.with_suffix(".parquet"), index=False)
+    print(f"\n Tous les résultats ont été sauvegardés dans : {file_path} (+ .parquet)")
 
-    try:
-        df = pd.DataFrame(all_results_list)
-        df.to_excel(file_path, index=False)
-        print(f"\n Tous les résultats ont été sauvegardés avec succès dans : {file_path}")
-    except Exception as e:
-        print(f"\n Erreur lors de la sauvegarde du fichier Excel : {e}")
 
 # --- Exécution principale ---
 if __name__ == "__main__":
-    all_combined_results = []
-
-    for case in test_cases:
-        sentence = case["sentence"]
-        target_word = case["target_word"]
-        
-        # Exécuter l'analyse pour chaque cas et ajouter les résultats à la liste globale
-        results_for_case = analyze_word_in_sentence(sentence, target_word, unmasker, model_st)
-        all_combined_results.extend(results_for_case)
-    
-    # Sauvegarder tous les résultats combinés dans un seul fichier Excel
-    save_all_results_to_excel(all_combined_results)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Découverte de synonymes par MLM + similarité sémantique")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", type=Path, default=RESULTS_XLSX)
+    parser.add_argument("--no-cache", action="store_true", help="n'utilise pas le cache d'embeddings sur disque")
+    args = parser.parse_args()
+
+    tokenizer_mlm, model_mlm, model_st = load_models()
+    cache_path = None if args.no_cache else _cache_path(EMBEDDING_CACHE, model_name_st)
+    results, stats = discover_synonyms(test_cases, tokenizer_mlm, model_mlm, model_st,
+                                       args.top_k, args.batch_size, cache_path)
+
+    for (_, target_word), group in results.groupby(["original_sentence", "target_word"], sort=False):
+        print(f"Résultats pour '{target_word}' :")
+        for res in group.itertuples():
+            print(f"- Mot: '{res.predicted_word}', Score MLM: {res.prediction_score_mlm:.4f}, "
+                  f"Sim. Sémantique: {res.semantic_similarity_score:.4f}")
+    print(f"\n{stats}")
+    save_results(results, args.output)
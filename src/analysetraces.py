@@ -6,6 +6,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
+from src.decoding import load_traces
+
 # Configuration du logger (comme dans votre code original)
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
@@ -26,8 +28,7 @@ def analyze_evaluation_traces_and_plot_confusion_matrices(traces_file_path: Path
     output_dir.mkdir(parents=True, exist_ok=True)
 
     try:
-        with open(traces_file_path, 'r', encoding='utf-8') as f:
-            traces = json.load(f)
+        traces = load_traces(traces_file_path)
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON from {traces_file_path}: {e}")
         return
@@ -17,13 +17,21 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 DATA_PATH = BASE_DIR / "data" / "fulldata.json"
 
+KB_DIR = BASE_DIR / "Conception_de_BD"
+KB_PATH = KB_DIR / "knowledge_base.json"
+KB_ENRICHED_PATH = KB_DIR / "knowledge_base_enriched.json"
+
 OUTPUT_DIR = BASE_DIR / "outputs"
 PRED_SYNONYM_JSON = OUTPUT_DIR / "debug_by_synonym.json"
 PRED_COMBINATIONS_JSON = OUTPUT_DIR / "debug_combinations.json"
+PRED_GAZETTEER_JSON = OUTPUT_DIR / "debug_gazetteer.json"  # même schéma, annotations du dictionnaire KB
 
 UNION_DIR = OUTPUT_DIR / "results_union"
 INTERSECTION_DIR = OUTPUT_DIR / "results_intersection"
 OVERLAP_DIR = OUTPUT_DIR / "overlap_analysis"
+COUNTS_DIR = OUTPUT_DIR / "counts"  # comptages TP/FP/FN/TN par document (Parquet)
+METRICS_DB = OUTPUT_DIR / "metrics.sqlite"  # stockage unique des métriques, un run par exécution
+CORPUS_DIR = OUTPUT_DIR / "corpus"  # corpus compilé (textes + entités en mmap, voir src/corpus_store.py)
 
 # ════════════════════ MODÈLE ET SEUILS ════════════════════
 MODEL_NAME = "knowledgator/gliner-bi-small-v1.0"
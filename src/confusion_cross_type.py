@@ -0,0 +1,159 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+from src.config import ENTITY_TYPES, DATA_PATH, OUTPUT_DIR, PRED_SYNONYM_JSON, PRED_COMBINATIONS_JSON
+from src.utils import load_corpus
+from src.decoding import open_predictions
+from src.counts import iter_label_sets
+from src.spans import global_coords, corpus_stride, interval_join, best_match
+from src.evaluate_schemas import gold_arrays
+from src.metrics_store import start_run, save_table
+
+# Matrice de confusion type prédit × type gold (+ "none").
+# Contrairement à la matrice 2x2 de analysetraces.py, on voit QUELS types GLiNER confond
+# (ex : DISO prédit sur un span gold FINDING).
+NONE = "none"
+CROSS_TYPE_DIR = OUTPUT_DIR / "confusion_cross_type"
+
+
+def collect_predictions(debug_data, corpus, strategy: str, min_k: int):
+    """
+    Concatène les prédictions de tous les ensembles de labels.
+    Retourne la liste des (entity_type, label_set) et les tableaux (set_id, doc, start, end).
+    """
+    doc_index = {doc["text_id"]: i for i, doc in enumerate(corpus)}
+    label_sets = []
+    rows = []
+    for code, synonyms in ENTITY_TYPES.items():
+        for label_set, spans_by_text in iter_label_sets(debug_data, code, synonyms, strategy, min_k):
+            set_id = len(label_sets)
+            label_sets.append((code, label_set))
+            rows.extend(
+                (set_id, doc_index[text_id], span[0], span[1])
+                for text_id, spans in spans_by_text.items() if text_id in doc_index
+                for span in spans
+            )
+    arr = np.array(rows, dtype=np.int64).reshape(-1, 4)
+    return label_sets, (arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3])
+
+
+def cross_type_counts(debug_data, corpus, strategy: str = "combo", min_k: int = 1) -> dict:
+    """
+    Une seule jointure d'intervalles de TOUTES les prédictions (tous ensembles de labels)
+    contre les spans gold de tous les types. Chaque prédiction est attribuée au span gold
+    qui la recouvre le mieux (frontières exactes, puis même type, puis chevauchement),
+    ou à "none". Le comptage est un unique np.bincount sur (ensemble, type gold).
+
+    Retourne {"rows": DataFrame une ligne par ensemble de labels (colonnes = types gold + none),
+              "pair_set", "pair_gold": paires (ensemble, span gold) qui se chevauchent,
+              "gold_code": type de chaque span gold}.
+    """
+    codes = list(ENTITY_TYPES)
+    n = len(codes)
+    code_ids = {code: i for i, code in enumerate(codes)}
+    stride = corpus_stride(corpus)
+
+    g_doc, g_code, g_start, g_end = gold_arrays(corpus, codes)
+    label_sets, (set_id, p_doc, p_start, p_end) = collect_predictions(debug_data, corpus, strategy, min_k)
+    set_code = np.array([code_ids[code] for code, _ in label_sets], dtype=np.int64)
+
+    pa, pb = global_coords(p_doc, p_start, p_end, stride)
+    ga, gb = global_coords(g_doc, g_start, g_end, stride)
+    ip, ig, overlap = interval_join(pa, pb, ga, gb)
+
+    exact = (pa[ip] == ga[ig]) & (pb[ip] == gb[ig])
+    same_type = g_code[ig] == set_code[set_id[ip]]
+    best = best_match(ip, [exact, same_type, overlap], len(pa))
+
+    gold_type = np.full(len(pa), n, dtype=np.int64)
+    matched = best >= 0
+    gold_type[matched] = g_code[ig[best[matched]]]
+
+    counts = np.bincount(set_id * (n + 1) + gold_type, minlength=len(label_sets) * (n + 1))
+    rows = pd.DataFrame(counts.reshape(len(label_sets), n + 1), columns=codes + [NONE])
+    rows.insert(0, "label_set", [label_set for _, label_set in label_sets])
+    rows.insert(0, "entity_type", [code for code, _ in label_sets])
+
+    return {"rows": rows, "pair_set": set_id[ip], "pair_gold": ig, "gold_code": g_code}
+
+
+def default_selection(rows: pd.DataFrame) -> dict:
+    """Par type, l'ensemble de labels le plus large (tous les synonymes si disponible)."""
+    selection = {}
+    for code, sub in rows.groupby("entity_type", sort=False):
+        sizes = sub["label_set"].str.count("__")
+        selection[code] = sub.loc[sizes.idxmax(), "label_set"]
+    return selection
+
+
+def confusion_matrix(result: dict, selection: dict) -> pd.DataFrame:
+    """
+    Assemble la matrice (types + none) × (types + none) pour une configuration
+    {entity_type: label_set}. Ligne = type prédit, colonne = type gold.
+    La ligne "none" compte les spans gold qu'aucune prédiction sélectionnée ne recouvre.
+    """
+    codes = list(ENTITY_TYPES)
+    n = len(codes)
+    rows = result["rows"]
+    labels = codes + [NONE]
+    matrix = pd.DataFrame(0, index=pd.Index(labels, name="Predicted"),
+                          columns=pd.Index(labels, name="Gold"), dtype=np.int64)
+
+    selected_ids = []
+    for code, label_set in selection.items():
+        hit = rows.index[(rows["entity_type"] == code) & (rows["label_set"] == label_set)]
+        if len(hit) == 0:
+            raise KeyError(f"Ensemble de labels absent pour {code} : {label_set}")
+        selected_ids.append(hit[0])
+        matrix.loc[code, :] = rows.loc[hit[0], labels].to_numpy()
+
+    touched = np.zeros(len(result["gold_code"]), dtype=bool)
+    touched[result["pair_gold"][np.isin(result["pair_set"], selected_ids)]] = True
+    missed = np.bincount(result["gold_code"][~touched], minlength=n)
+    matrix.loc[NONE, codes] = missed
+    return matrix
+
+
+def plot_cross_type_matrix(matrix: pd.DataFrame, title: str, output_path):
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(matrix, annot=True, fmt="d", cmap="Blues", cbar=False, linewidths=.5, linecolor="black")
+    plt.title(title)
+    plt.xlabel("Type réel (gold)")
+    plt.ylabel("Type prédit")
+    plt.tight_layout()
+    plt.savefig(output_path, bbox_inches="tight")
+    plt.close()
+
+
+def main_cross_type(strategy: str = "combo"):
+    """Matrices de confusion inter-types pour tous les ensembles de labels."""
+    source = PRED_COMBINATIONS_JSON if strategy == "combo" else PRED_SYNONYM_JSON
+    print(f"Chargement des prédictions depuis {source}...")
+    debug_data = open_predictions(source)
+    corpus = load_corpus(DATA_PATH)
+
+    print("Jointure des prédictions contre les spans gold de tous les types...")
+    result = cross_type_counts(debug_data, corpus, strategy=strategy)
+
+    run_id = start_run("confusion_cross_type.py", params={"strategy": strategy})
+    save_table(run_id, f"cross_type_rows_{strategy}", result["rows"])
+
+    selection = default_selection(result["rows"])
+    matrix = confusion_matrix(result, selection)
+    save_table(run_id, f"cross_type_matrix_{strategy}", matrix.reset_index())
+    CROSS_TYPE_DIR.mkdir(parents=True, exist_ok=True)
+    plot_cross_type_matrix(matrix, f"Confusion inter-types ({strategy})",
+                           CROSS_TYPE_DIR / f"cross_type_matrix_{strategy}.png")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategy", default="combo", choices=["single", "union", "intersection", "combo"],
+                        help="Construction des ensembles de labels (voir src/counts.py)")
+    args = parser.parse_args()
+
+    main_cross_type(strategy=args.strategy)
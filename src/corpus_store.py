@@ -0,0 +1,169 @@
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from src.config import DATA_PATH, CORPUS_DIR
+
+# Corpus compilé : au lieu de re-parser fulldata.json à chaque étape, les textes sont écrits
+# dans un seul blob UTF-8 (text.bin) avec un tableau d'offsets, et les entités dans un tableau
+# NumPy typé trié par document. Tout est ouvert en mmap : l'ouverture ne lit rien, l'accès à un
+# document ne touche que ses pages, et plusieurs processus partagent le même cache de pages
+# (chaque processus rouvre le dossier par son chemin, rien n'est sérialisé entre processus).
+#
+#   text.bin          textes concaténés (UTF-8)
+#   text_offsets.npy  int64 (n_docs + 1) : octets [o[i], o[i+1]) du document i
+#   entities.npy      structuré (doc int32, code int16, start int32, end int32), trié par doc
+#   ent_offsets.npy   int64 (n_docs + 1) : entités [e[i], e[i+1]) du document i
+#   meta.json         text_ids, codes, empreinte de la source
+ENTITY_DTYPE = np.dtype([("doc", np.int32), ("code", np.int16), ("start", np.int32), ("end", np.int32)])
+
+
+def source_fingerprint(path: Path) -> dict:
+    stat = Path(path).stat()
+    return {"source": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def compile_corpus(json_path: Path = DATA_PATH, out_dir: Path = CORPUS_DIR) -> Path:
+    """Compile un corpus au format fulldata.json (liste de {text_id, text, entities}) en dossier mmap."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    codes = sorted({ent["code_entity"] for doc in docs for ent in doc["entities"]})
+    code_ids = {code: i for i, code in enumerate(codes)}
+
+    text_offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+    ent_offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+    rows = []
+    with open(out_dir / "text.bin", "wb") as blob:
+        for i, doc in enumerate(docs):
+            blob.write(doc["text"].encode("utf-8"))
+            text_offsets[i + 1] = blob.tell()
+            # les spans restent en caractères, relatifs au document (comme dans fulldata.json)
+            rows.extend((i, code_ids[ent["code_entity"]], ent["spans"][0], ent["spans"][1])
+                        for ent in doc["entities"])
+            ent_offsets[i + 1] = len(rows)
+
+    np.save(out_dir / "text_offsets.npy", text_offsets)
+    np.save(out_dir / "ent_offsets.npy", ent_offsets)
+    np.save(out_dir / "entities.npy", np.array(rows, dtype=ENTITY_DTYPE))
+    meta = {"text_ids": [doc["text_id"] for doc in docs], "codes": codes, **source_fingerprint(json_path)}
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    print(f"✅ Corpus compilé : {len(docs)} documents, {len(rows)} entités → {out_dir}")
+    return out_dir
+
+
+def is_stale(json_path: Path = DATA_PATH, out_dir: Path = CORPUS_DIR) -> bool:
+    meta_path = out_dir / "meta.json"
+    if not meta_path.exists():
+        return True
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    current = source_fingerprint(json_path)
+    return any(meta.get(key) != current[key] for key in ("size", "mtime_ns"))
+
+
+def open_corpus(out_dir: Path = CORPUS_DIR) -> dict:
+    """
+    Ouvre un corpus compilé sans rien copier : tableaux NumPy en mmap (lecture seule) et
+    table text_id → indice. Seule meta.json est lue entièrement.
+    """
+    meta = json.loads((out_dir / "meta.json").read_text(encoding="utf-8"))
+    text_offsets = np.load(out_dir / "text_offsets.npy", mmap_mode="r")
+    blob = (np.memmap(out_dir / "text.bin", dtype=np.uint8, mode="r")
+            if text_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8))  # mmap d'un fichier vide impossible
+    return {
+        "dir": out_dir,
+        "text_ids": meta["text_ids"],
+        "codes": meta["codes"],
+        "doc_index": {text_id: i for i, text_id in enumerate(meta["text_ids"])},
+        "blob": blob,
+        "text_offsets": text_offsets,
+        "entities": np.load(out_dir / "entities.npy", mmap_mode="r"),
+        "ent_offsets": np.load(out_dir / "ent_offsets.npy", mmap_mode="r"),
+    }
+
+
+def ensure_corpus(json_path: Path = DATA_PATH, out_dir: Path = CORPUS_DIR) -> dict:
+    """Ouvre le corpus compilé, en le (re)compilant si la source JSON a changé."""
+    if is_stale(json_path, out_dir):
+        compile_corpus(json_path, out_dir)
+    return open_corpus(out_dir)
+
+
+# ════════════════════ ACCÈS ════════════════════
+
+def doc_bytes(corpus: dict, i: int) -> memoryview:
+    """Octets UTF-8 du document i : vue sur le mmap, sans copie."""
+    o = corpus["text_offsets"]
+    return memoryview(corpus["blob"][o[i]:o[i + 1]])
+
+
+def doc_text(corpus: dict, i: int) -> str:
+    return bytes(doc_bytes(corpus, i)).decode("utf-8")
+
+
+def doc_entities(corpus: dict, i: int) -> np.ndarray:
+    """Entités du document i (vue structurée sur le mmap : doc, code, start, end)."""
+    e = corpus["ent_offsets"]
+    return corpus["entities"][e[i]:e[i + 1]]
+
+
+def entities_of_code(corpus: dict, code: str) -> np.ndarray:
+    """Toutes les entités d'un type, sur tout le corpus (masque vectorisé)."""
+    if code not in corpus["codes"]:
+        return corpus["entities"][:0]
+    ents = corpus["entities"]
+    return ents[ents["code"] == corpus["codes"].index(code)]
+
+
+def get_document(corpus: dict, text_id: str) -> dict:
+    """Document au format fulldata.json, reconstruit à la demande (accès direct par text_id)."""
+    i = corpus["doc_index"][text_id]
+    text = doc_text(corpus, i)
+    codes = corpus["codes"]
+    return {
+        "text_id": text_id,
+        "text": text,
+        "entities": [{"code_entity": codes[code], "spans": [int(start), int(end)], "entity": text[start:end]}
+                     for _, code, start, end in doc_entities(corpus, i).tolist()],
+    }
+
+
+def iter_documents(corpus: dict):
+    for text_id in corpus["text_ids"]:
+        yield get_document(corpus, text_id)
+
+
+def benchmark(json_path: Path = DATA_PATH, out_dir: Path = CORPUS_DIR, lookups: int = 20) -> dict:
+    """Ouverture + accès à quelques documents : parsing JSON complet vs corpus compilé."""
+    t0 = time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as f:
+        docs = {doc["text_id"]: doc for doc in json.load(f)}
+    picked = list(docs)[::max(1, len(docs) // lookups)][:lookups]
+    _ = [docs[text_id] for text_id in picked]
+    t_json = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    corpus = open_corpus(out_dir)
+    compiled = [get_document(corpus, text_id) for text_id in picked]
+    t_mmap = time.perf_counter() - t0
+
+    same = all(compiled[k] == docs[text_id] for k, text_id in enumerate(picked))
+    print(f"  json.load + {len(picked)} accès : {t_json * 1000:8.2f} ms")
+    print(f"  mmap      + {len(picked)} accès : {t_mmap * 1000:8.2f} ms  (documents identiques : {same})")
+    return {"json_seconds": t_json, "mmap_seconds": t_mmap, "identical": same}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile le corpus JSON en textes + entités mappés en mémoire")
+    parser.add_argument("--source", type=Path, default=DATA_PATH)
+    parser.add_argument("--out", type=Path, default=CORPUS_DIR)
+    parser.add_argument("--benchmark", action="store_true", help="compare l'ouverture au parsing JSON")
+    args = parser.parse_args()
+
+    compile_corpus(args.source, args.out)
+    if args.benchmark:
+        benchmark(args.source, args.out)
@@ -0,0 +1,257 @@
+import itertools
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import ENTITY_TYPES, COUNTS_DIR, DEFAULT_JACCARD_THRESHOLD
+
+# Table de comptages par (text_id, entity_type, strategy, label_set, mode).
+# C'est l'artefact primaire de l'évaluation : toutes les métriques, graphiques
+# et matrices de confusion en sont dérivés par des group-by vectorisés.
+KEY_COLUMNS = ["text_id", "entity_type", "strategy", "label_set", "mode"]
+COUNT_COLUMNS = ["TP", "FP", "FN", "TN"]
+MODES = ("exact", "partial")
+
+
+def match_spans(gold: set, pred: set, threshold: float = DEFAULT_JACCARD_THRESHOLD):
+    """
+    Appariement gold/prédiction d'un document, identique à celui des évaluateurs :
+    correspondances exactes d'abord, puis partielles (Jaccard >= threshold) sur les restes.
+    Retourne (tp_exact, tp_partial, fp, fn).
+    Les Jaccard des restes sont calculés en une fois (NumPy) : seules les prédictions ayant
+    au moins un gold candidat entrent dans la boucle d'appariement glouton.
+    """
+    exact = pred & gold
+    rest_pred, rest_gold = pred - exact, gold - exact
+    if not rest_pred or not rest_gold:
+        return len(exact), 0, len(rest_pred), len(rest_gold)
+
+    preds, golds = list(rest_pred), list(rest_gold)
+    p = np.array(preds, dtype=np.int64).reshape(-1, 2)
+    g = np.array(golds, dtype=np.int64).reshape(-1, 2)
+    inter = np.clip(np.minimum(p[:, 1:], g[:, 1]) - np.maximum(p[:, :1], g[:, 0]), 0, None)
+    union = (p[:, 1:] - p[:, :1]) + (g[:, 1] - g[:, 0]) - inter
+    ok = np.divide(inter, union, out=np.zeros(inter.shape), where=union > 0) >= threshold
+
+    matched_gold = set()
+    for i in np.flatnonzero(ok.any(axis=1)):
+        candidates = [golds[j] for j in np.flatnonzero(ok[i]) if golds[j] not in matched_gold]
+        if len(candidates) > 1:
+            # même choix que la boucle d'origine : premier candidat dans l'ordre d'itération des restes
+            allowed = set(candidates)
+            candidates = [span for span in gold - (exact | matched_gold) if span in allowed]
+        if candidates:
+            matched_gold.add(candidates[0])
+
+    tp_partial = len(matched_gold)
+    return len(exact), tp_partial, len(rest_pred) - tp_partial, len(rest_gold) - tp_partial
+
+
+def spans_by_synonym(debug_data: dict, code: str, synonyms) -> dict:
+    """{synonyme: {text_id: set(spans)}} à partir des prédictions par synonyme."""
+    spans_by_syn = defaultdict(lambda: defaultdict(set))
+    for syn in synonyms:
+        for entry in debug_data.get(f"{code}__{syn}", []):
+            spans_by_syn[syn][entry["text_id"]].add(tuple(entry["span"]))
+    return spans_by_syn
+
+
+def iter_label_sets(debug_data: dict, code: str, synonyms, strategy: str, min_k: int = 2):
+    """
+    Génère (label_set, {text_id: set(spans)}) selon la stratégie :
+      - "single"       : chaque synonyme seul (debug_by_synonym.json)
+      - "union"        : union des prédictions par synonyme, combinaisons de min_k à N
+      - "intersection" : intersection des prédictions par synonyme, combinaisons de min_k à N
+      - "combo"        : prédictions faites directement avec la combinaison (debug_combinations.json)
+    """
+    if strategy == "single":
+        by_syn = spans_by_synonym(debug_data, code, synonyms)
+        for syn in synonyms:
+            yield syn, by_syn[syn]
+        return
+
+    if strategy in ("union", "intersection"):
+        by_syn = spans_by_synonym(debug_data, code, synonyms)
+        for k in range(min_k, len(synonyms) + 1):
+            for combo in itertools.combinations(synonyms, k):
+                text_ids = set().union(*(by_syn[syn].keys() for syn in combo))
+                spans_by_text = {}
+                for text_id in text_ids:
+                    sets = [by_syn[syn].get(text_id, set()) for syn in combo]
+                    if strategy == "union":
+                        spans_by_text[text_id] = set.union(*sets)
+                    else:
+                        spans_by_text[text_id] = set.intersection(*sets)
+                yield "__".join(combo), spans_by_text
+        return
+
+    if strategy == "combo":
+        for k in range(min_k, len(synonyms) + 1):
+            for combo in itertools.combinations(synonyms, k):
+                combo_key = "__".join(combo)
+                spans_by_text = defaultdict(set)
+                for entry in debug_data.get(f"{code}__{combo_key}", []):
+                    spans_by_text[entry["text_id"]].add(tuple(entry["span"]))
+                yield combo_key, spans_by_text
+        return
+
+    raise ValueError(f"Stratégie inconnue : {strategy}")
+
+
+def build_counts(debug_data: dict, corpus: list, strategy: str,
+                 threshold: float = DEFAULT_JACCARD_THRESHOLD, min_k: int = 2,
+                 entity_types: dict = ENTITY_TYPES) -> pd.DataFrame:
+    """
+    Construit la table de comptages par document.
+    Une ligne par (text_id, entity_type, label_set, mode) avec TP, FP, FN et TN,
+    TN étant le nombre de spans gold d'autres types dans le document.
+    Le mode "exact" ne compte que les correspondances exactes ; le mode "partial"
+    y ajoute les correspondances Jaccard. FP/FN sont ceux après appariement partiel.
+    """
+    gold_by_code = {}
+    other_by_code = {}
+    for code in entity_types:
+        gold_by_code[code] = [
+            {tuple(ent["spans"]) for ent in doc["entities"] if ent["code_entity"] == code}
+            for doc in corpus
+        ]
+        other_by_code[code] = [
+            len({tuple(ent["spans"]) for ent in doc["entities"] if ent["code_entity"] != code})
+            for doc in corpus
+        ]
+
+    text_ids = np.array([doc["text_id"] for doc in corpus], dtype=object)
+    doc_lens = np.array([len(doc["text"]) for doc in corpus], dtype=np.int32)
+    n_docs = len(corpus)
+    codes, label_sets, per_set = [], [], []
+
+    for code, synonyms in entity_types.items():
+        golds = gold_by_code[code]
+        memo = {}  # (document, spans prédits) → comptages : les combinaisons redonnent souvent les mêmes spans
+        for label_set, spans_by_text in iter_label_sets(debug_data, code, synonyms, strategy, min_k):
+            counts = np.zeros((n_docs, 4), dtype=np.int32)  # tp_exact, tp_partial, fp, fn
+            for i, text_id in enumerate(text_ids):
+                pred = spans_by_text.get(text_id)
+                if not pred:
+                    counts[i, 3] = len(golds[i])
+                    continue
+                key = (i, frozenset(pred))
+                if key not in memo:
+                    memo[key] = match_spans(golds[i], pred, threshold)
+                counts[i] = memo[key]
+            codes.append(code)
+            label_sets.append(label_set)
+            per_set.append(counts)
+
+    # Une ligne par (label_set, document, mode), colonnes construites en bloc
+    n_sets = len(per_set)
+    stacked = np.stack(per_set) if per_set else np.zeros((0, n_docs, 4), dtype=np.int32)
+    tp = np.stack([stacked[..., 0], stacked[..., 0] + stacked[..., 1]], axis=-1)
+    tns = np.stack([other_by_code[code] for code in codes]) if codes else np.zeros((0, n_docs), dtype=np.int32)
+    per_row = 2 * n_docs
+    counts = pd.DataFrame({
+        "text_id": np.tile(np.repeat(text_ids, 2), n_sets),
+        "doc_len": np.tile(np.repeat(doc_lens, 2), n_sets),
+        "entity_type": np.repeat(np.array(codes, dtype=object), per_row),
+        "strategy": strategy,
+        "label_set": np.repeat(np.array(label_sets, dtype=object), per_row),
+        "mode": np.tile(np.array(MODES, dtype=object), n_sets * n_docs),
+        "TP": tp.ravel(),
+        "FP": np.repeat(stacked[..., 2], 2, axis=-1).ravel(),
+        "FN": np.repeat(stacked[..., 3], 2, axis=-1).ravel(),
+        "TN": np.repeat(tns, 2, axis=-1).ravel(),
+    }, columns=KEY_COLUMNS[:1] + ["doc_len"] + KEY_COLUMNS[1:] + COUNT_COLUMNS)
+    return compact_counts(counts)
+
+
+def compact_counts(counts: pd.DataFrame) -> pd.DataFrame:
+    """Types compacts : catégories pour les clés, entiers 32 bits pour les comptages."""
+    counts = counts.copy()
+    for col in KEY_COLUMNS:
+        counts[col] = counts[col].astype("category")
+    for col in COUNT_COLUMNS + ["doc_len"]:
+        counts[col] = counts[col].astype(np.int32)
+    return counts
+
+
+def add_prf1(df: pd.DataFrame, suffix: str = "", ndigits: int = 6) -> pd.DataFrame:
+    """Ajoute precision, recall et f1 calculés de façon vectorisée à partir de TP/FP/FN."""
+    tp = df["TP"].to_numpy(dtype=float)
+    fp = df["FP"].to_numpy(dtype=float)
+    fn = df["FN"].to_numpy(dtype=float)
+    precision = np.divide(tp, tp + fp, out=np.zeros_like(tp), where=(tp + fp) > 0)
+    recall = np.divide(tp, tp + fn, out=np.zeros_like(tp), where=(tp + fn) > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros_like(tp), where=(precision + recall) > 0)
+    df = df.copy()
+    df[f"precision{suffix}"] = np.round(precision, ndigits)
+    df[f"recall{suffix}"] = np.round(recall, ndigits)
+    df[f"f1{suffix}"] = np.round(f1, ndigits)
+    return df
+
+
+def aggregate_counts(counts: pd.DataFrame, by=("entity_type", "label_set"), mode: str = "partial",
+                     ndigits: int = 6) -> pd.DataFrame:
+    """Somme des comptages par groupe (mode filtré) puis précision/rappel/F1."""
+    sub = counts[counts["mode"] == mode] if mode else counts
+    agg = sub.groupby(list(by), sort=False, observed=True)[COUNT_COLUMNS].sum().reset_index()
+    return add_prf1(agg, ndigits=ndigits)
+
+
+def macro_average(counts: pd.DataFrame, by=("entity_type", "label_set"), mode: str = "partial") -> pd.DataFrame:
+    """Moyenne macro (par document) de précision/rappel/F1 au lieu de la somme micro des comptages."""
+    per_doc = add_prf1(counts[counts["mode"] == mode] if mode else counts)
+    return (per_doc.groupby(list(by), sort=False, observed=True)[["precision", "recall", "f1"]]
+            .mean().round(6).reset_index())
+
+
+def add_length_bucket(counts: pd.DataFrame, edges=(0, 500, 1000, 2000, np.inf)) -> pd.DataFrame:
+    """Ajoute une colonne length_bucket (longueur du texte en caractères) pour les agrégations."""
+    counts = counts.copy()
+    counts["length_bucket"] = pd.cut(counts["doc_len"], bins=list(edges), right=False)
+    return counts
+
+
+def metrics_table(counts: pd.DataFrame, label_column: str = "combo") -> pd.DataFrame:
+    """
+    Table de métriques au format historique des évaluateurs :
+    entity_type, <label_column>, precision, recall, f1, TP, FP, FN, TN (mode partiel).
+    """
+    agg = aggregate_counts(counts, mode="partial")
+    agg = agg.rename(columns={"label_set": label_column})
+    agg["entity_type"] = agg["entity_type"].astype(str)
+    agg[label_column] = agg[label_column].astype(str)
+    return agg[["entity_type", label_column, "precision", "recall", "f1"] + COUNT_COLUMNS]
+
+
+def metrics_table_exact_partial(counts: pd.DataFrame, label_column: str = "combo") -> pd.DataFrame:
+    """Table exact/partiel côte à côte (precision_exact, ..., f1_partial)."""
+    tables = []
+    for mode in MODES:
+        agg = aggregate_counts(counts, mode=mode, ndigits=4).drop(columns=COUNT_COLUMNS)
+        agg = agg.rename(columns={m: f"{m}_{mode}" for m in ("precision", "recall", "f1")})
+        tables.append(agg.set_index(["entity_type", "label_set"]))
+    df = pd.concat(tables, axis=1).reset_index()
+    df = df.rename(columns={"label_set": label_column})
+    df["entity_type"] = df["entity_type"].astype(str)
+    df[label_column] = df[label_column].astype(str)
+    return df
+
+
+def counts_path(name: str) -> Path:
+    return COUNTS_DIR / f"counts_{name}.parquet"
+
+
+def save_counts(counts: pd.DataFrame, name: str) -> Path:
+    """Sauvegarde colonnaire (Parquet) de la table de comptages."""
+    path = counts_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    counts.to_parquet(path, index=False)
+    print(f" Counts saved to: {path}")
+    return path
+
+
+def load_counts(name: str) -> pd.DataFrame:
+    return compact_counts(pd.read_parquet(counts_path(name)))
@@ -0,0 +1,301 @@
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import argparse
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from collections.abc import Mapping
+
+import orjson
+
+from src.config import DATA_PATH, PRED_SYNONYM_JSON, PRED_COMBINATIONS_JSON
+
+# Couche de décodage des fichiers JSON du projet (corpus, prédictions, traces).
+# orjson remplace le parseur standard ; chaque enregistrement est vérifié contre un schéma
+# (champs obligatoires et types) puis converti en structure compacte :
+#   - spans [start, end] vérifiés mais laissés en listes (les consommateurs indexent span[0] / span[1]
+#     ou construisent eux-mêmes leurs tuples) : pas d'objet recréé par enregistrement ;
+#   - chaînes répétées internées (sys.intern) : text_id, labels, codes, et surtout le texte
+#     complet du document que chaque prédiction recopie, partagé au lieu d'être dupliqué.
+# Les fichiers sont projetés en mémoire (mmap) et lus directement par orjson, sans copie en bytes.
+# Les fichiers de prédictions par combinaison peuvent être ouverts paresseusement : seule la
+# section (clé "<code>__<label_set>") demandée est décodée, via un index d'offsets mis en cache.
+
+# ════════════════════ SCHÉMAS ════════════════════
+# champ → type attendu ; "span" désigne une liste [start, end] d'entiers
+CORPUS_DOC = {"text_id": str, "text": str, "entities": list}
+CORPUS_ENTITY = {"code_entity": str, "spans": "span", "entity": str}
+PREDICTION = {"text_id": str, "text": str, "span": "span", "entity_text": str, "label": str}
+TRACE = {"text_id": str, "status": str, "entity_code": str}
+TRACE_OPTIONAL = {"span": "span", "predicted_span": "span"}   # absents des traces TN
+
+
+def _error(record, schema: dict, optional: dict, where: str):
+    """Message précis du premier écart au schéma (chemin lent, seulement en cas d'échec)."""
+    if not isinstance(record, dict):
+        return f"{where} : objet attendu, {type(record).__name__} trouvé"
+    for field, expected in {**schema, **optional}.items():
+        if field not in record:
+            if field in schema:
+                return f"{where} : champ '{field}' manquant"
+            continue
+        value = record[field]
+        if expected == "span":
+            if not (isinstance(value, list) and len(value) == 2 and all(isinstance(v, int) for v in value)):
+                return f"{where} : '{field}' doit être [start, end], {value!r} trouvé"
+        elif not isinstance(value, expected):
+            return f"{where} : '{field}' doit être {expected.__name__}, {type(value).__name__} trouvé"
+    return f"{where} : enregistrement invalide"
+
+
+def decode_records(records, schema: dict, where: str, optional: dict = None) -> list:
+    """
+    Vérifie chaque enregistrement contre le schéma et le compacte sur place : chaînes internées
+    (sys.intern refuse tout ce qui n'est pas une chaîne, ce qui tient lieu de vérification de type),
+    spans vérifiés sans être recopiés. Une seule passe, sans copie des enregistrements.
+    """
+    optional = optional or {}
+    if not isinstance(records, list):
+        raise ValueError(f"{where} : liste attendue, {type(records).__name__} trouvé")
+    spans = [f for f, t in schema.items() if t == "span"]
+    optional_spans = [f for f, t in optional.items() if t == "span"]
+    strings = [f for f, t in schema.items() if t is str]
+    others = [(f, t) for f, t in schema.items() if t not in ("span", str)]
+    intern = sys.intern
+    for i, record in enumerate(records):
+        try:
+            for field in strings:
+                record[field] = intern(record[field])
+            for field, expected in others:
+                if not isinstance(record[field], expected):
+                    raise TypeError
+            for field in spans:
+                start, end = record[field]
+                if type(start) is not int or type(end) is not int:
+                    raise TypeError
+            for field in optional_spans:
+                if field in record:
+                    start, end = record[field]
+                    if type(start) is not int or type(end) is not int:
+                        raise TypeError
+        except (TypeError, KeyError, ValueError):
+            raise ValueError(_error(record, schema, optional, f"{where}[{i}]")) from None
+    return records
+
+
+@contextmanager
+def mapped(path: Path):
+    """Contenu du fichier projeté en mémoire (mmap), lisible par orjson sans copie en bytes."""
+    with Path(path).open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:  # mmap refuse les fichiers vides
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            yield view
+
+
+# ════════════════════ CORPUS ════════════════════
+
+def decode_corpus(data: bytes, where: str = "corpus") -> list:
+    docs = decode_records(orjson.loads(data), CORPUS_DOC, where)
+    for i, doc in enumerate(docs):
+        decode_records(doc["entities"], CORPUS_ENTITY, f"{where}[{i}].entities")
+    return docs
+
+
+def load_corpus(path: Path = DATA_PATH) -> list:
+    with mapped(path) as data:
+        return decode_corpus(data, str(path))
+
+
+# ════════════════════ PRÉDICTIONS ════════════════════
+
+def decode_section(entries, where: str) -> list:
+    return decode_records(entries, PREDICTION, where)
+
+
+def load_predictions(path: Path = PRED_SYNONYM_JSON) -> dict:
+    """{"<code>__<label_set>": [prédictions]} entièrement décodé."""
+    with mapped(path) as raw:
+        data = orjson.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} : objet {{clé: [prédictions]}} attendu")
+    return {sys.intern(key): decode_section(entries, f"{path}:{key}") for key, entries in data.items()}
+
+
+# Jetons utiles au repérage des sections : chaînes complètes (échappements compris) et crochets.
+# La regex avale chaque chaîne d'un bloc (en C) : le texte des documents ne coûte pas une itération
+# Python par caractère. Forme "déroulée" : les suites de caractères ordinaires sont consommées d'un
+# seul [^"\\]*, sans alternative essayée caractère par caractère.
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]', re.DOTALL)
+
+
+def section_index(data) -> dict:
+    """
+    {clé de premier niveau: (offset début, offset fin)} de la valeur (liste) associée,
+    en octets, dans un objet JSON {clé: [...]}.
+    """
+    index, depth, key, start = {}, 0, None, None
+    for m in _TOKEN.finditer(data):
+        first = data[m.start()]
+        if first == 0x22:                     # '"'
+            if depth == 1 and key is None:
+                key = orjson.loads(m.group())
+            continue
+        if first in b"[{":
+            if depth == 1:
+                start = m.start()
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                index[key] = (start, m.end())
+                key = start = None
+    return index
+
+
+def _index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".index.json")
+
+
+def load_section_index(path: Path) -> dict:
+    """Index des sections, recalculé seulement si le fichier a changé (taille / date)."""
+    stat = path.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    cache = _index_path(path)
+    if cache.exists():
+        cached = orjson.loads(cache.read_bytes())
+        if cached["stamp"] == stamp:
+            return {key: tuple(bounds) for key, bounds in cached["sections"].items()}
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        sections = section_index(mm)
+    try:
+        cache.write_bytes(orjson.dumps({"stamp": stamp, "sections": sections}))
+    except OSError:
+        pass  # dossier en lecture seule : l'index reste en mémoire
+    return sections
+
+
+class LazySections(Mapping):
+    """
+    Vue {clé: [prédictions]} d'un gros fichier de prédictions dont chaque section n'est lue
+    et décodée qu'au premier accès (puis gardée en mémoire, sauf release()). S'utilise comme
+    le dict de load_json : debug_data.get(f"{code}__{label_set}", []), itération sur les clés.
+    """
+
+    def __init__(self, path: Path = PRED_COMBINATIONS_JSON):
+        self.path = Path(path)
+        self.index = load_section_index(self.path)
+        self._decoded = {}
+
+    def __getitem__(self, key):
+        if key not in self._decoded:
+            start, end = self.index[key]
+            with self.path.open("rb") as f:
+                f.seek(start)
+                raw = f.read(end - start)
+            self._decoded[key] = decode_section(orjson.loads(raw), f"{self.path}:{key}")
+        return self._decoded[key]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def release(self, key=None):
+        """Libère une section décodée (ou toutes)."""
+        if key is None:
+            self._decoded.clear()
+        else:
+            self._decoded.pop(key, None)
+
+
+def open_predictions(path: Path, lazy: bool = None):
+    """
+    Prédictions décodées : LazySections pour le fichier des combinaisons (par défaut),
+    dict entièrement décodé sinon.
+    """
+    if lazy is None:
+        lazy = Path(path) == PRED_COMBINATIONS_JSON
+    return LazySections(path) if lazy else load_predictions(path)
+
+
+def load_sections(path: Path, prefix: str) -> dict:
+    """Sections dont la clé commence par `prefix` (ex. "DISO__"), sans décoder le reste du fichier."""
+    sections = LazySections(path)
+    return {key: sections[key] for key in sections if key.startswith(prefix)}
+
+
+# ════════════════════ TRACES ════════════════════
+
+def load_traces(path: Path) -> list:
+    with mapped(path) as raw:
+        data = orjson.loads(raw)
+    return decode_records(data, TRACE, str(path), TRACE_OPTIONAL)
+
+
+# ════════════════════ BENCHMARK ════════════════════
+
+def _measure(load, repeat: int = 3):
+    """
+    Meilleur temps sur `repeat` essais, puis mémoire retenue et pic lors d'un chargement séparé sous
+    tracemalloc. Ce dernier ralentit surtout les allocations Python : sa durée n'est pas une mesure
+    de temps, seule la colonne `seconds` en est une.
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        load()
+        seconds = min(seconds, time.perf_counter() - t0)
+    tracemalloc.start()
+    data = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return seconds, retained, peak
+
+
+def benchmark(path: Path, kind: str, key: str = None) -> list:
+    """
+    Temps, mémoire retenue et pic (tracemalloc) : json.load standard vs décodage typé.
+    Pour kind="predictions" avec une clé, ajoute l'accès paresseux à cette seule section.
+    Seule la colonne `seconds` (meilleur de 3 chargements sans tracemalloc) mesure le temps.
+    """
+    decoders = {"corpus": load_corpus, "predictions": load_predictions, "traces": load_traces}
+
+    def stdlib():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    cases = [("json.load", stdlib), (f"orjson + schéma ({kind})", lambda: decoders[kind](path))]
+    if kind == "predictions" and key:
+        load_section_index(path)  # l'index est construit une fois, hors mesure
+        cases.append((f"section paresseuse '{key}'", lambda: LazySections(path)[key]))
+
+    print("  (temps : meilleur de 3 chargements sans tracemalloc ; mémoire : chargement séparé sous tracemalloc)")
+    rows = []
+    for name, load in cases:
+        seconds, retained, peak = _measure(load)
+        rows.append({"decoder": name, "seconds": round(seconds, 4),
+                     "retained_mb": round(retained / 2 ** 20, 2), "peak_mb": round(peak / 2 ** 20, 2)})
+        print(f"  {name:<40} {seconds * 1000:9.1f} ms   retenu {retained / 2 ** 20:8.2f} Mo"
+              f"   pic {peak / 2 ** 20:8.2f} Mo")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du décodage typé (orjson) vs json.load")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--kind", choices=["corpus", "predictions", "traces"], default="predictions")
+    parser.add_argument("--key", default=None, help="section à charger paresseusement (ex. DISO__disease)")
+    args = parser.parse_args()
+
+    benchmark(args.path, args.kind, args.key)
@@ -0,0 +1,254 @@
+import re
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.config import ENTITY_TYPES, DATA_PATH, PRED_SYNONYM_JSON, PRED_COMBINATIONS_JSON
+from src.utils import load_corpus
+from src.decoding import open_predictions
+from src.counts import iter_label_sets, compact_counts, aggregate_counts, KEY_COLUMNS, COUNT_COLUMNS
+from src.spans import interval_join
+from src.metrics_store import start_run, save_table
+
+# Évaluation au niveau caractère ou mot, insensible aux frontières exactes des spans.
+# Les spans gold et prédits sont projetés sur un axe unique (textes concaténés) puis :
+#   - encoding "mask" : rendus en masques booléens NumPy, comptés par opérations bit à bit ;
+#   - encoding "rle"  : fusionnés en plages disjointes (run-length), comptés par jointure d'intervalles,
+#                       sans allouer un octet par caractère (longs documents).
+# Le résultat a le format de la table de comptages par document (src/counts.py), mode = "char" ou "word".
+UNITS = ("char", "word")
+ENCODINGS = ("mask", "rle")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def corpus_axis(corpus) -> dict:
+    """Axe global : le caractère j du document i est à la position offsets[i] + j."""
+    lengths = np.array([len(doc["text"]) for doc in corpus], dtype=np.int64)
+    text_ids = [doc["text_id"] for doc in corpus]
+    return {
+        "text_ids": text_ids,
+        "lengths": lengths,
+        "offsets": np.r_[0, np.cumsum(lengths)[:-1]].astype(np.int64),
+        "total": int(lengths.sum()),
+        "doc_index": {text_id: i for i, text_id in enumerate(text_ids)},
+    }
+
+
+def project_spans(axis: dict, spans_by_text: dict):
+    """(starts, ends) globaux des spans, bornés à la longueur de leur document."""
+    rows = [
+        (axis["doc_index"][text_id], span[0], span[1])
+        for text_id, spans in spans_by_text.items() if text_id in axis["doc_index"]
+        for span in spans
+    ]
+    arr = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    doc = arr[:, 0]
+    start = np.clip(arr[:, 1], 0, axis["lengths"][doc])
+    end = np.clip(arr[:, 2], 0, axis["lengths"][doc])
+    keep = end > start
+    return axis["offsets"][doc[keep]] + start[keep], axis["offsets"][doc[keep]] + end[keep]
+
+
+def doc_of(axis: dict, positions):
+    """Indice du document contenant chaque position globale."""
+    return np.searchsorted(axis["offsets"], positions, side="right") - 1
+
+
+def word_tokens(corpus, axis: dict):
+    """(starts, ends) globaux des mots (\\w+) du corpus."""
+    starts, ends = [], []
+    for doc, offset in zip(corpus, axis["offsets"]):
+        for m in WORD_PATTERN.finditer(doc["text"]):
+            starts.append(offset + m.start())
+            ends.append(offset + m.end())
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+
+def gold_spans_by_text(corpus, code: str) -> dict:
+    return {doc["text_id"]: {tuple(ent["spans"]) for ent in doc["entities"] if ent["code_entity"] == code}
+            for doc in corpus}
+
+
+# ════════════════════ MASQUES BOOLÉENS ════════════════════
+
+def render_mask(starts, ends, total: int) -> np.ndarray:
+    """Masque booléen de l'union des spans (différences + somme cumulée, sans boucle Python)."""
+    delta = np.zeros(total + 1, dtype=np.int32)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    return np.cumsum(delta[:-1]) > 0
+
+
+def token_mask(mask: np.ndarray, tok_starts, tok_ends) -> np.ndarray:
+    """Un mot est positif si au moins un de ses caractères l'est."""
+    csum = np.r_[0, np.cumsum(mask, dtype=np.int64)]
+    return (csum[tok_ends] - csum[tok_starts]) > 0
+
+
+def mask_counts(gold: np.ndarray, pred: np.ndarray, unit_doc: np.ndarray, n_docs: int):
+    """TP/FP/FN/TN par document à partir de deux masques alignés (un élément = un caractère ou un mot)."""
+    cells = {
+        "TP": gold & pred,
+        "FP": ~gold & pred,
+        "FN": gold & ~pred,
+        "TN": ~gold & ~pred,
+    }
+    return {name: np.bincount(unit_doc[cell], minlength=n_docs) for name, cell in cells.items()}
+
+
+# ════════════════════ PLAGES (RUN-LENGTH) ════════════════════
+
+def merge_runs(starts, ends):
+    """Fusionne des intervalles [start, end) en plages disjointes triées."""
+    if len(starts) == 0:
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    # Seuls les intervalles qui se chevauchent sont fusionnés : deux plages contiguës restent
+    # distinctes, ce qui empêche une plage de franchir la frontière entre deux documents.
+    new_run = np.r_[True, starts[1:] >= reach[:-1]]
+    run_id = np.cumsum(new_run) - 1
+    run_ends = np.zeros(run_id[-1] + 1, dtype=np.int64)
+    np.maximum.at(run_ends, run_id, ends)
+    return starts[new_run], run_ends
+
+
+def runs_per_doc(starts, ends, axis: dict):
+    """Longueur couverte par document (les plages ne franchissent jamais une frontière de document)."""
+    return np.bincount(doc_of(axis, starts), weights=ends - starts, minlength=len(axis["lengths"])).astype(np.int64)
+
+
+def rle_counts(gold_runs, pred_runs, axis: dict):
+    """TP/FP/FN/TN caractère par document à partir des plages gold et prédites."""
+    n_docs = len(axis["lengths"])
+    ia, _, overlap = interval_join(*gold_runs, *pred_runs)
+    tp = np.bincount(doc_of(axis, gold_runs[0][ia]), weights=overlap, minlength=n_docs).astype(np.int64)
+    gold = runs_per_doc(*gold_runs, axis)
+    pred = runs_per_doc(*pred_runs, axis)
+    return {"TP": tp, "FP": pred - tp, "FN": gold - tp, "TN": axis["lengths"] - gold - pred + tp}
+
+
+def rle_token_covered(tok_starts, tok_ends, runs):
+    covered = np.zeros(len(tok_starts), dtype=bool)
+    it, _, _ = interval_join(tok_starts, tok_ends, *runs)
+    covered[it] = True
+    return covered
+
+
+# ════════════════════ ÉVALUATION ════════════════════
+
+def build_mask_counts(debug_data, corpus, strategy: str = "single", unit: str = "char", encoding: str = "mask",
+                      min_k: int = 2) -> pd.DataFrame:
+    """
+    Table de comptages par document au niveau caractère ou mot (même format que build_counts,
+    colonne mode = unit). Pour "word", un mot est compté positif dès qu'un de ses caractères l'est.
+    """
+    if unit not in UNITS:
+        raise ValueError(f"Unité inconnue : {unit}")
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Encodage inconnu : {encoding}")
+
+    axis = corpus_axis(corpus)
+    n_docs = len(axis["lengths"])
+    if unit == "word":
+        tok_starts, tok_ends = word_tokens(corpus, axis)
+        unit_doc = doc_of(axis, tok_starts)
+        doc_units = np.bincount(unit_doc, minlength=n_docs)
+    else:
+        unit_doc = np.repeat(np.arange(n_docs), axis["lengths"])
+
+    frames = []
+    for code, synonyms in ENTITY_TYPES.items():
+        gold_spans = project_spans(axis, gold_spans_by_text(corpus, code))
+        if encoding == "mask":
+            gold = render_mask(*gold_spans, axis["total"])
+            if unit == "word":
+                gold = token_mask(gold, tok_starts, tok_ends)
+        else:
+            gold_runs = merge_runs(*gold_spans)
+            if unit == "word":
+                gold = rle_token_covered(tok_starts, tok_ends, gold_runs)
+
+        for label_set, spans_by_text in iter_label_sets(debug_data, code, synonyms, strategy, min_k):
+            pred_spans = project_spans(axis, spans_by_text)
+            if encoding == "mask":
+                pred = render_mask(*pred_spans, axis["total"])
+                if unit == "word":
+                    pred = token_mask(pred, tok_starts, tok_ends)
+                counts = mask_counts(gold, pred, unit_doc, n_docs)
+            elif unit == "word":
+                pred = rle_token_covered(tok_starts, tok_ends, merge_runs(*pred_spans))
+                counts = mask_counts(gold, pred, unit_doc, n_docs)
+            else:
+                counts = rle_counts(gold_runs, merge_runs(*pred_spans), axis)
+
+            frames.append(pd.DataFrame({
+                "text_id": axis["text_ids"],
+                "doc_len": axis["lengths"] if unit == "char" else doc_units,
+                "entity_type": code,
+                "strategy": strategy,
+                "label_set": label_set,
+                "mode": unit,
+                **counts,
+            }))
+
+    counts = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=KEY_COLUMNS[:1] + ["doc_len"] + KEY_COLUMNS[1:] + COUNT_COLUMNS)
+    return compact_counts(counts)
+
+
+def mask_overlap(debug_data, corpus, strategy: str = "single", min_k: int = 2) -> pd.DataFrame:
+    """
+    Jaccard caractère entre ensembles de labels d'un même type : masques empaquetés en bits
+    (np.packbits), intersections et unions par AND/OR puis comptage de bits.
+    """
+    axis = corpus_axis(corpus)
+    rows = []
+    for code, synonyms in ENTITY_TYPES.items():
+        names, packed = [], []
+        for label_set, spans_by_text in iter_label_sets(debug_data, code, synonyms, strategy, min_k):
+            names.append(label_set)
+            packed.append(np.packbits(render_mask(*project_spans(axis, spans_by_text), axis["total"])))
+        if not names:
+            continue
+        bits = np.stack(packed)
+        inter = np.bitwise_count(bits[:, None, :] & bits[None, :, :]).sum(axis=2, dtype=np.int64)
+        union = np.bitwise_count(bits[:, None, :] | bits[None, :, :]).sum(axis=2, dtype=np.int64)
+        jac = np.divide(inter, union, out=np.ones(inter.shape), where=union > 0)
+        for i, j in zip(*np.triu_indices(len(names), k=1)):
+            rows.append({"entity_type": code, "label_a": names[i], "label_b": names[j],
+                         "intersection": int(inter[i, j]), "union": int(union[i, j]),
+                         "jaccard": round(float(jac[i, j]), 6)})
+    return pd.DataFrame(rows, columns=["entity_type", "label_a", "label_b", "intersection", "union", "jaccard"])
+
+
+def main_masks(strategy: str = "single", unit: str = "char", encoding: str = "mask"):
+    """Évaluation caractère/mot et recouvrement caractère entre ensembles de labels."""
+    source = PRED_COMBINATIONS_JSON if strategy == "combo" else PRED_SYNONYM_JSON
+    print(f"Chargement des prédictions depuis {source}...")
+    debug_data = open_predictions(source)
+    corpus = load_corpus(DATA_PATH)
+
+    print(f"Évaluation niveau {unit} (stratégie : {strategy}, encodage : {encoding})...")
+    counts = build_mask_counts(debug_data, corpus, strategy=strategy, unit=unit, encoding=encoding)
+    metrics = aggregate_counts(counts, mode=unit)
+    metrics["entity_type"] = metrics["entity_type"].astype(str)
+    metrics["label_set"] = metrics["label_set"].astype(str)
+
+    run_id = start_run("evaluate_masks.py", params={"strategy": strategy, "unit": unit, "encoding": encoding})
+    save_table(run_id, f"metrics_{unit}_{strategy}", metrics)
+    save_table(run_id, f"overlap_char_{strategy}", mask_overlap(debug_data, corpus, strategy=strategy))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategy", default="single", choices=["single", "union", "intersection", "combo"],
+                        help="Construction des ensembles de labels (voir src/counts.py)")
+    parser.add_argument("--unit", default="char", choices=UNITS, help="Évaluation par caractère ou par mot")
+    parser.add_argument("--encoding", default="mask", choices=ENCODINGS,
+                        help="Masques booléens ou plages run-length (longs documents)")
+    args = parser.parse_args()
+
+    main_masks(strategy=args.strategy, unit=args.unit, encoding=args.encoding)
@@ -0,0 +1,157 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.config import ENTITY_TYPES, DATA_PATH, PRED_SYNONYM_JSON, PRED_COMBINATIONS_JSON
+from src.utils import load_corpus
+from src.decoding import open_predictions
+from src.counts import iter_label_sets
+from src.spans import global_coords, corpus_stride, interval_join, best_match
+from src.metrics_store import start_run, save_table
+
+# Schémas d'évaluation SemEval 2013 (style nervaluate) :
+#   strict  : frontières exactes ET type correct
+#   exact   : frontières exactes, type ignoré
+#   partial : frontières exactes ou chevauchement, type ignoré (un PAR compte pour 0.5)
+#   type    : chevauchement ET type correct
+SCHEMAS = ("strict", "exact", "partial", "type")
+CATEGORIES = ("COR", "INC", "PAR", "MIS", "SPU")
+
+# Catégorie attribuée à une prédiction selon (frontières exactes, même type), par schéma.
+# Une prédiction sans chevauchement est SPU pour tous les schémas.
+_PAIR_CATEGORY = {
+    (True, True):   {"strict": "COR", "exact": "COR", "partial": "COR", "type": "COR"},
+    (True, False):  {"strict": "INC", "exact": "COR", "partial": "COR", "type": "INC"},
+    (False, True):  {"strict": "INC", "exact": "INC", "partial": "PAR", "type": "COR"},
+    (False, False): {"strict": "INC", "exact": "INC", "partial": "PAR", "type": "INC"},
+}
+
+
+def gold_arrays(corpus, codes):
+    """Spans gold de tous les types sous forme de tableaux (doc, code, start, end), dédupliqués."""
+    code_ids = {code: i for i, code in enumerate(codes)}
+    rows = set()
+    for doc_idx, doc in enumerate(corpus):
+        for ent in doc["entities"]:
+            code = ent["code_entity"]
+            if code in code_ids:
+                rows.add((doc_idx, code_ids[code], ent["spans"][0], ent["spans"][1]))
+    arr = np.array(sorted(rows), dtype=np.int64).reshape(-1, 4)
+    return arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3]
+
+
+def pred_arrays(spans_by_text: dict, doc_index: dict):
+    """Prédictions d'un ensemble de labels sous forme de tableaux (doc, start, end)."""
+    rows = [
+        (doc_index[text_id], span[0], span[1])
+        for text_id, spans in spans_by_text.items() if text_id in doc_index
+        for span in spans
+    ]
+    arr = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return arr[:, 0], arr[:, 1], arr[:, 2]
+
+
+def classify(pred, gold, code_id: int, stride: int) -> dict:
+    """
+    Une seule jointure d'intervalles prédictions × gold (tous types) puis classement vectorisé
+    de chaque prédiction pour les quatre schémas. Retourne {schéma: {catégorie: effectif}}.
+    """
+    p_doc, p_start, p_end = pred
+    g_doc, g_code, g_start, g_end = gold
+    pa, pb = global_coords(p_doc, p_start, p_end, stride)
+    ga, gb = global_coords(g_doc, g_start, g_end, stride)
+    ip, ig, overlap = interval_join(pa, pb, ga, gb)
+
+    exact = (pa[ip] == ga[ig]) & (pb[ip] == gb[ig])
+    same_type = g_code[ig] == code_id
+    # Priorité : frontières exactes, puis même type, puis plus grand chevauchement.
+    best = best_match(ip, [exact, same_type, overlap], len(pa))
+
+    matched = best >= 0
+    best_exact = exact[best[matched]]
+    best_same = same_type[best[matched]]
+
+    result = {schema: dict.fromkeys(CATEGORIES, 0) for schema in SCHEMAS}
+    for schema in SCHEMAS:
+        result[schema]["SPU"] = int((~matched).sum())
+    for (is_exact, is_same), categories in _PAIR_CATEGORY.items():
+        n = int(((best_exact == is_exact) & (best_same == is_same)).sum())
+        for schema, category in categories.items():
+            result[schema][category] += n
+
+    # MIS : spans gold du type évalué qu'aucune prédiction ne chevauche.
+    own_gold = g_code == code_id
+    touched = np.zeros(len(ga), dtype=bool)
+    touched[ig] = True
+    n_missing = int((own_gold & ~touched).sum())
+    for schema in SCHEMAS:
+        result[schema]["MIS"] = n_missing
+    return result
+
+
+def schema_metrics(row: dict, schema: str):
+    """Précision/rappel/F1 SemEval : POS = COR+INC+PAR+MIS, ACT = COR+INC+PAR+SPU."""
+    cor, inc, par, mis, spu = (row[c] for c in CATEGORIES)
+    possible = cor + inc + par + mis
+    actual = cor + inc + par + spu
+    credit = cor + 0.5 * par if schema == "partial" else cor
+    precision = credit / actual if actual else 0
+    recall = credit / possible if possible else 0
+    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) else 0
+    return possible, actual, precision, recall, f1
+
+
+def evaluate_schemas(debug_data, corpus, strategy: str = "single", min_k: int = 2) -> pd.DataFrame:
+    """
+    Évalue chaque ensemble de labels selon les quatre schémas en une seule passe :
+    une jointure d'intervalles par ensemble de labels couvre tout le corpus.
+    """
+    codes = list(ENTITY_TYPES)
+    stride = corpus_stride(corpus)
+    doc_index = {doc["text_id"]: i for i, doc in enumerate(corpus)}
+    gold = gold_arrays(corpus, codes)
+
+    results = []
+    for code_id, (code, synonyms) in enumerate(ENTITY_TYPES.items()):
+        for label_set, spans_by_text in iter_label_sets(debug_data, code, synonyms, strategy, min_k):
+            pred = pred_arrays(spans_by_text, doc_index)
+            by_schema = classify(pred, gold, code_id, stride)
+            for schema in SCHEMAS:
+                row = by_schema[schema]
+                possible, actual, p, r, f1 = schema_metrics(row, schema)
+                results.append({
+                    "entity_type": code,
+                    "label_set": label_set,
+                    "schema": schema,
+                    **row,
+                    "POS": possible,
+                    "ACT": actual,
+                    "precision": round(p, 6),
+                    "recall": round(r, 6),
+                    "f1": round(f1, 6),
+                })
+    return pd.DataFrame(results)
+
+
+def main_schemas(strategy: str = "single"):
+    """Évaluation multi-schémas ; les prédictions combinées viennent de debug_combinations.json."""
+    source = PRED_COMBINATIONS_JSON if strategy == "combo" else PRED_SYNONYM_JSON
+    print(f"Chargement des prédictions depuis {source}...")
+    debug_data = open_predictions(source)
+    corpus = load_corpus(DATA_PATH)
+
+    print(f"Évaluation strict/exact/partial/type (stratégie : {strategy})...")
+    df = evaluate_schemas(debug_data, corpus, strategy=strategy)
+
+    run_id = start_run("evaluate_schemas.py", params={"strategy": strategy})
+    save_table(run_id, f"metrics_schemas_{strategy}", df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategy", default="single", choices=["single", "union", "intersection", "combo"],
+                        help="Construction des ensembles de labels (voir src/counts.py)")
+    args = parser.parse_args()
+
+    main_schemas(strategy=args.strategy)
@@ -1,91 +1,24 @@
-import json
-import itertools
-import pandas as pd
-import matplotlib.pyplot as plt
-from pathlib import Path
-from collections import defaultdict
+from src.config import DATA_PATH, PRED_COMBINATIONS_JSON, UNION_DIR
 
-from src.config import ENTITY_TYPES, DATA_PATH, PRED_COMBINATIONS_JSON, UNION_DIR ,DEFAULT_JACCARD_THRESHOLD , OUTPUT_DIR
-
-from src.utils import load_json, jaccard, prf1
+from src.utils import load_json
+from src.counts import build_counts, metrics_table_exact_partial, save_counts
+from src.rendering import make_job, render_all, combo_size_colors, unique_labels
+from src.metrics_store import start_run, save_table
 
 OUTPUT_UNION_DIR=UNION_DIR
-def evaluate_union(threshold=0.5):
+def evaluate_union(threshold=0.5, plots=True, force=False):
     print(f" Évaluation par union (Jaccard threshold = {threshold})")
     debug_data = load_json(PRED_COMBINATIONS_JSON)
     corpus = load_json(DATA_PATH)
-    corpus_map = {doc["text_id"]: doc for doc in corpus}
-    
-    results = []
-
-    for entity_code, synonyms in ENTITY_TYPES.items():
-        for k in range(2, len(synonyms) + 1):
-            for combo in itertools.combinations(synonyms, k):
-                combo_key = "__".join(combo)
-                debug_key = f"{entity_code}__{combo_key}"
-
-                spans_by_text = defaultdict(set)
-                for entry in debug_data.get(debug_key, []):
-                    spans_by_text[entry["text_id"]].add(tuple(entry["span"]))
-
-                tp_ex = fp_ex = fn_ex = 0
-                tp_pa = fp_pa = fn_pa = 0
-
-                for doc in corpus:
-                    gold = {
-                        tuple(ent["spans"])
-                        for ent in doc["entities"]
-                        if ent["code_entity"] == entity_code
-                    }
-                    pred = spans_by_text.get(doc["text_id"], set())
-
-                    matched_gold = set()
-                    matched_pred = set()
-
-                    # Exact match
-                    for span in pred:
-                        if span in gold:
-                            tp_ex += 1
-                            matched_gold.add(span)
-                            matched_pred.add(span)
-
-                    # Partial match (only on unmatched)
-                    for span_p in pred - matched_pred:
-                        for span_g in gold - matched_gold:
-                            if jaccard(set(range(*span_p)), set(range(*span_g))) >= threshold:
-                                tp_pa += 1
-                                matched_gold.add(span_g)
-                                matched_pred.add(span_p)
-                                break
-
-                    fp_ex += len(pred - matched_pred)
-                    fn_ex += len(gold - matched_gold)
-
-                    fp_pa += len(pred - matched_pred)
-                    fn_pa += len(gold - matched_gold)
-
-                # Compute metrics
-                p1, r1, f1_1 = prf1(tp_ex, fp_ex, fn_ex)
-                p2, r2, f1_2 = prf1(tp_ex + tp_pa, fp_pa, fn_pa)
-
-                results.append({
-                    "entity_type": entity_code,
-                    "combo": combo_key,
-                    "precision_exact": round(p1, 4),
-                    "recall_exact": round(r1, 4),
-                    "f1_exact": round(f1_1, 4),
-                    "precision_partial": round(p2, 4),
-                    "recall_partial": round(r2, 4),
-                    "f1_partial": round(f1_2, 4)
-                })
-
-    df = pd.DataFrame(results)
+    counts = build_counts(debug_data, corpus, "combo", threshold=threshold)
+    save_counts(counts, "combo_union")
+    df = metrics_table_exact_partial(counts)
     OUTPUT_UNION_DIR.mkdir(parents=True, exist_ok=True)
-    csv_path = OUTPUT_UNION_DIR / "metrics_set_union.xlsx"
-    df.to_excel(csv_path, index=False)
-    print(f" Metrics saved to: {csv_path}")
+    run_id = start_run("evaluate_union.py", jaccard_threshold=threshold)
+    save_table(run_id, "metrics_set_union", df)
 
-    plot_metrics(df, OUTPUT_UNION_DIR)
+    if plots:
+        plot_metrics(df, OUTPUT_UNION_DIR, force=force)
 
 
 def abbreviate_combo(combo_key: str) -> str:
@@ -106,51 +39,31 @@ def abbreviate_combo(combo_key: str) -> str:
     return "_".join(abbreviated_parts)
 
 
-def plot_metrics(df, output_dir):
+def plot_metrics(df, output_dir, force=False):
     metrics = ["precision_exact", "recall_exact", "f1_exact", "precision_partial", "recall_partial", "f1_partial"]
+    jobs = []
     for entity in df["entity_type"].unique():
         sub = df[df["entity_type"] == entity]
         for metric in metrics:
-            plt.figure(figsize=(12, 6))
             sub_sorted = sub.sort_values(metric, ascending=False)
-            raw_abbreviated_labels = [abbreviate_combo(c) for c in sub_sorted["combo"]]
-            
-            # Traitement pour rendre les labels uniques en cas de collision d'abréviations
-            final_display_labels = []
-            seen_labels_count = defaultdict(int)
-            for label in raw_abbreviated_labels:
-                seen_labels_count[label] += 1
-                if seen_labels_count[label] > 1:
-                    # Si cette abréviation a déjà été vue, ajoute un suffixe numérique
-                    final_display_labels.append(f"{label}-{seen_labels_count[label]}")
-                else:
-                    final_display_labels.append(label)            
-            colors = [
-                "green" if len(combo.split("__")) == 2 else
-                "orange" if len(combo.split("__")) == 3 else
-                "red" if len(combo.split("__")) == 4 else
-                "blue" if len(combo.split("__")) == 5 else
-                "purple"
-                for combo in sub_sorted["combo"]
-            ]
-            bars = plt.bar(final_display_labels, sub_sorted[metric], color=colors)
-            plt.xticks(rotation=90)
-            plt.title(f"{metric} – {entity}")
-            plt.ylim(0, 1.1)
-            for bar in bars:
-                height = bar.get_height()
-                plt.text(bar.get_x() + bar.get_width() / 2, height + 0.01, f"{height:.2f}",
-                         ha='center', va='bottom', fontsize=7)
-            plt.tight_layout()
-            fname = output_dir / f"{entity}_{metric}_set_union_barplot.png"
-            plt.savefig(fname, bbox_inches="tight")
-            plt.close()
-            print(f" Saved plot: {fname}")
+            # Labels abrégés rendus uniques en cas de collision d'abréviations
+            final_display_labels = unique_labels([abbreviate_combo(c) for c in sub_sorted["combo"]])
+            jobs.append(make_job("barplot", {
+                "labels": final_display_labels,
+                "values": sub_sorted[metric].tolist(),
+                "colors": combo_size_colors(sub_sorted["combo"]),
+                "title": f"{metric} – {entity}",
+                "figsize": (12, 6),
+                "value_fmt": "{:.2f}",
+            }, output_dir / f"{entity}_{metric}_set_union_barplot.png"))
+    render_all(jobs, force=force)
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--threshold", type=float, default=0.5, help="Jaccard threshold for partial match")
+    parser.add_argument("--no-plots", action="store_true", help="Métriques seules, sans graphiques (mode CI)")
+    parser.add_argument("--force", action="store_true", help="Regénère tous les artefacts même inchangés")
     args = parser.parse_args()
 
-    evaluate_union(threshold=args.threshold)
+    evaluate_union(threshold=args.threshold, plots=not args.no_plots, force=args.force)
@@ -0,0 +1,217 @@
+import time
+import argparse
+from collections import deque, defaultdict
+from pathlib import Path
+
+from src.config import ENTITY_TYPES, DATA_PATH, KB_PATH, PRED_SYNONYM_JSON, PRED_GAZETTEER_JSON
+from src.utils import load_json, load_corpus, save_json
+from src.decoding import load_predictions
+from src.counts import build_counts, aggregate_counts
+from src.metrics_store import start_run, save_table
+
+# Annotateur par dictionnaire : tous les synonymes de la base de connaissances (knowledge_base.json)
+# sont compilés en un automate d'Aho-Corasick ; un document est parcouru une seule fois, quel que
+# soit le nombre de synonymes. Les correspondances ne sont retenues que sur des frontières de mots,
+# sans tenir compte de la casse. La sortie a le schéma de debug_by_synonym.json (clé "<code>__gazetteer") :
+# elle s'évalue avec les évaluateurs existants, ou s'ajoute aux prédictions GLiNER (--union).
+# Attention : knowledge_base.json est construite à partir des mentions gold de fulldata.json ;
+# sur ce corpus, le rappel du dictionnaire est donc optimiste.
+GAZETTEER_LABEL = "gazetteer"
+
+
+def normalize(text: str) -> str:
+    """Minuscules caractère par caractère, sans changer la longueur (les offsets restent valides)."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def kb_patterns(kb: list, min_len: int = 2) -> dict:
+    """{forme normalisée: [(type, kb_id), ...]} pour tous les labels et synonymes de la KB."""
+    patterns = defaultdict(list)
+    for concept in kb:
+        for surface in {concept["label"], *concept.get("synonyms", [])}:
+            key = normalize(surface.strip())
+            if len(key) >= min_len and (concept["type"], concept["kb_id"]) not in patterns[key]:
+                patterns[key].append((concept["type"], concept["kb_id"]))
+    return dict(patterns)
+
+
+# ════════════════════ AUTOMATE ════════════════════
+
+def build_automaton(patterns: dict) -> dict:
+    """
+    Automate d'Aho-Corasick : trie (goto), liens d'échec calculés en largeur, et pour chaque
+    état la liste des motifs qui s'y terminent (sorties des liens d'échec incluses).
+    """
+    keys = list(patterns)
+    goto, fail, out = [{}], [0], [[]]
+    for pid, key in enumerate(keys):
+        state = 0
+        for char in key:
+            nxt = goto[state].get(char)
+            if nxt is None:
+                nxt = len(goto)
+                goto[state][char] = nxt
+                goto.append({})
+                fail.append(0)
+                out.append([])
+            state = nxt
+        out[state].append(pid)
+
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, nxt in goto[state].items():
+            queue.append(nxt)
+            if state:
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(char, 0)
+            out[nxt] = out[nxt] + out[fail[nxt]]
+
+    return {"goto": goto, "fail": fail, "out": out, "keys": keys,
+            "lengths": [len(key) for key in keys], "entries": [patterns[key] for key in keys]}
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def find_matches(automaton: dict, text: str):
+    """
+    (start, end, pattern_id) de toutes les occurrences délimitées par des frontières de mots.
+    Un seul passage sur le texte : O(len(text) + nombre d'occurrences).
+    """
+    goto, fail, out, lengths = automaton["goto"], automaton["fail"], automaton["out"], automaton["lengths"]
+    norm = normalize(text)
+    n = len(norm)
+    state = 0
+    for i, char in enumerate(norm):
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        if not out[state]:
+            continue
+        end = i + 1
+        if end < n and _is_word_char(norm[end]) and _is_word_char(char):
+            continue
+        for pid in out[state]:
+            start = end - lengths[pid]
+            if start > 0 and _is_word_char(norm[start - 1]) and _is_word_char(norm[start]):
+                continue
+            yield start, end, pid
+
+
+def leftmost_longest(matches):
+    """Occurrences sans chevauchement : la plus à gauche, puis la plus longue."""
+    kept, reach = [], -1
+    for start, end, pid in sorted(matches, key=lambda m: (m[0], -m[1])):
+        if start >= reach:
+            kept.append((start, end, pid))
+            reach = end
+    return kept
+
+
+def annotate(automaton: dict, text: str, overlapping: bool = False) -> dict:
+    """
+    {type: [(start, end, kb_id)]} d'un document. Une forme partagée par plusieurs types
+    produit une annotation par type ; les chevauchements sont résolus type par type.
+    """
+    by_type = defaultdict(list)
+    for start, end, pid in find_matches(automaton, text):
+        for code, kb_id in automaton["entries"][pid]:
+            by_type[code].append((start, end, kb_id))
+    if overlapping:
+        return dict(by_type)
+    return {code: leftmost_longest(matches) for code, matches in by_type.items()}
+
+
+# ════════════════════ PRÉDICTIONS ════════════════════
+
+def gazetteer_predictions(corpus: list, automaton: dict, label: str = GAZETTEER_LABEL,
+                          overlapping: bool = False) -> dict:
+    """Annotations du corpus au format debug_by_synonym.json : {"<code>__<label>": [entrées]}."""
+    debug_data = {f"{code}__{label}": [] for code in ENTITY_TYPES}
+    for doc in corpus:
+        text = doc["text"]
+        for code, matches in annotate(automaton, text, overlapping).items():
+            entries = debug_data.setdefault(f"{code}__{label}", [])
+            entries.extend({
+                "text_id": doc["text_id"],
+                "text": text,
+                "span": [start, end],
+                "entity_text": text[start:end],
+                "label": label,
+                "kb_id": kb_id,
+            } for start, end, kb_id in matches)
+    return debug_data
+
+
+def union_with(debug_data: dict, gazetteer: dict, label: str = GAZETTEER_LABEL) -> dict:
+    """
+    Ajoute à chaque clé "<code>__<synonyme>" des prédictions GLiNER les annotations du dictionnaire
+    du même type (sans doublon de span) : le fichier obtenu s'évalue comme debug_by_synonym.json.
+    """
+    merged = {}
+    for key, entries in debug_data.items():
+        code, _, synonym = key.partition("__")
+        seen = {(e["text_id"], tuple(e["span"])) for e in entries}
+        extra = [{**e, "label": synonym} for e in gazetteer.get(f"{code}__{label}", [])
+                 if (e["text_id"], tuple(e["span"])) not in seen]
+        merged[key] = list(entries) + extra
+    return merged
+
+
+def main_gazetteer(kb_path: Path = KB_PATH, output: Path = PRED_GAZETTEER_JSON, union: bool = False,
+                   evaluate: bool = True, overlapping: bool = False):
+    kb = load_json(kb_path)
+    t0 = time.perf_counter()
+    patterns = kb_patterns(kb)
+    automaton = build_automaton(patterns)
+    t_build = time.perf_counter() - t0
+    print(f"Automate : {len(patterns)} formes, {len(automaton['goto'])} états ({t_build * 1000:.0f} ms)")
+
+    corpus = load_corpus(DATA_PATH)
+    t0 = time.perf_counter()
+    gazetteer = gazetteer_predictions(corpus, automaton, overlapping=overlapping)
+    t_annotate = time.perf_counter() - t0
+    n_spans = sum(len(entries) for entries in gazetteer.values())
+    print(f"Annotation : {len(corpus)} documents, {n_spans} spans ({t_annotate * 1000:.0f} ms)")
+    save_json(gazetteer, output)
+    print(f"✅ Prédictions du dictionnaire : {output}")
+
+    if union:
+        merged = union_with(load_predictions(PRED_SYNONYM_JSON), gazetteer)
+        union_path = output.with_name(output.stem + "_union_gliner.json")
+        save_json(merged, union_path)
+        print(f"✅ GLiNER ∪ dictionnaire (par synonyme) : {union_path}")
+
+    if evaluate:
+        counts = build_counts(gazetteer, corpus, "single",
+                              entity_types={code: [GAZETTEER_LABEL] for code in ENTITY_TYPES})
+        metrics = aggregate_counts(counts, mode="exact").merge(
+            aggregate_counts(counts, mode="partial"), on=["entity_type", "label_set"], suffixes=("_exact", "_partial"))
+        for col in ("entity_type", "label_set"):
+            metrics[col] = metrics[col].astype(str)
+        run_id = start_run("gazetteer.py", params={"kb": str(kb_path), "overlapping": overlapping,
+                                                    "build_seconds": round(t_build, 4),
+                                                    "annotate_seconds": round(t_annotate, 4)})
+        save_table(run_id, "metrics_gazetteer", metrics)
+        print(metrics[["entity_type", "precision_exact", "recall_exact", "f1_exact", "f1_partial"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Annotation par dictionnaire (Aho-Corasick) des synonymes de la KB")
+    parser.add_argument("--kb", type=Path, default=KB_PATH)
+    parser.add_argument("--out", type=Path, default=PRED_GAZETTEER_JSON)
+    parser.add_argument("--union", action="store_true",
+                        help="écrit aussi l'union avec les prédictions GLiNER par synonyme")
+    parser.add_argument("--overlapping", action="store_true",
+                        help="garde les occurrences imbriquées au lieu de la plus longue")
+    parser.add_argument("--no-eval", action="store_true", help="n'évalue pas les annotations")
+    args = parser.parse_args()
+
+    main_gazetteer(args.kb, args.out, union=args.union, evaluate=not args.no_eval, overlapping=args.overlapping)
@@ -0,0 +1,237 @@
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import ENTITY_TYPES, KB_ENRICHED_PATH, OUTPUT_DIR
+from src.utils import load_json, atomic_path
+
+# Index vectoriel des concepts de la KB enrichie, pour choisir de meilleurs labels GLiNER.
+# Chaque concept est encodé ("label : définition") par un sentence-transformer ; les vecteurs
+# normalisés sont stockés en float16 dans une matrice mappée en mémoire (vectors.f16), avec les
+# kb_id et le hash du texte encodé (meta.json). Une reconstruction n'encode que les concepts
+# nouveaux ou modifiés. Un index IVF optionnel (k-means, listes inversées) limite la recherche
+# aux n_probe listes les plus proches de la requête.
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+VECTORS_DIR = OUTPUT_DIR / "kb_vectors"
+
+
+def concept_text(concept: dict) -> str:
+    definition = concept.get("definition", "").strip()
+    return f"{concept['label']} : {definition}" if definition else concept["label"]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_encoder(model_name: str = EMBEDDING_MODEL, batch_size: int = 128):
+    """Fonction textes → vecteurs normalisés (float32) ; le modèle n'est chargé qu'ici."""
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name)
+
+    def encode(texts):
+        return model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True,
+                            normalize_embeddings=True, show_progress_bar=len(texts) > batch_size)
+    return encode
+
+
+# ════════════════════ STOCKAGE ════════════════════
+
+def _paths(vectors_dir: Path) -> dict:
+    return {"vectors": vectors_dir / "vectors.f16", "meta": vectors_dir / "meta.json",
+            "centroids": vectors_dir / "ivf_centroids.npy", "lists": vectors_dir / "ivf_lists.npz"}
+
+
+def build_vectors(kb: list, encode, model_name: str = EMBEDDING_MODEL, vectors_dir: Path = VECTORS_DIR) -> dict:
+    """
+    (Re)construit la matrice des vecteurs. Les lignes des concepts dont le texte et le modèle
+    n'ont pas changé sont recopiées depuis la matrice précédente ; seules les autres sont encodées.
+    """
+    if not kb:
+        raise ValueError("KB vide : aucun concept à encoder")
+    vectors_dir.mkdir(parents=True, exist_ok=True)
+    paths = _paths(vectors_dir)
+    texts = [concept_text(c) for c in kb]
+    hashes = [text_hash(t) for t in texts]
+
+    old, previous = None, {}  # previous : (kb_id, hash) → ligne de l'ancienne matrice
+    if paths["meta"].exists() and paths["vectors"].exists():
+        meta = json.loads(paths["meta"].read_text(encoding="utf-8"))
+        if meta["model"] == model_name and meta["kb_ids"]:
+            old = np.memmap(paths["vectors"], dtype=np.float16, mode="r", shape=(len(meta["kb_ids"]), meta["dim"]))
+            previous = {(kb_id, h): i for i, (kb_id, h) in enumerate(zip(meta["kb_ids"], meta["hashes"]))}
+
+    reused = [i for i, c in enumerate(kb) if (c["kb_id"], hashes[i]) in previous]
+    changed = [i for i, c in enumerate(kb) if (c["kb_id"], hashes[i]) not in previous]
+    t0 = time.perf_counter()
+    fresh = np.asarray(encode([texts[i] for i in changed]), dtype=np.float32) if changed else None
+    t_encode = time.perf_counter() - t0
+    dim = fresh.shape[1] if fresh is not None else old.shape[1]
+
+    matrix = np.empty((len(kb), dim), dtype=np.float16)
+    if reused:
+        matrix[reused] = np.asarray(old[[previous[(kb[i]["kb_id"], hashes[i])] for i in reused]])  # copie
+    if changed:
+        matrix[changed] = fresh.astype(np.float16)
+    # Le fichier ne peut être remplacé tant qu'un mmap l'ouvre encore (Windows) : plus aucune
+    # référence à l'ancienne matrice après la copie des lignes reprises.
+    del old
+
+    with atomic_path(paths["vectors"]) as tmp:
+        matrix.tofile(tmp)
+    meta = {"model": model_name, "dim": dim, "kb_ids": [c["kb_id"] for c in kb],
+            "types": [c["type"] for c in kb], "labels": [c["label"] for c in kb], "hashes": hashes}
+    paths["meta"].write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    for key in ("centroids", "lists"):
+        paths[key].unlink(missing_ok=True)  # l'IVF éventuel ne correspond plus aux vecteurs
+    print(f"✅ {len(kb)} concepts, {len(changed)} encodés ({t_encode:.1f} s), {len(kb) - len(changed)} repris du cache")
+    return {"encoded": len(changed), "reused": len(kb) - len(changed)}
+
+
+def open_index(vectors_dir: Path = VECTORS_DIR) -> dict:
+    """Matrice float16 en mmap + métadonnées (+ IVF s'il a été construit)."""
+    paths = _paths(vectors_dir)
+    meta = json.loads(paths["meta"].read_text(encoding="utf-8"))
+    index = {**meta, "vectors": np.memmap(paths["vectors"], dtype=np.float16, mode="r",
+                                          shape=(len(meta["kb_ids"]), meta["dim"])),
+             "position": {kb_id: i for i, kb_id in enumerate(meta["kb_ids"])}}
+    if paths["centroids"].exists():
+        lists = np.load(paths["lists"])
+        index["ivf"] = {"centroids": np.load(paths["centroids"]), "offsets": lists["offsets"], "ids": lists["ids"]}
+    return index
+
+
+# ════════════════════ IVF ════════════════════
+
+def build_ivf(vectors_dir: Path = VECTORS_DIR, n_lists: int = None, iters: int = 20, seed: int = 0) -> dict:
+    """
+    k-means sphérique (produits scalaires sur vecteurs normalisés) puis listes inversées
+    stockées à plat : ids triés par liste et offsets (liste c = ids[offsets[c]:offsets[c+1]]).
+    """
+    index = open_index(vectors_dir)
+    x = np.asarray(index["vectors"], dtype=np.float32)
+    n_lists = n_lists or max(1, int(np.sqrt(len(x))))
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=n_lists, replace=False)]
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        centroids = np.where(empty[:, None], centroids, sums / np.where(norms == 0, 1, norms))
+    assign = np.argmax(x @ centroids.T, axis=1)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.r_[0, np.cumsum(np.bincount(assign, minlength=n_lists))]
+
+    paths = _paths(vectors_dir)
+    np.save(paths["centroids"], centroids.astype(np.float32))
+    np.savez(paths["lists"], offsets=offsets, ids=order)
+    print(f"✅ IVF : {n_lists} listes, {np.diff(offsets).max()} vecteurs au plus par liste")
+    return {"n_lists": n_lists}
+
+
+# ════════════════════ REQUÊTES ════════════════════
+
+def search(index: dict, query: np.ndarray, k: int = 10, n_probe: int = None, types=None):
+    """
+    (positions, scores cosinus) des k concepts les plus proches d'un vecteur normalisé.
+    Avec un IVF et n_probe, seules les n_probe listes les plus proches sont parcourues.
+    `types` restreint les résultats à certains types d'entités.
+    """
+    query = np.asarray(query, dtype=np.float32).ravel()
+    if n_probe and "ivf" in index:
+        ivf = index["ivf"]
+        lists = np.argsort(-(ivf["centroids"] @ query))[:n_probe]
+        candidates = np.concatenate([ivf["ids"][ivf["offsets"][c]:ivf["offsets"][c + 1]] for c in lists])
+    else:
+        candidates = np.arange(len(index["kb_ids"]))
+    if types is not None:
+        allowed = np.array([t in types for t in index["types"]])
+        candidates = candidates[allowed[candidates]]
+    if len(candidates) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    candidates = np.sort(candidates)  # lecture du mmap dans l'ordre des lignes
+    scores = np.asarray(index["vectors"][candidates], dtype=np.float32) @ query
+    k = min(k, len(candidates))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return candidates[top], scores[top]
+
+
+def type_prototype(index: dict, entity_type: str, encode=None, synonyms=None) -> np.ndarray:
+    """
+    Prototype d'un type : moyenne normalisée des vecteurs des labels actuels de ENTITY_TYPES
+    (si un encodeur est fourni), sinon des vecteurs de tous les concepts du type.
+    """
+    if encode is not None:
+        vectors = np.asarray(encode(synonyms or ENTITY_TYPES[entity_type]), dtype=np.float32)
+    else:
+        rows = [i for i, t in enumerate(index["types"]) if t == entity_type]
+        vectors = np.asarray(index["vectors"][rows], dtype=np.float32)
+    proto = vectors.mean(axis=0)
+    return proto / (np.linalg.norm(proto) or 1.0)
+
+
+def propose_labels(index: dict, entity_type: str, encode=None, k: int = 20, n_probe: int = None) -> pd.DataFrame:
+    """
+    Concepts du type les plus proches de son prototype : candidats pour ENTITY_TYPES
+    (les labels déjà présents sont signalés).
+    """
+    current = {s.lower() for s in ENTITY_TYPES.get(entity_type, [])}
+    t0 = time.perf_counter()
+    ids, scores = search(index, type_prototype(index, entity_type, encode), k=k, n_probe=n_probe, types={entity_type})
+    ms = (time.perf_counter() - t0) * 1000
+    return pd.DataFrame({
+        "entity_type": entity_type,
+        "kb_id": [index["kb_ids"][i] for i in ids],
+        "label": [index["labels"][i] for i in ids],
+        "cosine": np.round(scores, 4),
+        "already_in_entity_types": [index["labels"][i].lower() in current for i in ids],
+        "query_ms": round(ms, 3),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index vectoriel des concepts de la KB (labels + définitions)")
+    parser.add_argument("--kb", type=Path, default=KB_ENRICHED_PATH)
+    parser.add_argument("--dir", type=Path, default=VECTORS_DIR)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="encode les concepts nouveaux ou modifiés")
+    p = sub.add_parser("ivf", help="construit l'index IVF")
+    p.add_argument("--lists", type=int, default=None)
+    p = sub.add_parser("query", help="concepts les plus proches d'un texte")
+    p.add_argument("text")
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--probe", type=int, default=None)
+    p = sub.add_parser("propose", help="candidats ENTITY_TYPES proches du prototype de chaque type")
+    p.add_argument("--types", nargs="+", default=list(ENTITY_TYPES))
+    p.add_argument("-k", type=int, default=20)
+    p.add_argument("--probe", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_vectors(load_json(args.kb), load_encoder(args.model), args.model, args.dir)
+    elif args.command == "ivf":
+        build_ivf(args.dir, args.lists)
+    elif args.command == "query":
+        index = open_index(args.dir)
+        encode = load_encoder(index["model"])
+        ids, scores = search(index, encode([args.text])[0], k=args.k, n_probe=args.probe)
+        for i, score in zip(ids, scores):
+            print(f"  {score:.4f}  {index['kb_ids'][i]:<20} {index['labels'][i]}")
+    elif args.command == "propose":
+        index = open_index(args.dir)
+        encode = load_encoder(index["model"])
+        proposals = pd.concat([propose_labels(index, t, encode, args.k, args.probe) for t in args.types],
+                              ignore_index=True)
+        out = args.dir / "entity_type_proposals.xlsx"
+        proposals.to_excel(out, index=False)
+        print(proposals.groupby("entity_type").head(5).to_string(index=False))
+        print(f"✅ Propositions : {out}")
@@ -0,0 +1,211 @@
+import json
+import math
+import time
+import random
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import ENTITY_TYPES, DATA_PATH, MODEL_NAME, THRESHOLD, OUTPUT_DIR, PRED_SYNONYM_JSON, \
+    DEFAULT_JACCARD_THRESHOLD
+from src.utils import load_corpus, load_json, load_gliner
+from src.counts import match_spans, add_prf1
+from src.metrics_store import start_run, save_table
+
+# Recherche de labels par "successive halving" : au lieu de lancer GLiNER sur les 104 documents
+# pour chaque label candidat, tous les candidats sont évalués (F1 partiel, comme les évaluateurs)
+# sur un petit sous-ensemble de documents ; seule la meilleure fraction 1/eta passe au tour
+# suivant, évalué sur eta fois plus de documents, jusqu'au corpus complet.
+# Les prédictions (label, text_id) → spans sont mises en cache sur disque : un tour ne paie que
+# les documents nouveaux, et les labels déjà présents dans debug_by_synonym.json ne coûtent rien.
+SEARCH_DIR = OUTPUT_DIR / "label_search"
+
+
+# ════════════════════ CACHE DE PRÉDICTIONS ════════════════════
+
+def cache_path(model_name: str = MODEL_NAME, threshold: float = THRESHOLD, out_dir: Path = SEARCH_DIR) -> Path:
+    return out_dir / f"predictions_{model_name.replace('/', '__')}_{threshold}.jsonl"
+
+
+def load_cache(path: Path) -> dict:
+    """{(label, text_id): set(spans)} ; une dernière ligne tronquée est ignorée."""
+    cache = {}
+    if path.exists():
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                cache[(record["label"], record["text_id"])] = {tuple(s) for s in record["spans"]}
+    return cache
+
+
+def seed_cache(cache: dict, debug_data: dict, corpus: list) -> int:
+    """
+    Ajoute au cache les prédictions par synonyme existantes (clés "<code>__<label>") : chaque
+    document du corpus absent des prédictions d'un label est un document sans span.
+    """
+    added = 0
+    for key, entries in debug_data.items():
+        label = key.split("__", 1)[1]
+        spans = {doc["text_id"]: set() for doc in corpus}
+        for entry in entries:
+            spans.setdefault(entry["text_id"], set()).add(tuple(entry["span"]))
+        for text_id, s in spans.items():
+            if (label, text_id) not in cache:
+                cache[(label, text_id)] = s
+                added += 1
+    return added
+
+
+def gliner_predictor(model, threshold: float = THRESHOLD):
+    def predict(text: str, label: str) -> set:
+        return {(ent["start"], ent["end"]) for ent in model.predict_entities(text, [label], threshold=threshold)
+                if ent["label"] == label}
+    return predict
+
+
+def predict_cached(predict, cache: dict, cache_file, label: str, docs: list, stats: dict) -> dict:
+    """{text_id: spans} du label sur `docs` ; seuls les couples absents du cache appellent le modèle."""
+    spans_by_text = {}
+    for doc in docs:
+        key = (label, doc["text_id"])
+        if key in cache:
+            stats["cache_hits"] += 1
+        else:
+            cache[key] = predict(doc["text"], label)
+            stats["model_calls"] += 1
+            if cache_file is not None:
+                cache_file.write(json.dumps({"label": label, "text_id": doc["text_id"],
+                                             "spans": sorted(cache[key])}) + "\n")
+        spans_by_text[doc["text_id"]] = cache[key]
+    return spans_by_text
+
+
+# ════════════════════ ÉVALUATION ════════════════════
+
+def gold_spans(corpus: list, code: str) -> dict:
+    return {doc["text_id"]: {tuple(ent["spans"]) for ent in doc["entities"] if ent["code_entity"] == code}
+            for doc in corpus}
+
+
+def label_counts(spans_by_text: dict, golds: dict, threshold: float = DEFAULT_JACCARD_THRESHOLD) -> dict:
+    """TP/FP/FN (mode partiel : exacts + Jaccard >= threshold) sommés sur les documents évalués."""
+    tp = fp = fn = 0
+    for text_id, pred in spans_by_text.items():
+        tp_ex, tp_pa, fp_d, fn_d = match_spans(golds[text_id], pred, threshold)
+        tp, fp, fn = tp + tp_ex + tp_pa, fp + fp_d, fn + fn_d
+    return {"TP": tp, "FP": fp, "FN": fn}
+
+
+# ════════════════════ SUCCESSIVE HALVING ════════════════════
+
+def successive_halving(code: str, candidates: list, corpus: list, predict, cache: dict, cache_file=None,
+                       eta: int = 2, min_docs: int = 8, keep: int = 3, seed: int = 0):
+    """
+    Tour r : les candidats restants sont évalués sur les min_docs × eta^r premiers documents
+    (ordre aléatoire fixé par `seed`) ; on garde les ceil(n / eta) meilleurs F1, au moins `keep`.
+    Quand il ne reste que `keep` candidats, ils passent directement au corpus complet.
+    Retourne (trajectoire, classement final, statistiques).
+    """
+    docs = list(corpus)
+    random.Random(seed).shuffle(docs)
+    golds = gold_spans(corpus, code)
+    stats = {"model_calls": 0, "cache_hits": 0}
+    survivors = list(dict.fromkeys(candidates))
+    # une évaluation exhaustive profiterait du même cache : seuls les couples absents au départ coûtent
+    exhaustive = sum((label, doc["text_id"]) not in cache for label in survivors for doc in docs)
+    n_candidates = len(survivors)
+    n_docs = min(len(docs), min_docs)
+    rounds, r = [], 0
+    t0 = time.perf_counter()
+
+    while True:
+        rows = []
+        for label in survivors:
+            spans = predict_cached(predict, cache, cache_file, label, docs[:n_docs], stats)
+            rows.append({"label": label, **label_counts(spans, golds)})
+        table = add_prf1(pd.DataFrame(rows)).sort_values(["f1", "label"], ascending=[False, True])
+        final = n_docs == len(docs)
+        n_keep = len(survivors) if final else max(keep, math.ceil(len(survivors) / eta))
+        table["kept"] = [i < n_keep for i in range(len(table))]
+        table.insert(0, "docs", n_docs)
+        table.insert(0, "round", r)
+        table.insert(0, "entity_type", code)
+        rounds.append(table)
+        print(f"  {code} tour {r} : {len(survivors)} labels × {n_docs} documents → {n_keep} gardés "
+              f"(meilleur : {table.iloc[0]['label']}, F1 {table.iloc[0]['f1']:.3f})")
+        if final:
+            break
+        survivors = table["label"].head(n_keep).tolist()
+        n_docs = len(docs) if len(survivors) <= keep else min(len(docs), n_docs * eta)
+        r += 1
+
+    stats.update(entity_type=code, candidates=n_candidates, rounds=r + 1,
+                 cached_at_start=n_candidates * len(docs) - exhaustive, exhaustive_calls=exhaustive,
+                 evaluations=stats["model_calls"] + stats["cache_hits"],
+                 calls_saved=exhaustive - stats["model_calls"], seconds=round(time.perf_counter() - t0, 2))
+    return pd.concat(rounds, ignore_index=True), rounds[-1].drop(columns="kept"), stats
+
+
+def candidate_labels(code: str, mined: dict = None, extra=None) -> list:
+    """Labels actuels de ENTITY_TYPES + propositions de mine_synonyms.py + labels donnés en argument."""
+    return list(dict.fromkeys(ENTITY_TYPES.get(code, []) + (mined or {}).get(code, []) + list(extra or [])))
+
+
+def main_search(codes=None, mined_path: Path = None, extra=None, eta: int = 2, min_docs: int = 8, keep: int = 3,
+                seed: int = 0, predict=None, seed_from: Path = PRED_SYNONYM_JSON):
+    corpus = load_corpus(DATA_PATH)
+    path = cache_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cache = load_cache(path)
+    if seed_from and Path(seed_from).exists():
+        print(f" {seed_cache(cache, load_json(seed_from), corpus)} prédictions reprises de {seed_from}")
+    mined = load_json(mined_path)["proposals"] if mined_path else {}
+    if predict is None:
+        predict = gliner_predictor(load_gliner(MODEL_NAME))  # chargé seulement si une recherche est lancée
+
+    trajectories, finals, summary = [], [], []
+    with path.open("a", encoding="utf-8") as cache_file:
+        for code in codes or ENTITY_TYPES:
+            trajectory, final, stats = successive_halving(code, candidate_labels(code, mined, extra), corpus,
+                                                          predict, cache, cache_file, eta, min_docs, keep, seed)
+            trajectories.append(trajectory)
+            finals.append(final)
+            summary.append(stats)
+            cache_file.flush()
+
+    summary = pd.DataFrame(summary)[["entity_type", "candidates", "rounds", "cached_at_start", "exhaustive_calls",
+                                     "model_calls", "cache_hits", "calls_saved", "seconds"]]
+    trajectory, final = pd.concat(trajectories, ignore_index=True), pd.concat(finals, ignore_index=True)
+    total = summary[["exhaustive_calls", "model_calls"]].sum()
+    print(summary.to_string(index=False))
+    print(f" Appels au modèle : {total['model_calls']} au lieu de {total['exhaustive_calls']} en évaluation exhaustive")
+
+    run_id = start_run("label_search.py", params={"eta": eta, "min_docs": min_docs, "keep": keep, "seed": seed,
+                                                  "mined": str(mined_path) if mined_path else None,
+                                                  "extra": list(extra or [])})
+    save_table(run_id, "label_search_rounds", trajectory)
+    save_table(run_id, "label_search_final", final)
+    save_table(run_id, "label_search_summary", summary)
+    with pd.ExcelWriter(SEARCH_DIR / "label_search.xlsx") as writer:
+        final.to_excel(writer, sheet_name="final", index=False)
+        trajectory.to_excel(writer, sheet_name="rounds", index=False)
+        summary.to_excel(writer, sheet_name="summary", index=False)
+    return trajectory, final, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classement de labels candidats par successive halving")
+    parser.add_argument("--types", nargs="+", default=None)
+    parser.add_argument("--mined", type=Path, default=None,
+                        help="JSON de propositions de mine_synonyms.py (outputs/synonym_mining/entity_types_*.json)")
+    parser.add_argument("--extra", nargs="+", default=None, help="labels candidats supplémentaires (tous les types)")
+    parser.add_argument("--eta", type=int, default=2, help="facteur de réduction des candidats / d'augmentation des documents")
+    parser.add_argument("--min-docs", type=int, default=8, help="documents du premier tour")
+    parser.add_argument("--keep", type=int, default=3, help="candidats évalués sur le corpus complet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main_search(args.types, args.mined, args.extra, args.eta, args.min_docs, args.keep, args.seed)
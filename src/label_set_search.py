@@ -0,0 +1,244 @@
+import math
+import time
+import random
+import argparse
+import itertools
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import ENTITY_TYPES, DATA_PATH, OUTPUT_DIR, PRED_SYNONYM_JSON, MIN_COMB, MAX_COMB, \
+    DEFAULT_JACCARD_THRESHOLD
+from src.utils import load_corpus, load_json
+from src.counts import match_spans, spans_by_synonym, add_prf1
+from src.label_search import cache_path, load_cache, candidate_labels, gold_spans
+from src.metrics_store import start_run, save_table
+
+# Recherche d'ensembles de labels sans énumérer toutes les combinaisons (2^n - 1 sous-ensembles).
+# Un ensemble est évalué par le F1 partiel de l'union (ou de l'intersection) des prédictions
+# par label déjà calculées (debug_by_synonym.json ou cache de label_search.py) : aucun appel au
+# modèle. Trois stratégies :
+#   - forward : ajout glouton du label qui améliore le plus le F1 ;
+#   - beam    : recherche en faisceau (les `width` meilleurs ensembles de chaque taille) ;
+#   - local   : montée de colline (ajout / retrait / échange d'un label) depuis le glouton,
+#               avec redémarrages aléatoires.
+# Les scores sont mémorisés par ensemble : le coût est le nombre d'ensembles distincts évalués.
+LABEL_SET_DIR = OUTPUT_DIR / "label_set_search"
+METHODS = ("forward", "beam", "local")
+
+
+# ════════════════════ ÉVALUATION D'UN ENSEMBLE ════════════════════
+
+def make_scorer(by_label: dict, golds: dict, strategy: str = "union",
+                threshold: float = DEFAULT_JACCARD_THRESHOLD):
+    """
+    Fonction ensemble de labels → {TP, FP, FN, precision, recall, f1}, mémorisée par frozenset.
+    `by_label` : {label: {text_id: set(spans)}} ; `golds` : {text_id: set(spans)}.
+    """
+    memo = {}
+
+    def score(labels) -> dict:
+        key = frozenset(labels)
+        if key not in memo:
+            tp = fp = fn = 0
+            for text_id, gold in golds.items():
+                sets = [by_label[label].get(text_id, set()) for label in key]
+                pred = set.union(*sets) if strategy == "union" else set.intersection(*sets)
+                tp_ex, tp_pa, fp_d, fn_d = match_spans(gold, pred, threshold)
+                tp, fp, fn = tp + tp_ex + tp_pa, fp + fp_d, fn + fn_d
+            memo[key] = add_prf1(pd.DataFrame([{"TP": tp, "FP": fp, "FN": fn}])).to_dict("records")[0]
+        return memo[key]
+
+    score.memo = memo
+    return score
+
+
+def set_name(labels) -> str:
+    return "__".join(sorted(labels))
+
+
+# ════════════════════ STRATÉGIES ════════════════════
+
+def forward_selection(labels: list, score, max_size: int = None) -> list:
+    """Trajectoire [(ensemble, f1)] : à chaque étape, ajout du label qui maximise le F1."""
+    current, trajectory = [], []
+    remaining = list(labels)
+    while remaining and (max_size is None or len(current) < max_size):
+        best = max(remaining, key=lambda label: (score(current + [label])["f1"], label))
+        if trajectory and score(current + [best])["f1"] <= trajectory[-1][1]:
+            break  # plus aucun ajout n'améliore le F1
+        current = current + [best]
+        remaining.remove(best)
+        trajectory.append((tuple(current), score(current)["f1"]))
+    return trajectory
+
+
+def beam_search(labels: list, score, width: int = 5, max_size: int = None) -> list:
+    """Trajectoire [(meilleur ensemble de la taille k, f1)] ; arrêt si une taille n'améliore plus le meilleur."""
+    beam, trajectory, best_f1 = [()], [], -1.0
+    for _ in range(max_size or len(labels)):
+        expanded = {tuple(sorted(s + (label,))) for s in beam for label in labels if label not in s}
+        if not expanded:
+            break
+        ranked = sorted(expanded, key=lambda s: (-score(s)["f1"], s))
+        beam = ranked[:width]
+        trajectory.append((beam[0], score(beam[0])["f1"]))
+        if score(beam[0])["f1"] <= best_f1:
+            break
+        best_f1 = score(beam[0])["f1"]
+    return trajectory
+
+
+def local_search(labels: list, score, start=(), restarts: int = 3, max_size: int = None, seed: int = 0) -> list:
+    """
+    Montée de colline (meilleur voisin : ajout, retrait ou échange d'un label) depuis `start`,
+    puis depuis `restarts` ensembles aléatoires. Trajectoire [(ensemble, f1)] des améliorations.
+    """
+    rng = random.Random(seed)
+    max_size = max_size or len(labels)
+    starts = [tuple(start)] + [tuple(rng.sample(labels, rng.randint(1, min(max_size, len(labels)))))
+                               for _ in range(restarts)]
+    trajectory = []
+
+    def record(labels_):
+        if not trajectory or score(labels_)["f1"] > trajectory[-1][1]:
+            trajectory.append((tuple(sorted(labels_)), score(labels_)["f1"]))
+
+    for current in starts:
+        current = set(current) or {max(labels, key=lambda label: score([label])["f1"])}
+        record(current)
+        while True:
+            inside, outside = sorted(current), [label for label in labels if label not in current]
+            neighbours = [current | {o} for o in outside if len(current) < max_size]
+            neighbours += [current - {i} for i in inside if len(current) > 1]
+            neighbours += [(current - {i}) | {o} for i in inside for o in outside]
+            if not neighbours:
+                break
+            candidate = max(neighbours, key=lambda s: (score(s)["f1"], set_name(s)))
+            if score(candidate)["f1"] <= score(current)["f1"]:
+                break
+            current = candidate
+            record(current)
+    return trajectory
+
+
+def exhaustive(labels: list, score, min_k: int = MIN_COMB, max_k: int = None):
+    """Meilleur ensemble par énumération (référence pour les petits types)."""
+    best = None
+    for k in range(min_k, (max_k or len(labels)) + 1):
+        for combo in itertools.combinations(labels, k):
+            if best is None or score(combo)["f1"] > score(best)["f1"]:
+                best = combo
+    return best
+
+
+def n_subsets(n: int, min_k: int = MIN_COMB, max_k: int = None) -> int:
+    return sum(math.comb(n, k) for k in range(min_k, (max_k or n) + 1))
+
+
+# ════════════════════ PROGRAMME ════════════════════
+
+def optimize_type(code: str, by_label: dict, golds: dict, strategy: str = "union", methods=METHODS,
+                  width: int = 5, restarts: int = 3, max_size: int = None, seed: int = 0,
+                  exhaustive_limit: int = 12):
+    """Lance chaque méthode sur un type ; retourne (trajectoire, résumé par méthode)."""
+    labels = sorted(by_label)
+    trajectory_rows, summary_rows = [], []
+    max_size = max_size or MAX_COMB
+    all_sets = n_subsets(len(labels), 1, max_size)
+    reference = None
+    if len(labels) <= exhaustive_limit:
+        score = make_scorer(by_label, golds, strategy)
+        reference = score(exhaustive(labels, score, 1, max_size))["f1"]
+
+    for method in methods:
+        score = make_scorer(by_label, golds, strategy)  # mémo propre à chaque méthode : coûts comparables
+        t0 = time.perf_counter()
+        if method == "forward":
+            trajectory = forward_selection(labels, score, max_size)
+        elif method == "beam":
+            trajectory = beam_search(labels, score, width, max_size)
+        else:
+            greedy = forward_selection(labels, score, max_size)
+            trajectory = local_search(labels, score, greedy[-1][0] if greedy else (), restarts, max_size, seed)
+        seconds = time.perf_counter() - t0
+        best_set, best_f1 = max(trajectory, key=lambda step: step[1])
+        for step, (labels_, f1) in enumerate(trajectory):
+            trajectory_rows.append({"entity_type": code, "strategy": strategy, "method": method, "step": step,
+                                    "size": len(labels_), "label_set": set_name(labels_), "f1": round(f1, 6)})
+        summary_rows.append({
+            "entity_type": code, "strategy": strategy, "method": method, "labels": len(labels),
+            "best_label_set": set_name(best_set), "size": len(best_set), **{k: round(v, 6) if isinstance(v, float) else v
+                                                                            for k, v in score(best_set).items()},
+            "evaluated_sets": len(score.memo), "exhaustive_sets": all_sets,
+            "fraction_evaluated": round(len(score.memo) / all_sets, 6),
+            "exhaustive_best_f1": round(reference, 6) if reference is not None else None,
+            "seconds": round(seconds, 3),
+        })
+    return trajectory_rows, summary_rows
+
+
+def load_label_predictions(code: str, corpus: list, predictions: dict, source: str = "debug", mined: dict = None,
+                           extra=None) -> dict:
+    """
+    {label: {text_id: spans}} pour un type, à partir de `predictions` (chargé une fois pour tous les types) :
+      - "debug" : prédictions par synonyme de debug_by_synonym.json (labels de ENTITY_TYPES) ;
+      - "cache" : cache de label_search.py, pour les labels candidats prédits sur tout le corpus.
+    """
+    if source == "debug":
+        return {label: dict(spans) for label, spans in spans_by_synonym(predictions, code, ENTITY_TYPES[code]).items()}
+    text_ids = [doc["text_id"] for doc in corpus]
+    by_label = {}
+    for label in candidate_labels(code, mined, extra):
+        if all((label, text_id) in predictions for text_id in text_ids):
+            by_label[label] = {text_id: predictions[(label, text_id)] for text_id in text_ids}
+    return by_label
+
+
+def main_label_sets(codes=None, strategy: str = "union", methods=METHODS, source: str = "debug",
+                    mined_path: Path = None, width: int = 5, restarts: int = 3, max_size: int = None, seed: int = 0):
+    corpus = load_corpus(DATA_PATH)
+    mined = load_json(mined_path)["proposals"] if mined_path else None
+    predictions = load_json(PRED_SYNONYM_JSON) if source == "debug" else load_cache(cache_path())
+    trajectory, summary = [], []
+    for code in codes or ENTITY_TYPES:
+        by_label = load_label_predictions(code, corpus, predictions, source, mined)
+        if not by_label:
+            print(f" {code} : aucune prédiction par label disponible")
+            continue
+        rows, stats = optimize_type(code, by_label, gold_spans(corpus, code), strategy, methods,
+                                    width, restarts, max_size, seed)
+        trajectory += rows
+        summary += stats
+        for s in stats:
+            print(f"  {code:<18} {s['method']:<8} F1 {s['f1']:.4f}  {s['evaluated_sets']}/{s['exhaustive_sets']} "
+                  f"ensembles évalués  {s['best_label_set']}")
+
+    trajectory, summary = pd.DataFrame(trajectory), pd.DataFrame(summary)
+    run_id = start_run("label_set_search.py", params={"strategy": strategy, "methods": list(methods),
+                                                      "source": source, "width": width, "restarts": restarts,
+                                                      "max_size": max_size, "seed": seed})
+    save_table(run_id, "label_set_trajectory", trajectory)
+    save_table(run_id, "label_set_best", summary)
+    LABEL_SET_DIR.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(LABEL_SET_DIR / f"label_sets_{strategy}.xlsx") as writer:
+        summary.to_excel(writer, sheet_name="best", index=False)
+        trajectory.to_excel(writer, sheet_name="trajectory", index=False)
+    return trajectory, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recherche d'ensembles de labels (glouton, faisceau, local)")
+    parser.add_argument("--types", nargs="+", default=None)
+    parser.add_argument("--strategy", choices=("union", "intersection"), default="union")
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--source", choices=("debug", "cache"), default="debug",
+                        help="debug_by_synonym.json, ou cache de prédictions de label_search.py")
+    parser.add_argument("--mined", type=Path, default=None, help="propositions de mine_synonyms.py (avec --source cache)")
+    parser.add_argument("--width", type=int, default=5, help="largeur du faisceau")
+    parser.add_argument("--restarts", type=int, default=3, help="redémarrages aléatoires de la recherche locale")
+    parser.add_argument("--max-size", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main_label_sets(args.types, args.strategy, args.methods, args.source, args.mined,
+                    args.width, args.restarts, args.max_size, args.seed)
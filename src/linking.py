@@ -0,0 +1,209 @@
+import re
+import time
+import argparse
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.config import PRED_SYNONYM_JSON, KB_ENRICHED_PATH, OUTPUT_DIR
+from src.utils import load_json, save_json
+from src.decoding import open_predictions
+from src.metrics_store import start_run, save_table
+
+# Liaison des prédictions aux concepts de la base de connaissances (kb_id).
+#   1. correspondance exacte de la forme normalisée (table de hachage) ;
+#   2. à défaut, similarité cosinus TF-IDF sur n-grammes de caractères (matrice creuse) :
+#      toutes les mentions restantes sont projetées d'un bloc et comparées à toutes les formes
+#      de la KB par un seul produit creux, les k meilleurs candidats extraits par argpartition.
+# Le type de la prédiction (code de la clé "<code>__<label_set>") restreint les candidats.
+LINKED_JSON = OUTPUT_DIR / "linked_predictions.json"
+_SPACES = re.compile(r"\s+")
+_EDGE_PUNCT = re.compile(r"^[\W_]+|[\W_]+$")
+
+
+def normalize_surface(text: str) -> str:
+    """NFKC, minuscules, espaces réduits, ponctuation de bord retirée."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _EDGE_PUNCT.sub("", _SPACES.sub(" ", text).strip())
+
+
+# ════════════════════ INDEX ════════════════════
+
+def build_index(kb: list, ngram_range=(2, 4)) -> dict:
+    """
+    Index de liaison : formes normalisées uniques de la KB (labels + synonymes), leurs concepts,
+    table forme → indice, et matrice TF-IDF (n-grammes de caractères, normes L2) des formes.
+    """
+    surfaces, owners, position = [], [], {}
+    for concept in kb:
+        for surface in {concept["label"], *concept.get("synonyms", [])}:
+            key = normalize_surface(surface)
+            if not key:
+                continue
+            if key not in position:
+                position[key] = len(surfaces)
+                surfaces.append(key)
+                owners.append([])
+            owner = (concept["kb_id"], concept["type"])
+            if owner not in owners[position[key]]:
+                owners[position[key]].append(owner)
+
+    vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=ngram_range, sublinear_tf=True, dtype=np.float32)
+    matrix = vectorizer.fit_transform(surfaces)
+    types = sorted({t for owner in owners for _, t in owner})
+    # masque forme × type : la forme a-t-elle au moins un concept de ce type ?
+    type_mask = np.zeros((len(surfaces), len(types)), dtype=bool)
+    for i, owner in enumerate(owners):
+        for _, t in owner:
+            type_mask[i, types.index(t)] = True
+    return {"surfaces": surfaces, "owners": owners, "position": position, "vectorizer": vectorizer,
+            "matrix": matrix, "types": types, "type_mask": type_mask}
+
+
+def _owner(index: dict, surface_id: int, code: str):
+    """
+    kb_id du concept de la forme qui a le type demandé ; None si la forme n'a aucun concept de ce
+    type. Un type absent de la KB n'impose aucune restriction (comme dans top_k).
+    """
+    owners = index["owners"][surface_id]
+    for kb_id, t in owners:
+        if t == code:
+            return kb_id
+    return owners[0][0] if code not in index["types"] else None
+
+
+# ════════════════════ LIAISON ════════════════════
+
+def top_k(index: dict, mentions: list, codes: list = None, k: int = 5, chunk: int = 4096):
+    """
+    (indices des formes, scores) des k formes les plus proches de chaque mention, triés par score.
+    Si codes est donné, seules les formes ayant un concept du même type sont candidates.
+    """
+    queries = index["vectorizer"].transform(mentions)
+    k = min(k, len(index["surfaces"]))
+    ids = np.zeros((len(mentions), k), dtype=np.int64)
+    scores = np.zeros((len(mentions), k), dtype=np.float32)
+    for lo in range(0, len(mentions), chunk):
+        sim = (queries[lo:lo + chunk] @ index["matrix"].T).toarray()
+        if codes is not None:
+            col = np.array([index["types"].index(c) if c in index["types"] else -1 for c in codes[lo:lo + chunk]])
+            allowed = index["type_mask"][:, col].T
+            allowed[col < 0] = True  # type absent de la KB : aucune restriction
+            sim[~allowed] = 0.0
+        part = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(sim, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        ids[lo:lo + chunk] = np.take_along_axis(part, order, axis=1)
+        scores[lo:lo + chunk] = np.take_along_axis(part_scores, order, axis=1)
+    return ids, scores
+
+
+def link_mentions(index: dict, mentions: list, codes: list, k: int = 5, min_score: float = 0.5) -> pd.DataFrame:
+    """
+    Lie une liste de mentions (avec leur type) : exact d'abord, TF-IDF pour le reste. Une forme
+    connue de la KB mais seulement pour d'autres types n'est pas liée exactement : elle passe par
+    la recherche floue, restreinte au type de la prédiction.
+    Les formes distinctes ne sont traitées qu'une fois (une prédiction revient souvent des dizaines de fois).
+    Colonnes : kb_id, score, method (exact / fuzzy / none), candidates (k meilleurs kb_id).
+    """
+    keys = pd.DataFrame({"surface": [normalize_surface(m) for m in mentions], "code": codes})
+    unique = keys.drop_duplicates(ignore_index=True)
+
+    kb_ids, scores, methods, candidates = [], [], [], []
+    fuzzy_rows = []
+    for row, (surface, code) in enumerate(zip(unique["surface"], unique["code"])):
+        surface_id = index["position"].get(surface)
+        kb_id = _owner(index, surface_id, code) if surface_id is not None else None
+        if kb_id is not None:
+            kb_ids.append(kb_id), scores.append(1.0), methods.append("exact"), candidates.append([kb_id])
+        else:
+            kb_ids.append(None), scores.append(0.0), methods.append("none"), candidates.append([])
+            fuzzy_rows.append(row)
+
+    if fuzzy_rows:
+        ids, sims = top_k(index, unique["surface"].iloc[fuzzy_rows].tolist(),
+                          unique["code"].iloc[fuzzy_rows].tolist(), k=k)
+        for row, row_ids, row_sims in zip(fuzzy_rows, ids, sims):
+            code = unique["code"].iat[row]
+            candidates[row] = [_owner(index, i, code) for i, s in zip(row_ids, row_sims) if s > 0]
+            # score nul : aucun candidat (même avec --min-score 0), la mention reste non liée
+            if candidates[row] and row_sims[0] > 0 and row_sims[0] >= min_score:
+                kb_ids[row], scores[row], methods[row] = candidates[row][0], float(row_sims[0]), "fuzzy"
+
+    unique["kb_id"], unique["score"], unique["method"], unique["candidates"] = kb_ids, scores, methods, candidates
+    return keys.merge(unique, on=["surface", "code"], how="left")
+
+
+def link_predictions(debug_data, index: dict, k: int = 5, min_score: float = 0.5) -> pd.DataFrame:
+    """Une ligne par prédiction du fichier debug (clé, span, mention) avec son kb_id."""
+    rows = [(key, key.split("__", 1)[0], entry["text_id"], entry["span"][0], entry["span"][1], entry["entity_text"])
+            for key in debug_data for entry in debug_data[key]]
+    df = pd.DataFrame(rows, columns=["key", "entity_type", "text_id", "start", "end", "entity_text"])
+    linked = link_mentions(index, df["entity_text"].tolist(), df["entity_type"].tolist(), k=k, min_score=min_score)
+    return pd.concat([df, linked[["kb_id", "score", "method", "candidates"]]], axis=1)
+
+
+def link_report(linked: pd.DataFrame) -> pd.DataFrame:
+    """Taux de liaison par type (exact, fuzzy, non lié) et ligne ALL pour la couverture globale."""
+    def rates(group):
+        n = len(group)
+        exact = int((group["method"] == "exact").sum())
+        fuzzy = int((group["method"] == "fuzzy").sum())
+        return {"n_predictions": n, "exact": exact, "fuzzy": fuzzy, "unlinked": n - exact - fuzzy,
+                "link_rate": round((exact + fuzzy) / n, 4) if n else 0.0,
+                "n_concepts": int(group["kb_id"].nunique())}
+
+    report = [{"entity_type": code, **rates(group)} for code, group in linked.groupby("entity_type", sort=False)]
+    report.append({"entity_type": "ALL", **rates(linked)})
+    return pd.DataFrame(report)
+
+
+def attach_links(debug_data, linked: pd.DataFrame) -> dict:
+    """Copie du fichier debug dont chaque prédiction porte kb_id et link_score."""
+    kb_ids = [kb_id if isinstance(kb_id, str) else None for kb_id in linked["kb_id"]]
+    scores = linked["score"].round(4).tolist()
+    out, row = {}, 0
+    for key in debug_data:
+        entries = []
+        for entry in debug_data[key]:
+            entries.append({**entry, "kb_id": kb_ids[row], "link_score": scores[row]})
+            row += 1
+        out[key] = entries
+    return out
+
+
+def main_linking(predictions: Path = PRED_SYNONYM_JSON, kb_path: Path = KB_ENRICHED_PATH, output: Path = LINKED_JSON,
+                 k: int = 5, min_score: float = 0.5):
+    t0 = time.perf_counter()
+    index = build_index(load_json(kb_path))
+    t_index = time.perf_counter() - t0
+    print(f"Index : {len(index['surfaces'])} formes, {index['matrix'].shape[1]} n-grammes ({t_index:.2f} s)")
+
+    debug_data = open_predictions(predictions)
+    t0 = time.perf_counter()
+    linked = link_predictions(debug_data, index, k=k, min_score=min_score)
+    t_link = time.perf_counter() - t0
+    report = link_report(linked)
+    print(f"Liaison : {len(linked)} prédictions en {t_link:.2f} s")
+    print(report.to_string(index=False))
+
+    save_json(attach_links(debug_data, linked), output)
+    print(f"✅ Prédictions liées : {output}")
+    run_id = start_run("linking.py", params={"predictions": str(predictions), "kb": str(kb_path), "k": k,
+                                             "min_score": min_score, "link_seconds": round(t_link, 4)})
+    save_table(run_id, "link_rates", report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Liaison des prédictions aux kb_id (exact + TF-IDF n-grammes)")
+    parser.add_argument("--predictions", type=Path, default=PRED_SYNONYM_JSON)
+    parser.add_argument("--kb", type=Path, default=KB_ENRICHED_PATH)
+    parser.add_argument("--out", type=Path, default=LINKED_JSON)
+    parser.add_argument("-k", type=int, default=5, help="nombre de candidats conservés")
+    parser.add_argument("--min-score", type=float, default=0.5, help="similarité cosinus minimale (liaison floue)")
+    args = parser.parse_args()
+
+    main_linking(args.predictions, args.kb, args.out, k=args.k, min_score=args.min_score)
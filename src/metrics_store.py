@@ -0,0 +1,222 @@
+import os
+import json
+import sqlite3
+import argparse
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import BASE_DIR, METRICS_DB, MODEL_NAME, THRESHOLD, DEFAULT_JACCARD_THRESHOLD
+
+# Stockage unique des métriques (SQLite) à la place des dizaines de fichiers .xlsx par évaluateur.
+# Chaque exécution est un "run" (modèle, seuils, hash git) ; chaque table de métriques est une
+# table SQLite dont les lignes portent le run_id. Les comparaisons d'un run à l'autre sont
+# des jointures SQL sur les colonnes clés ; l'export Excel multi-feuilles se fait à la demande.
+RUN_ID_ENV = "METRICS_RUN_ID"  # permet à run_all.sh de regrouper plusieurs scripts dans un même run
+
+
+def git_hash() -> str:
+    """Hash du commit courant (None hors dépôt git)."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def connect(db_path: Path = METRICS_DB):
+    """Connexion au stockage : validée en fin de bloc `with` (annulée sur exception), puis toujours fermée."""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
+                script TEXT,
+                model TEXT,
+                threshold REAL,
+                jaccard_threshold REAL,
+                git_hash TEXT,
+                params TEXT
+            )""")
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def start_run(script: str, jaccard_threshold: float = DEFAULT_JACCARD_THRESHOLD, model: str = MODEL_NAME,
+              threshold: float = THRESHOLD, params: dict = None, db_path: Path = METRICS_DB) -> int:
+    """
+    Enregistre un nouveau run et retourne son identifiant.
+    Si la variable d'environnement METRICS_RUN_ID est définie, ce run existant est réutilisé.
+    """
+    if os.environ.get(RUN_ID_ENV):
+        return int(os.environ[RUN_ID_ENV])
+    with connect(db_path) as conn:
+        cur = conn.execute(
+            "INSERT INTO runs (created_at, script, model, threshold, jaccard_threshold, git_hash, params) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now().isoformat(timespec="seconds"), script, model, threshold, jaccard_threshold,
+             git_hash(), json.dumps(params or {}, ensure_ascii=False)),
+        )
+        return cur.lastrowid
+
+
+def _sql_type(series: pd.Series) -> str:
+    """Type SQLite d'une colonne, comme pandas.to_sql le choisit à la création de la table."""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def save_table(run_id: int, name: str, df: pd.DataFrame, db_path: Path = METRICS_DB):
+    """
+    Ajoute une table de métriques au run. Une table déjà enregistrée pour ce run est remplacée,
+    de sorte qu'un script relancé dans le même run n'en duplique pas les lignes.
+    Les colonnes nouvelles par rapport aux runs précédents sont ajoutées à la table (NULL pour
+    les anciens runs) ; les colonnes absentes du DataFrame restent NULL pour ce run.
+    """
+    df = df.reset_index(drop=True).copy()
+    df.insert(0, "run_id", run_id)
+    with connect(db_path) as conn:
+        existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{name}")')]
+        if existing:
+            for col in df.columns:
+                if col not in existing:
+                    conn.execute(f'ALTER TABLE "{name}" ADD COLUMN "{col}" {_sql_type(df[col])}')
+            conn.execute(f'DELETE FROM "{name}" WHERE run_id = ?', (run_id,))
+        df.to_sql(name, conn, if_exists="append", index=False)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{name}_run" ON "{name}" (run_id)')
+    print(f" Metrics saved to: {db_path} (table {name}, run {run_id})")
+
+
+def list_runs(db_path: Path = METRICS_DB) -> pd.DataFrame:
+    with connect(db_path) as conn:
+        return pd.read_sql("SELECT * FROM runs ORDER BY run_id", conn)
+
+
+def list_tables(run_id: int = None, db_path: Path = METRICS_DB):
+    """Noms des tables de métriques (celles contenant le run_id donné si précisé)."""
+    with connect(db_path) as conn:
+        names = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT IN ('runs', 'sqlite_sequence') "
+            "ORDER BY name")]
+        if run_id is None:
+            return names
+        return [n for n in names
+                if conn.execute(f'SELECT 1 FROM "{n}" WHERE run_id = ? LIMIT 1', (run_id,)).fetchone()]
+
+
+def latest_runs(name: str, n: int = 2, db_path: Path = METRICS_DB):
+    """Les n derniers run_id ayant produit la table `name` (du plus ancien au plus récent)."""
+    if name not in list_tables(db_path=db_path):
+        raise ValueError(f"Table de métriques inconnue : {name}")
+    with connect(db_path) as conn:
+        rows = conn.execute(f'SELECT DISTINCT run_id FROM "{name}" ORDER BY run_id DESC LIMIT ?', (n,)).fetchall()
+    return [r[0] for r in reversed(rows)]
+
+
+def load_table(name: str, run_id: int = None, db_path: Path = METRICS_DB) -> pd.DataFrame:
+    """Table de métriques d'un run (par défaut le plus récent), sans la colonne run_id."""
+    if run_id is None:
+        runs = latest_runs(name, 1, db_path)
+        if not runs:
+            raise ValueError(f"Table {name} : aucun run enregistré")
+        run_id = runs[-1]
+    with connect(db_path) as conn:
+        df = pd.read_sql(f'SELECT * FROM "{name}" WHERE run_id = ?', conn, params=(run_id,))
+    return df.drop(columns="run_id")
+
+
+def _columns(conn, name: str):
+    """(colonnes clés textuelles, colonnes numériques) d'une table, hors run_id."""
+    keys, values = [], []
+    for _, col, col_type, *_ in conn.execute(f'PRAGMA table_info("{name}")'):
+        if col == "run_id":
+            continue
+        (keys if col_type.upper() == "TEXT" else values).append(col)
+    return keys, values
+
+
+def compare_runs(name: str, run_a: int = None, run_b: int = None, metrics=None,
+                 db_path: Path = METRICS_DB) -> pd.DataFrame:
+    """
+    Compare deux runs sur une table : jointure SQL sur les colonnes clés (textuelles),
+    avec pour chaque métrique la valeur de chaque run et l'écart (b - a).
+    Par défaut, compare les deux derniers runs ayant produit la table.
+    """
+    if run_a is None or run_b is None:
+        runs = latest_runs(name, 2, db_path)
+        if len(runs) < 2:
+            raise ValueError(f"Table {name} : {len(runs)} run(s) enregistré(s), il en faut deux pour comparer "
+                             f"(ou préciser --a et --b)")
+        run_a, run_b = runs
+    with connect(db_path) as conn:
+        keys, values = _columns(conn, name)
+        metrics = list(metrics) if metrics else values
+        select = [f'a."{k}"' for k in keys]
+        for m in metrics:
+            select += [f'a."{m}" AS "{m}_a"', f'b."{m}" AS "{m}_b"', f'b."{m}" - a."{m}" AS "{m}_delta"']
+        join = " AND ".join(f'a."{k}" = b."{k}"' for k in keys) or "1"
+        query = (f'SELECT {", ".join(select)} FROM "{name}" a JOIN "{name}" b ON {join} '
+                 f'WHERE a.run_id = ? AND b.run_id = ?')
+        return pd.read_sql(query, conn, params=(run_a, run_b))
+
+
+def export_workbook(run_id: int, output_path: Path, db_path: Path = METRICS_DB) -> Path:
+    """Exporte toutes les tables d'un run dans un seul classeur Excel (une feuille par table)."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    runs = list_runs(db_path)
+    with pd.ExcelWriter(output_path) as writer:
+        runs[runs["run_id"] == run_id].to_excel(writer, sheet_name="run", index=False)
+        for name in list_tables(run_id, db_path):
+            # Excel limite les noms de feuilles à 31 caractères
+            load_table(name, run_id, db_path).to_excel(writer, sheet_name=name[:31], index=False)
+    print(f" Classeur exporté : {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consultation du stockage des métriques")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_new = sub.add_parser("new-run", help="Crée un run et affiche son identifiant (pour METRICS_RUN_ID)")
+    p_new.add_argument("--script", default="run_all.sh")
+    p_new.add_argument("--jaccard", type=float, default=DEFAULT_JACCARD_THRESHOLD)
+
+    sub.add_parser("runs", help="Liste les runs")
+
+    p_export = sub.add_parser("export", help="Exporte un run en classeur Excel multi-feuilles")
+    p_export.add_argument("--run", type=int, required=True)
+    p_export.add_argument("--output", type=Path, default=None)
+
+    p_cmp = sub.add_parser("compare", help="Compare deux runs sur une table")
+    p_cmp.add_argument("table")
+    p_cmp.add_argument("--a", type=int, default=None)
+    p_cmp.add_argument("--b", type=int, default=None)
+    p_cmp.add_argument("--metric", action="append", default=None)
+
+    args = parser.parse_args()
+    if args.command == "new-run":
+        print(start_run(args.script, jaccard_threshold=args.jaccard))
+    elif args.command == "runs":
+        print(list_runs().to_string(index=False))
+    elif args.command == "export":
+        export_workbook(args.run, args.output or METRICS_DB.parent / f"metrics_run_{args.run}.xlsx")
+    else:
+        print(compare_runs(args.table, args.a, args.b, args.metric).to_string(index=False))
@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import time
+import argparse
+from pathlib import Path
+from functools import partial
+from itertools import islice
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from src.config import DATA_PATH, ENTITY_TYPES, OUTPUT_DIR
+from src.corpus_store import ensure_corpus, doc_text, doc_entities
+from src.Predict_synonymes import (EMBEDDING_CACHE, _cache_path, encode_words, fill_masks,
+                                   model_name_mlm, model_name_st)
+
+# Fouille de synonymes (labels candidats pour ENTITY_TYPES) sur toutes les mentions annotées.
+# Chaque mention gold est placée dans son contexte (la phrase qui la contient) et transformée
+# en requête à masque :
+#   - "hearst" : "<contexte> <mention> is a [MASK]." → le MLM propose des hyperonymes
+#     ("disease", "drug", "organ"...), c'est-à-dire des labels de type ;
+#   - "head"   : le dernier mot (tête) de la mention est masqué dans son contexte → variantes
+#     de la mention elle-même.
+# Les requêtes sont produites en flux depuis le corpus compilé (mmap), par paquets, et
+# réparties sur un pool de processus CPU (un MLM par processus) ; seuls les compteurs
+# agrégés reviennent au processus principal, avec un nombre borné de paquets en vol.
+MINING_DIR = OUTPUT_DIR / "synonym_mining"
+MASK = "[MASK]"
+PROBES = ("hearst", "head")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+
+# ════════════════════ REQUÊTES ════════════════════
+
+def mention_context(text: str, start: int, end: int, window: int = 200) -> tuple:
+    """Phrase contenant la mention (bornée à `window` caractères de chaque côté) : (avant, après)."""
+    left = max(0, start - window)
+    for boundary in _SENTENCE_END.finditer(text, left, start):
+        left = boundary.end()
+    boundary = _SENTENCE_END.search(text, end, end + window)
+    right = boundary.start() + 1 if boundary else min(len(text), end + window)
+    return text[left:start], text[end:right].rstrip()
+
+
+def make_probe(text: str, start: int, end: int, probe: str = "hearst", window: int = 200) -> str:
+    before, after = mention_context(text, start, end, window)
+    mention = text[start:end]
+    if probe == "hearst":
+        return f"{before}{mention}{after} {mention} is a {MASK}.".strip()
+    head_start = mention.rstrip().rfind(" ") + 1  # tête = dernier mot de la mention
+    return f"{before}{mention[:head_start]}{MASK}{after}".strip()
+
+
+def iter_probes(corpus: dict, probe: str = "hearst", window: int = 200):
+    """(code, requête) pour chaque entité du corpus, document par document."""
+    codes = corpus["codes"]
+    for i in range(len(corpus["text_ids"])):
+        text = doc_text(corpus, i)
+        for ent in doc_entities(corpus, i):
+            start, end = int(ent["start"]), int(ent["end"])
+            if end > start:
+                yield codes[ent["code"]], make_probe(text, start, end, probe, window)
+
+
+def chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# ════════════════════ PROCESSUS DE CALCUL ════════════════════
+
+_MLM = {}
+
+
+def _load_mlm(mlm_name: str, threads: int):
+    import torch
+    from transformers import AutoTokenizer, AutoModelForMaskedLM
+    torch.set_num_threads(threads)  # évite la sursouscription : workers × threads ≈ cœurs
+    return AutoTokenizer.from_pretrained(mlm_name), AutoModelForMaskedLM.from_pretrained(mlm_name).eval()
+
+
+def _init_worker(mlm_name: str, threads: int):
+    _MLM["tokenizer"], _MLM["model"] = _load_mlm(mlm_name, threads)
+
+
+def _mine_chunk(chunk, top_k: int = 10, batch_size: int = 32) -> dict:
+    """Paquet de (code, requête) → {"counts": {code: {mot: [occurrences, somme des scores MLM]}}, "contexts": Counter}."""
+    tokenizer, model = _MLM["tokenizer"], _MLM["model"]
+    texts = [text.replace(MASK, tokenizer.mask_token) for _, text in chunk]
+    counts = defaultdict(dict)
+    for (code, _), predictions in zip(chunk, fill_masks(texts, tokenizer, model, top_k, batch_size)):
+        for word, score in predictions:
+            entry = counts[code].setdefault(word.lower(), [0, 0.0])
+            entry[0] += 1
+            entry[1] += score
+    return {"counts": dict(counts), "contexts": Counter(code for code, _ in chunk)}
+
+
+def _bounded_map(pool, fn, iterable, max_in_flight: int):
+    """Comme pool.map, mais sans soumettre tout l'itérable d'avance (mémoire bornée)."""
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def mine_candidates(corpus: dict, probe: str = "hearst", workers: int = None, chunk_size: int = 256,
+                    top_k: int = 10, batch_size: int = 32, mlm_name: str = model_name_mlm,
+                    window: int = 200) -> dict:
+    """Agrège les propositions du MLM par code sur toutes les mentions du corpus."""
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    totals = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+    contexts = Counter()
+    t0 = time.perf_counter()
+
+    def merge(result):
+        contexts.update(result["contexts"])
+        for code, words in result["counts"].items():
+            for word, (n, s) in words.items():
+                totals[code][word][0] += n
+                totals[code][word][1] += s
+        print(f"  {sum(contexts.values())} contextes traités ({time.perf_counter() - t0:.1f} s)")
+
+    chunks = chunked(iter_probes(corpus, probe, window), chunk_size)
+    if workers == 1:
+        _init_worker(mlm_name, threads)
+        for chunk in chunks:
+            merge(_mine_chunk(chunk, top_k, batch_size))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(mlm_name, threads)) as pool:
+            job = partial(_mine_chunk, top_k=top_k, batch_size=batch_size)
+            for result in _bounded_map(pool, job, chunks, 2 * workers):
+                merge(result)
+    return {"totals": {code: dict(words) for code, words in totals.items()}, "contexts": dict(contexts),
+            "seconds": round(time.perf_counter() - t0, 2)}
+
+
+# ════════════════════ CLASSEMENT ════════════════════
+
+def is_label_candidate(word: str) -> bool:
+    return word.isalpha() and len(word) > 2 and word not in ENGLISH_STOP_WORDS
+
+
+def rank_candidates(mined: dict, model_st=None, entity_types: dict = ENTITY_TYPES, cache_path: Path = None,
+                    min_count: int = 3) -> pd.DataFrame:
+    """
+    Une ligne par (code, candidat) :
+      - share       : part des contextes du code où le candidat figure dans le top-k du MLM ;
+      - specificity : share / somme des share du candidat sur tous les codes, y compris ceux où il
+                      reste sous min_count (1 = propre au code) ;
+      - similarity  : cosinus avec le prototype du code (moyenne des labels actuels de ENTITY_TYPES),
+                      si un Sentence Transformer est fourni ;
+      - score       : share × specificity × max(similarity, 0) (sans similarité : share × specificity).
+    """
+    rows, share_sum = [], Counter()
+    for code, words in mined["totals"].items():
+        n_contexts = mined["contexts"][code]
+        for word, (count, score_sum) in words.items():
+            share_sum[word] += count / n_contexts  # sur tous les codes, avant les filtres
+            if count >= min_count and is_label_candidate(word):
+                rows.append({"code": code, "candidate": word, "contexts": count, "share": count / n_contexts,
+                             "mean_mlm_score": score_sum / count})
+    df = pd.DataFrame(rows, columns=["code", "candidate", "contexts", "share", "mean_mlm_score"])
+    if df.empty:
+        return df
+    df["specificity"] = df["share"] / df["candidate"].map(share_sum)
+    df["score"] = df["share"] * df["specificity"]
+
+    if model_st is not None:
+        codes = sorted(df["code"].unique())
+        labels = [s for code in codes for s in entity_types.get(code, [])]
+        vocabulary = list(dict.fromkeys(df["candidate"].tolist() + labels))
+        embeddings, _ = encode_words(vocabulary, model_st, cache_path)
+        position = {w: i for i, w in enumerate(vocabulary)}
+        prototypes = {}
+        for code in codes:
+            rows_ = [position[s] for s in entity_types.get(code, [])]
+            if rows_:
+                proto = embeddings[rows_].mean(axis=0)
+                prototypes[code] = proto / (np.linalg.norm(proto) or 1.0)
+        df["similarity"] = [
+            float(embeddings[position[w]] @ prototypes[c]) if c in prototypes else np.nan
+            for c, w in zip(df["code"], df["candidate"])
+        ]
+        df["score"] = df["score"] * df["similarity"].clip(lower=0).fillna(1.0)
+
+    current = {code: {s.lower() for s in syns} for code, syns in entity_types.items()}
+    df["in_entity_types"] = [w in current.get(c, set()) for c, w in zip(df["code"], df["candidate"])]
+    df = df.sort_values(["code", "score"], ascending=[True, False]).reset_index(drop=True)
+    df["rank"] = df.groupby("code").cumcount() + 1
+    return df
+
+
+def proposed_entity_types(ranked: pd.DataFrame, top_n: int = 10) -> dict:
+    """{code: [candidats classés]} : au format de ENTITY_TYPES, à relire avant de l'y copier."""
+    return {code: group["candidate"].head(top_n).tolist() for code, group in ranked.groupby("code")}
+
+
+def save_mining(ranked: pd.DataFrame, proposals: dict, mined: dict, out_dir: Path = MINING_DIR, probe: str = "hearst"):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ranked.to_parquet(out_dir / f"candidates_{probe}.parquet", index=False)
+    ranked.groupby("code").head(50).to_excel(out_dir / f"candidates_{probe}.xlsx", index=False)
+    (out_dir / f"entity_types_{probe}.json").write_text(
+        json.dumps({"contexts": mined["contexts"], "seconds": mined["seconds"], "proposals": proposals},
+                   ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"✅ Candidats classés : {out_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fouille de labels candidats par MLM sur toutes les mentions du corpus")
+    parser.add_argument("--data", type=Path, default=DATA_PATH)
+    parser.add_argument("--probe", choices=PROBES, default="hearst")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=256, help="requêtes par paquet envoyé à un processus")
+    parser.add_argument("--batch-size", type=int, default=32, help="phrases par passage dans le MLM")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--top-n", type=int, default=10, help="candidats retenus par code dans le JSON")
+    parser.add_argument("--no-similarity", action="store_true", help="classement sans Sentence Transformer")
+    args = parser.parse_args()
+
+    corpus = ensure_corpus(args.data)
+    mined = mine_candidates(corpus, args.probe, args.workers, args.chunk_size, args.top_k, args.batch_size)
+    model_st = None
+    if not args.no_similarity:
+        from sentence_transformers import SentenceTransformer
+        model_st = SentenceTransformer(model_name_st)
+    ranked = rank_candidates(mined, model_st, cache_path=_cache_path(EMBEDDING_CACHE, model_name_st), min_count=args.min_count)
+    proposals = proposed_entity_types(ranked, args.top_n)
+    for code, candidates in proposals.items():
+        print(f"  {code:<18} {', '.join(candidates)}")
+    save_mining(ranked, proposals, mined, probe=args.probe)
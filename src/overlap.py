@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Moteur de recouvrement entre ensembles de labels.
+# Chaque ensemble de labels est une ligne d'une matrice d'incidence binaire creuse dont les colonnes
+# sont les spans (text_id, start, end) : deux spans identiques dans des documents différents
+# restent distincts. Toutes les intersections deux à deux viennent d'un seul produit M @ M.T,
+# les cardinaux (et donc les unions) des sommes de lignes.
+
+
+def spans_by_label_set(debug_data: dict, code: str, label_sets=None) -> dict:
+    """
+    {label_set: [(text_id, start, end), ...]} pour les clés "<code>__<label_set>" des prédictions.
+    Si label_sets est None, toutes les clés de l'entité sont prises, dans l'ordre du fichier.
+    """
+    if label_sets is None:
+        label_sets = [key.split("__", 1)[1] for key in debug_data if key.startswith(f"{code}__")]
+    return {
+        label_set: [(entry["text_id"], entry["span"][0], entry["span"][1])
+                    for entry in debug_data.get(f"{code}__{label_set}", [])]
+        for label_set in label_sets
+    }
+
+
+def incidence_matrix(spans: dict):
+    """
+    Matrice binaire creuse (ensembles de labels × spans distincts du corpus).
+    Retourne (noms des lignes, matrice CSR de type int32).
+    """
+    names = list(spans)
+    lengths = [len(spans[name]) for name in names]
+    flat = [span for name in names for span in spans[name]]
+    if not flat:
+        return names, sparse.csr_matrix((len(names), 0), dtype=np.int32)
+
+    doc_codes, _ = pd.factorize(np.array([span[0] for span in flat], dtype=object))
+    starts = np.fromiter((span[1] for span in flat), dtype=np.int64, count=len(flat))
+    ends = np.fromiter((span[2] for span in flat), dtype=np.int64, count=len(flat))
+    # (document, start, end) encodé en un seul entier 64 bits : np.unique 1D au lieu d'un tri de lignes
+    width = int(ends.max()) + 1
+    keys = (doc_codes.astype(np.int64) * width + starts) * width + ends
+    _, cols = np.unique(keys, return_inverse=True)
+    rows = np.repeat(np.arange(len(names)), lengths)
+
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                               shape=(len(names), int(cols.max()) + 1))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1  # un span prédit plusieurs fois par le même ensemble ne compte qu'une fois
+    return names, matrix
+
+
+def overlap_counts(matrix):
+    """(intersections deux à deux, cardinaux) à partir d'un seul produit creux."""
+    inter = (matrix @ matrix.T).toarray().astype(np.int64)
+    sizes = np.asarray(matrix.sum(axis=1)).ravel().astype(np.int64)
+    return inter, sizes
+
+
+def jaccard_from_counts(inter, sizes):
+    """Jaccard |A∩B| / (|A|+|B|-|A∩B|) ; deux ensembles vides ont un Jaccard de 1.0."""
+    union = sizes[:, None] + sizes[None, :] - inter
+    return np.divide(inter, union, out=np.ones(inter.shape, dtype=float), where=union > 0)
+
+
+def jaccard_matrix(spans: dict, diagonal: float = None) -> pd.DataFrame:
+    """
+    Matrice de Jaccard exacte entre tous les ensembles de labels (index et colonnes = noms).
+    `diagonal` est écrit dans le tableau numpy avant la construction du DataFrame (avec pandas >= 3,
+    le tableau derrière un DataFrame est en lecture seule).
+    """
+    names, matrix = incidence_matrix(spans)
+    inter, sizes = overlap_counts(matrix)
+    jac = jaccard_from_counts(inter, sizes)
+    if diagonal is not None:
+        np.fill_diagonal(jac, diagonal)
+    return pd.DataFrame(jac, index=names, columns=names)
+
+
+# ════════════════════ MODE APPROCHÉ : MINHASH + LSH ════════════════════
+# Pour des centaines de labels candidats, la matrice n×n exacte devient illisible et coûteuse.
+# Chaque ligne de la matrice d'incidence est résumée par une signature MinHash ; le découpage
+# en bandes (LSH) ne propose que les paires probablement au-dessus du seuil, dont le Jaccard
+# est estimé par la fraction de composantes égales des signatures.
+
+_EMPTY = np.iinfo(np.uint32).max  # composante de signature d'une ligne vide
+
+
+def minhash_signatures(matrix, num_perm: int = 128, seed: int = 0, chunk: int = 8) -> np.ndarray:
+    """
+    Signatures MinHash (num_perm par ligne) de la matrice d'incidence CSR.
+    Chaque "permutation" est un tirage aléatoire d'une valeur par colonne (span) : contrairement à un
+    hachage linéaire (a * x + b) mod p, il n'introduit pas de biais sur des identifiants de colonnes
+    contigus (spans voisins). Une ligne vide reçoit _EMPTY sur toutes ses composantes.
+    Les permutations sont traitées par paquets de `chunk` (valeurs 32 bits) pour rester en cache.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    n_rows, n_cols = matrix.shape
+    rng = np.random.default_rng(seed)
+
+    signatures = np.full((n_rows, num_perm), _EMPTY, dtype=np.uint32)
+    if matrix.nnz == 0:
+        return signatures
+    non_empty = np.flatnonzero(np.diff(matrix.indptr) > 0)
+    starts = matrix.indptr[non_empty]
+    for k in range(0, num_perm, chunk):
+        width = min(chunk, num_perm - k)
+        values = rng.integers(0, _EMPTY, size=(width, n_cols), dtype=np.uint32)
+        hashed = values[:, matrix.indices]
+        signatures[non_empty, k:k + width] = np.minimum.reduceat(hashed, starts, axis=1).T
+    return signatures
+
+
+def lsh_params(num_perm: int, cutoff: float):
+    """
+    (bandes, lignes par bande) avec bandes × lignes = num_perm, dont le seuil implicite
+    (1/bandes)^(1/lignes) est le plus proche du seuil demandé sans le dépasser (on préfère
+    quelques candidats en trop, vérifiés ensuite, à des paires manquées).
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        implicit = (1 / bands) ** (1 / rows)
+        if implicit <= cutoff and (best is None or implicit > best[2]):
+            best = (bands, rows, implicit)
+    return (best[0], best[1]) if best else (num_perm, 1)
+
+
+def lsh_candidates(signatures: np.ndarray, bands: int, rows: int):
+    """Paires (i, j), i < j, partageant au moins une bande de signature identique."""
+    valid = np.flatnonzero(signatures[:, 0] < _EMPTY)  # les lignes vides ne sont jamais candidates
+    pairs = set()
+    for band in range(bands):
+        block = signatures[valid, band * rows:(band + 1) * rows]
+        _, bucket = np.unique(block, axis=0, return_inverse=True)
+        order = np.argsort(bucket.ravel(), kind="stable")
+        bucket = bucket.ravel()[order]
+        bounds = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if hi - lo > 1:
+                members = np.sort(valid[order[lo:hi]])
+                pairs.update((int(i), int(j)) for x, i in enumerate(members) for j in members[x + 1:])
+    return sorted(pairs)
+
+
+def approximate_overlap(spans: dict, cutoff: float = 0.5, num_perm: int = 128, seed: int = 0,
+                        z: float = 1.96, verify: bool = False) -> pd.DataFrame:
+    """
+    Paires d'ensembles de labels dont le Jaccard estimé (MinHash) dépasse `cutoff`.
+    L'estimateur est la fraction de composantes égales sur num_perm, d'écart-type
+    sqrt(J (1 - J) / num_perm) : on rapporte l'intervalle de confiance [low, high] au niveau z.
+    Avec verify=True, le Jaccard exact des seules paires candidates est ajouté (colonne
+    jaccard_exact) et sert de filtre : cela élimine les paires retenues par le seul bruit
+    d'estimation quand beaucoup de paires sont juste sous le seuil.
+    """
+    names, matrix = incidence_matrix(spans)
+    signatures = minhash_signatures(matrix, num_perm=num_perm, seed=seed)
+    bands, rows = lsh_params(num_perm, cutoff)
+
+    candidates = np.array(lsh_candidates(signatures, bands, rows), dtype=np.int64).reshape(-1, 2)
+    ia, ib = candidates[:, 0], candidates[:, 1]
+    estimate = (signatures[ia] == signatures[ib]).mean(axis=1)
+    stderr = np.sqrt(estimate * (1 - estimate) / num_perm)
+    df = pd.DataFrame({
+        "label_a": [names[i] for i in ia],
+        "label_b": [names[j] for j in ib],
+        "jaccard_est": np.round(estimate, 4),
+        "stderr": np.round(stderr, 4),
+        "low": np.round(np.clip(estimate - z * stderr, 0, 1), 4),
+        "high": np.round(np.clip(estimate + z * stderr, 0, 1), 4),
+    })
+    if verify:
+        # Intersections des seules paires candidates : produit ligne à ligne, sans matrice n×n
+        inter = np.asarray(matrix[ia].multiply(matrix[ib]).sum(axis=1)).ravel()
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+        union = sizes[ia] + sizes[ib] - inter
+        df["jaccard_exact"] = np.round(np.divide(inter, union, out=np.zeros(len(inter)), where=union > 0), 4)
+        df = df[df["jaccard_exact"] >= cutoff]
+    else:
+        df = df[df["jaccard_est"] >= cutoff]
+    return df.sort_values("jaccard_est", ascending=False, ignore_index=True)
+
+
+def benchmark_approximate(spans: dict, cutoff: float = 0.5, num_perm: int = 128, seed: int = 0,
+                          verify: bool = False) -> dict:
+    """
+    Compare le mode approché à la matrice exacte : temps, rappel et précision des paires
+    au-dessus du seuil, erreur absolue moyenne/maximale et couverture des intervalles de confiance.
+    """
+    import time
+
+    t0 = time.perf_counter()
+    exact = jaccard_matrix(spans)
+    t_exact = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    approx = approximate_overlap(spans, cutoff=cutoff, num_perm=num_perm, seed=seed, verify=verify)
+    t_approx = time.perf_counter() - t0
+
+    names, values = list(exact.index), exact.to_numpy()
+    sizes = np.asarray(incidence_matrix(spans)[1].sum(axis=1)).ravel()
+    upper = np.triu_indices(len(names), k=1)
+    # Deux ensembles vides ont un Jaccard exact de 1.0 par convention : ils ne sont pas des paires réelles.
+    real = (sizes[upper[0]] > 0) & (sizes[upper[1]] > 0)
+    true_pairs = {(names[i], names[j]) for i, j, ok in zip(*upper, real) if ok and values[i, j] >= cutoff}
+    found = {(a, b) for a, b in zip(approx["label_a"], approx["label_b"])}
+
+    truth = exact.loc[approx["label_a"], approx["label_b"]].to_numpy().diagonal() if len(approx) else np.empty(0)
+    error = np.abs(approx["jaccard_est"].to_numpy() - truth)
+    covered = (approx["low"].to_numpy() <= truth) & (truth <= approx["high"].to_numpy())
+    return {
+        "n_label_sets": len(names),
+        "cutoff": cutoff,
+        "num_perm": num_perm,
+        "verify": verify,
+        "exact_seconds": round(t_exact, 4),
+        "approx_seconds": round(t_approx, 4),
+        "pairs_exact": len(true_pairs),
+        "pairs_approx": len(found),
+        "recall": round(len(true_pairs & found) / len(true_pairs), 4) if true_pairs else 1.0,
+        "precision": round(len(true_pairs & found) / len(found), 4) if found else 1.0,
+        "mean_abs_error": round(float(error.mean()), 4) if len(error) else 0.0,
+        "max_abs_error": round(float(error.max()), 4) if len(error) else 0.0,
+        "ci_coverage": round(float(covered.mean()), 4) if len(covered) else 1.0,
+    }
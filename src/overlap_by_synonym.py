@@ -1,7 +1,3 @@
-import os
-import json
-import itertools
-import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -9,51 +5,47 @@ from pathlib import Path
 
 from src.config import ENTITY_TYPES
 from src.utils import ensure_dir
+from src.decoding import load_predictions
+from src.overlap import spans_by_label_set, jaccard_matrix, approximate_overlap, benchmark_approximate
+from src.metrics_store import start_run, save_table
 
 # Répertoires
 DEBUG_FILE = Path("outputs/debug_by_synonym.json")
 OUT_DIR = Path("outputs/overlap_analysis/synonym_level")
 ensure_dir(OUT_DIR)
 
-def extract_spans(debug_data, code, synonym):
-    """Récupère les ensembles de spans prédits pour un synonyme donné."""
-    spans_by_text = {}
-    key = f"{code}__{synonym}"
-    for entry in debug_data.get(key, []):
-        tid = entry["text_id"]
-        span = tuple(entry["span"])
-        spans_by_text.setdefault(tid, set()).add(span)
-    return spans_by_text
+def main_approx(cutoff: float = 0.5, num_perm: int = 128, verify: bool = False, benchmark: bool = False):
+    """
+    Mode approché (MinHash + LSH) pour de grands vocabulaires de synonymes :
+    seules les paires dont le Jaccard estimé dépasse `cutoff` sont rapportées, avec leur intervalle de confiance.
+    Avec benchmark=True, compare aussi précision et temps à la matrice exacte.
+    """
+    debug_data = load_predictions(DEBUG_FILE)
 
-def flatten_spans(spans_dict):
-    """Concatène tous les spans en un seul set."""
-    all_spans = set()
-    for spans in spans_dict.values():
-        all_spans.update(spans)
-    return all_spans
+    pairs_by_type, benchmarks = [], []
+    for code, synonyms in ENTITY_TYPES.items():
+        print(f" Overlap approché (MinHash, {num_perm} permutations) pour : {code}")
+        spans = spans_by_label_set(debug_data, code, synonyms)
+        pairs = approximate_overlap(spans, cutoff=cutoff, num_perm=num_perm, verify=verify)
+        pairs.insert(0, "entity_type", code)
+        pairs_by_type.append(pairs)
+        print(f"   {len(pairs)} paire(s) au-dessus de {cutoff}")
+        if benchmark:
+            benchmarks.append({"entity_type": code, **benchmark_approximate(spans, cutoff, num_perm, verify=verify)})
 
-def compute_jaccard(set1, set2):
-    if not set1 and not set2:
-        return 1.0
-    return len(set1 & set2) / len(set1 | set2)
+    run_id = start_run("overlap_by_synonym.py",
+                       params={"mode": "approx", "cutoff": cutoff, "num_perm": num_perm, "verify": verify})
+    save_table(run_id, "overlap_approx_pairs", pd.concat(pairs_by_type, ignore_index=True))
+    if benchmarks:
+        save_table(run_id, "overlap_minhash_benchmark", pd.DataFrame(benchmarks))
 
 def main():
-    with open(DEBUG_FILE, encoding="utf-8") as f:
-        debug_data = json.load(f)
+    debug_data = load_predictions(DEBUG_FILE)
 
     for code, synonyms in ENTITY_TYPES.items():
         print(f" Overlap des prédictions pour : {code}")
-        span_sets = {
-            syn: flatten_spans(extract_spans(debug_data, code, syn))
-            for syn in synonyms
-        }
-
-        matrix = np.zeros((len(synonyms), len(synonyms)))
-        for i, j in itertools.product(range(len(synonyms)), repeat=2):
-            s1, s2 = synonyms[i], synonyms[j]
-            matrix[i, j] = compute_jaccard(span_sets[s1], span_sets[s2])
-
-        df = pd.DataFrame(matrix, index=synonyms, columns=synonyms)
+        # Matrice d'incidence synonymes × (text_id, start, end) : un seul produit creux
+        df = jaccard_matrix(spans_by_label_set(debug_data, code, synonyms))
         df.to_excel(OUT_DIR / f"jaccard_matrix_{code}.xlsx", index=True)
 
         # Plot
@@ -67,4 +59,16 @@ def main():
     print(f"\n Chevauchement par synonyme enregistré dans : {OUT_DIR.resolve()}")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--approx", action="store_true", help="Mode approché MinHash/LSH (grands vocabulaires)")
+    parser.add_argument("--cutoff", type=float, default=0.5, help="Jaccard minimal des paires rapportées")
+    parser.add_argument("--num-perm", type=int, default=128, help="Nombre de permutations MinHash")
+    parser.add_argument("--verify", action="store_true", help="Vérifie exactement les paires candidates")
+    parser.add_argument("--benchmark", action="store_true", help="Compare le mode approché à la matrice exacte")
+    args = parser.parse_args()
+
+    if args.approx:
+        main_approx(cutoff=args.cutoff, num_perm=args.num_perm, verify=args.verify, benchmark=args.benchmark)
+    else:
+        main()
@@ -0,0 +1,158 @@
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
+
+from src.config import ENTITY_TYPES, MODEL_NAME, OUTPUT_DIR, PRED_SYNONYM_JSON
+from src.utils import load_gliner
+from src.decoding import load_predictions
+from src.overlap import spans_by_label_set, jaccard_matrix
+from src.metrics_store import start_run, save_table
+
+# Pré-passe sans inférence sur le corpus : les labels de ENTITY_TYPES sont encodés par
+# l'encodeur de labels du modèle GLiNER lui-même (modèle bi-encodeur), puis comparés deux à
+# deux (cosinus). Les quasi-doublons d'un même type ("disease"/"disorder") sont regroupés par
+# classification hiérarchique en lien complet (tous les labels d'un groupe sont à un cosinus
+# >= seuil les uns des autres) et un seul label est gardé par groupe, avant predict_combinations.
+# Quand debug_by_synonym.json existe, le chevauchement prédit (cosinus) est comparé au
+# chevauchement mesuré (Jaccard des spans prédits, comme overlap_by_synonym.py).
+PRUNING_DIR = OUTPUT_DIR / "label_pruning"
+
+
+def encode_labels(model, labels: list, batch_size: int = 32) -> np.ndarray:
+    """Embeddings L2-normalisés des labels par l'encodeur de labels de GLiNER (un seul appel)."""
+    if not hasattr(model, "encode_labels"):
+        raise ValueError(f"{type(model).__name__} n'expose pas encode_labels : un modèle GLiNER bi-encodeur "
+                         f"est nécessaire (ex. {MODEL_NAME})")
+    vectors = model.encode_labels(labels, batch_size=batch_size)
+    vectors = vectors.detach().float().cpu().numpy() if hasattr(vectors, "detach") else np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+
+def similarity_pairs(entity_types: dict, vectors: np.ndarray) -> pd.DataFrame:
+    """
+    Une ligne par paire de labels (même type ou non) avec leur cosinus. La colonne measured_jaccard
+    est toujours présente (NaN sans prédictions) : la table label_pruning_pairs garde le même schéma.
+    """
+    owners = [(code, label) for code, labels in entity_types.items() for label in labels]
+    sims = vectors @ vectors.T
+    i, j = np.triu_indices(len(owners), k=1)
+    return pd.DataFrame({
+        "type_a": [owners[a][0] for a in i], "label_a": [owners[a][1] for a in i],
+        "type_b": [owners[b][0] for b in j], "label_b": [owners[b][1] for b in j],
+        "cosine": np.round(sims[i, j], 6),
+        "same_type": [owners[a][0] == owners[b][0] for a, b in zip(i, j)],
+        "measured_jaccard": np.nan,
+    })
+
+
+def cluster_labels(labels: list, vectors: np.ndarray, threshold: float = 0.9) -> list:
+    """
+    Groupes de labels dont tous les cosinus deux à deux sont >= threshold (lien complet :
+    pas d'enchaînement A~B~C). Chaque groupe est ordonné : d'abord le label le plus central
+    (cosinus moyen maximal avec les autres), à égalité le premier dans ENTITY_TYPES.
+    """
+    if len(labels) == 1:
+        return [list(labels)]
+    sims = np.clip(vectors @ vectors.T, -1.0, 1.0)
+    distances = squareform(1.0 - sims, checks=False)
+    assignment = fcluster(linkage(distances, method="complete"), t=1.0 - threshold, criterion="distance")
+    groups = []
+    for cluster in dict.fromkeys(assignment):
+        members = [k for k, c in enumerate(assignment) if c == cluster]
+        centrality = sims[np.ix_(members, members)].mean(axis=1)
+        order = sorted(range(len(members)), key=lambda m: (-round(float(centrality[m]), 6), members[m]))
+        groups.append([labels[members[m]] for m in order])
+    return groups
+
+
+def prune_entity_types(entity_types: dict, vectors: np.ndarray, threshold: float = 0.9):
+    """(ENTITY_TYPES élagué, table des groupes) : un représentant par groupe de quasi-doublons."""
+    pruned, rows, offset = {}, [], 0
+    for code, labels in entity_types.items():
+        groups = cluster_labels(labels, vectors[offset:offset + len(labels)], threshold)
+        offset += len(labels)
+        kept = {group[0] for group in groups}
+        pruned[code] = [label for label in labels if label in kept]  # ordre d'origine conservé
+        for group in groups:
+            rows.append({"entity_type": code, "kept": group[0], "dropped": ", ".join(group[1:]), "size": len(group)})
+    return pruned, pd.DataFrame(rows)
+
+
+def measured_overlap(pairs: pd.DataFrame, debug_data: dict, entity_types: dict) -> pd.DataFrame:
+    """Ajoute aux paires d'un même type le Jaccard des spans prédits par chacun des deux labels."""
+    pairs = pairs.copy()
+    pairs["measured_jaccard"] = np.nan
+    for code, labels in entity_types.items():
+        jac = jaccard_matrix(spans_by_label_set(debug_data, code, labels))
+        rows = pairs.index[pairs["same_type"] & (pairs["type_a"] == code)]
+        pairs.loc[rows, "measured_jaccard"] = [jac.loc[a, b] for a, b in
+                                               zip(pairs.loc[rows, "label_a"], pairs.loc[rows, "label_b"])]
+    return pairs
+
+
+def agreement(pairs: pd.DataFrame, threshold: float, cutoff: float) -> dict:
+    """Le cosinus prédit-il le chevauchement mesuré ? Corrélation de rang et précision/rappel au seuil."""
+    measured = pairs.dropna(subset=["measured_jaccard"])
+    predicted = measured["cosine"] >= threshold
+    actual = measured["measured_jaccard"] >= cutoff
+    tp = int((predicted & actual).sum())
+    return {
+        "pairs": len(measured),
+        "spearman": round(float(measured["cosine"].corr(measured["measured_jaccard"], method="spearman")), 4)
+        if len(measured) > 2 else None,
+        "predicted_redundant": int(predicted.sum()),
+        "measured_redundant": int(actual.sum()),
+        "precision": round(tp / int(predicted.sum()), 4) if predicted.sum() else None,
+        "recall": round(tp / int(actual.sum()), 4) if actual.sum() else None,
+    }
+
+
+def main_prune(threshold: float = 0.9, cutoff: float = 0.5, model=None, debug_path: Path = PRED_SYNONYM_JSON,
+               entity_types: dict = ENTITY_TYPES):
+    model = model or load_gliner(MODEL_NAME)
+    labels = [label for synonyms in entity_types.values() for label in synonyms]
+    vectors = encode_labels(model, labels)
+    pairs = similarity_pairs(entity_types, vectors)
+    pruned, groups = prune_entity_types(entity_types, vectors, threshold)
+
+    print(groups[groups["size"] > 1].to_string(index=False) if (groups["size"] > 1).any()
+          else f" Aucun quasi-doublon au seuil {threshold}")
+    cross = pairs[~pairs["same_type"] & (pairs["cosine"] >= threshold)]
+    if len(cross):
+        print(f" {len(cross)} paire(s) de labels de types différents au-dessus du seuil (risque de confusion) :")
+        print(cross.to_string(index=False))
+
+    summary = None
+    if debug_path and Path(debug_path).exists():
+        pairs = measured_overlap(pairs, load_predictions(Path(debug_path)), entity_types)
+        summary = agreement(pairs, threshold, cutoff)
+        print(f" Chevauchement prédit vs mesuré : {summary}")
+
+    PRUNING_DIR.mkdir(parents=True, exist_ok=True)
+    (PRUNING_DIR / "entity_types_pruned.json").write_text(json.dumps(pruned, ensure_ascii=False, indent=2),
+                                                          encoding="utf-8")
+    with pd.ExcelWriter(PRUNING_DIR / "label_pruning.xlsx") as writer:
+        groups.to_excel(writer, sheet_name="groups", index=False)
+        pairs.sort_values("cosine", ascending=False).to_excel(writer, sheet_name="pairs", index=False)
+    run_id = start_run("prune_labels.py", params={"threshold": threshold, "cutoff": cutoff, "agreement": summary})
+    save_table(run_id, "label_pruning_pairs", pairs)
+    save_table(run_id, "label_pruning_groups", groups)
+    removed = sum(map(len, entity_types.values())) - sum(map(len, pruned.values()))
+    print(f"✅ {removed} label(s) redondant(s) retiré(s) : {PRUNING_DIR / 'entity_types_pruned.json'}")
+    return pruned, groups, pairs, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Élagage des synonymes redondants par l'encodeur de labels GLiNER")
+    parser.add_argument("--threshold", type=float, default=0.9, help="cosinus minimal entre labels d'un même groupe")
+    parser.add_argument("--cutoff", type=float, default=0.5,
+                        help="Jaccard mesuré au-delà duquel deux labels sont jugés redondants")
+    parser.add_argument("--debug", type=Path, default=PRED_SYNONYM_JSON,
+                        help="prédictions par synonyme pour le chevauchement mesuré (ignoré si absent)")
+    args = parser.parse_args()
+    main_prune(args.threshold, args.cutoff, debug_path=args.debug)
@@ -0,0 +1,181 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")  # rendu sans affichage, sûr dans les processus fils
+import numpy as np
+import matplotlib.colors as mcolors
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from src.config import OUTPUT_DIR
+from src.utils import atomic_path
+
+# Sous-système de rendu des graphiques et matrices de confusion.
+# Chaque artefact est décrit par un "job" {kind, data, path} dont les données sont
+# sérialisables en JSON : on peut ainsi le hacher (pour sauter les artefacts inchangés)
+# et l'envoyer à un pool de processus.
+RENDER_MANIFEST = OUTPUT_DIR / ".render_manifest.json"
+
+# Figures réutilisées dans chaque processus (une par taille), vidées entre deux jobs.
+_FIGURES = {}
+
+
+def get_figure(figsize) -> Figure:
+    figsize = tuple(figsize)
+    fig = _FIGURES.get(figsize)
+    if fig is None:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        _FIGURES[figsize] = fig
+    else:
+        fig.clf()
+    return fig
+
+
+def combo_size_colors(combos):
+    """Couleur des barres selon le nombre de synonymes de la combinaison."""
+    palette = {2: "green", 3: "orange", 4: "red", 5: "blue"}
+    return [palette.get(len(c.split("__")), "purple") for c in combos]
+
+
+def unique_labels(labels, sep: str = "-"):
+    """Rend les libellés uniques en suffixant les doublons (ex : 'd_d', 'd_d-2')."""
+    seen = {}
+    result = []
+    for label in labels:
+        seen[label] = seen.get(label, 0) + 1
+        result.append(f"{label}{sep}{seen[label]}" if seen[label] > 1 else label)
+    return result
+
+
+# ════════════════════ RENDUS ════════════════════
+
+def render_barplot(data: dict, output_path: Path):
+    """Diagramme en barres d'une métrique, avec la valeur au-dessus de chaque barre."""
+    fig = get_figure(data.get("figsize", (14, 6)))
+    ax = fig.subplots()
+    bars = ax.bar(data["labels"], data["values"], color=data.get("colors"))
+    ax.tick_params(axis="x", labelrotation=data.get("rotation", 90))
+    ax.set_title(data["title"])
+    ax.set_ylim(0, 1.1)
+    fmt = data.get("value_fmt", "{:.4f}")
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2, height + 0.01, fmt.format(height),
+                ha="center", va="bottom", fontsize=7)
+    fig.tight_layout()
+    fig.savefig(output_path, bbox_inches="tight")
+
+
+def render_confusion_2x2(data: dict, output_path: Path):
+    """Matrice de confusion 2x2 (TP/FP en haut, FN/TN en bas), vert = correct, rouge = erreur."""
+    fig = get_figure((6, 6))
+    ax = fig.subplots()
+    cmap = mcolors.ListedColormap(["#d4edda", "#f8d7da"])
+    ax.imshow(np.array([[0, 1], [1, 0]]), cmap=cmap)
+
+    for (x, y), key in {(0, 0): "tp", (1, 0): "fp", (0, 1): "fn", (1, 1): "tn"}.items():
+        ax.text(x, y, f"\n{data[key]}", ha="center", va="center", color="black", fontsize=16, weight="bold")
+
+    ax.set_xticks([0, 1])
+    ax.set_yticks([0, 1])
+    ax.set_xticklabels(["Positive", "Negative"], fontsize=12)
+    ax.set_yticklabels(["Positive", "Negative"], fontsize=12, rotation=90, va="center")
+    ax.set_xlabel("True Class", fontsize=14, labelpad=20)
+    ax.set_ylabel("Predicted Class", fontsize=14, labelpad=20, rotation=0, ha="right")
+    ax.set_title(data["title"], fontsize=16)
+
+    ax.set_xticks(np.arange(-0.5, 2, 1), minor=True)
+    ax.set_yticks(np.arange(-0.5, 2, 1), minor=True)
+    ax.grid(which="minor", color="gray", linestyle="-", linewidth=1.5)
+    ax.tick_params(which="minor", bottom=False, left=False)
+    for spine in ax.spines.values():
+        spine.set_visible(True)
+        spine.set_color("gray")
+
+    fig.tight_layout()
+    fig.savefig(output_path, bbox_inches="tight")
+
+
+RENDERERS = {
+    "barplot": render_barplot,
+    "confusion_2x2": render_confusion_2x2,
+}
+
+
+# ════════════════════ ORCHESTRATION ════════════════════
+
+def _to_builtin(value):
+    if isinstance(value, dict):
+        return {k: _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def make_job(kind: str, data: dict, output_path: Path) -> dict:
+    if kind not in RENDERERS:
+        raise ValueError(f"Type de rendu inconnu : {kind}")
+    return {"kind": kind, "data": _to_builtin(data), "path": str(output_path)}
+
+
+def job_hash(job: dict) -> str:
+    payload = json.dumps([job["kind"], job["data"]], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _run_job(job: dict) -> str:
+    path = Path(job["path"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    RENDERERS[job["kind"]](job["data"], path)
+    return job["path"]
+
+
+def _load_manifest(path: Path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(manifest: dict, path: Path):
+    with atomic_path(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def render_all(jobs, workers: int = None, force: bool = False, manifest_path: Path = RENDER_MANIFEST):
+    """
+    Exécute les jobs de rendu en parallèle, en sautant ceux dont le fichier existe déjà
+    et dont le hash des données d'entrée n'a pas changé depuis le dernier passage.
+    Retourne (nombre rendu, nombre sauté).
+    """
+    jobs = list(jobs)
+    manifest = _load_manifest(manifest_path)
+    hashes = {job["path"]: job_hash(job) for job in jobs}
+    todo = [
+        job for job in jobs
+        if force or not Path(job["path"]).exists() or manifest.get(job["path"]) != hashes[job["path"]]
+    ]
+    skipped = len(jobs) - len(todo)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) < 2 * workers:
+        done = [_run_job(job) for job in todo]
+    else:
+        chunksize = max(1, len(todo) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_run_job, todo, chunksize=chunksize))
+
+    for path in done:
+        manifest[path] = hashes[path]
+    if done:
+        _save_manifest(manifest, manifest_path)
+    print(f" Rendu : {len(done)} artefact(s) générés, {skipped} inchangé(s) sautés")
+    return len(done), skipped
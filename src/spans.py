@@ -0,0 +1,68 @@
+import numpy as np
+
+# Outils vectorisés sur les spans [start, end) : jointure d'intervalles par tri-balayage.
+# Les spans de plusieurs documents sont placés sur un axe global (doc * stride + offset)
+# pour qu'une seule jointure couvre tout le corpus sans chevauchement inter-documents.
+
+
+def global_coords(doc_idx, start, end, stride: int):
+    """Projette des spans (doc, start, end) sur un axe global sans collision entre documents."""
+    base = np.asarray(doc_idx, dtype=np.int64) * stride
+    return base + np.asarray(start, dtype=np.int64), base + np.asarray(end, dtype=np.int64)
+
+
+def corpus_stride(corpus) -> int:
+    """Pas de l'axe global : strictement supérieur à la longueur du plus long texte."""
+    return max((len(doc["text"]) for doc in corpus), default=0) + 1
+
+
+def interval_join(a_start, a_end, b_start, b_end):
+    """
+    Jointure de chevauchement entre deux listes d'intervalles [start, end).
+    Trie b par début puis, pour chaque a, borne la fenêtre des candidats par recherche
+    dichotomique (b.start < a.end et b.start > a.start - longueur_max(b)).
+    Retourne (ia, ib, overlap) : indices des paires qui se chevauchent et longueur commune.
+    """
+    a_start = np.asarray(a_start, dtype=np.int64)
+    a_end = np.asarray(a_end, dtype=np.int64)
+    b_start = np.asarray(b_start, dtype=np.int64)
+    b_end = np.asarray(b_end, dtype=np.int64)
+    empty = np.empty(0, dtype=np.int64)
+    if a_start.size == 0 or b_start.size == 0:
+        return empty, empty, empty
+
+    order = np.argsort(b_start, kind="stable")
+    bs, be = b_start[order], b_end[order]
+    max_len = int((be - bs).max())
+
+    lo = np.searchsorted(bs, a_start - max_len, side="right")
+    hi = np.searchsorted(bs, a_end, side="left")
+    n_cand = np.clip(hi - lo, 0, None)
+    total = int(n_cand.sum())
+    if total == 0:
+        return empty, empty, empty
+
+    ia = np.repeat(np.arange(a_start.size), n_cand)
+    first = np.cumsum(n_cand) - n_cand
+    jb = lo[ia] + (np.arange(total) - first[ia])
+
+    overlap = np.minimum(a_end[ia], be[jb]) - np.maximum(a_start[ia], bs[jb])
+    keep = overlap > 0
+    return ia[keep], order[jb[keep]], overlap[keep]
+
+
+def best_match(ia, keys, n_a: int):
+    """
+    Pour chaque élément de a, indice (dans les paires) de la paire de meilleure priorité.
+    `keys` est une liste de tableaux de priorités (le premier est le plus important, plus grand = meilleur).
+    Retourne un tableau de taille n_a contenant -1 pour les éléments sans paire.
+    """
+    best = np.full(n_a, -1, dtype=np.int64)
+    if len(ia) == 0:
+        return best
+    # np.lexsort trie par la dernière clé en premier : ia est la clé principale.
+    order = np.lexsort(tuple(-np.asarray(k, dtype=np.int64) for k in reversed(keys)) + (ia,))
+    sorted_ia = ia[order]
+    first = np.flatnonzero(np.r_[True, sorted_ia[1:] != sorted_ia[:-1]])
+    best[sorted_ia[first]] = order[first]
+    return best
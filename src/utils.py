@@ -1,16 +1,25 @@
+import os
 import json
-import torch
+import tempfile
 from pathlib import Path
-from gliner import GLiNER
+from contextlib import contextmanager
 
-# Chargement du corpus depuis un fichier JSON
+import orjson
+
+# Chargement du corpus depuis un fichier JSON (ou un corpus compilé, voir src/corpus_store.py)
 def load_corpus(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    if Path(path).is_dir():
+        from src.corpus_store import open_corpus, iter_documents
+        return list(iter_documents(open_corpus(Path(path))))
+    from src.decoding import load_corpus as decode_corpus_file
+    return decode_corpus_file(Path(path))
 
 
 # Chargement du modèle GLiNER depuis HuggingFace ou local
 def load_gliner(model_name: str = "knowledgator/gliner-bi-small-v1.0"):
+    import torch
+    from gliner import GLiNER
+
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"🔹 Chargement de GLiNER : {model_name} sur {device}")
     return GLiNER.from_pretrained(model_name, device=device)
@@ -33,15 +42,31 @@ def save_json(data, path: Path):
     with path.open("w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
+# Écriture atomique : chemin temporaire du même dossier, renommé en `path` à la sortie du bloc,
+# supprimé si le bloc échoue (le fichier existant reste intact)
+@contextmanager
+def atomic_path(path: Path, suffix: str = ".tmp"):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=suffix, dir=path.parent)
+    os.close(fd)
+    try:
+        yield Path(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
 # Chargement JSON
 import json
 from pathlib import Path
 from typing import List, Any
 
 def load_json(file_path: Path) -> Any:
-    """Charge un fichier JSON sans restrictions de type"""
-    with file_path.open("r", encoding="utf-8") as fh:
-        return json.load(fh)
+    """Charge un fichier JSON sans restrictions de type (orjson ; schémas typés : src/decoding.py)"""
+    from src.decoding import mapped
+    with mapped(file_path) as raw:
+        return orjson.loads(raw)
 
 def ensure_dir(path: Path):
     """
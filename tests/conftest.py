@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+# Les modules de src/ s'importent en "src.<module>" depuis la racine du dépôt ; ceux de
+# Conception_de_BD/ et data_factory/ sont des scripts qui s'importent entre eux par leur nom.
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "Conception_de_BD", ROOT / "data_factory"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+os.environ.setdefault("MPLBACKEND", "Agg")
@@ -0,0 +1,186 @@
+import random
+import itertools
+from collections import defaultdict
+
+import pandas as pd
+import pytest
+
+from src.config import ENTITY_TYPES
+from src.counts import match_spans, build_counts, macro_average, metrics_table_exact_partial, MODES
+from src.evaluate_intersection import evaluate_intersection
+from src.evaluate_union_indiv import evaluate_union
+from src.evaluation_indiv import evaluate_individual_synonyms
+
+THRESHOLD = 0.5
+
+
+# ════════════════════ RÉFÉRENCE : BOUCLES DES ÉVALUATEURS D'ORIGINE ════════════════════
+
+def baseline_match(gold: set, pred: set, threshold: float = THRESHOLD):
+    """Appariement des évaluateurs avant la table de comptages (exact puis partiel, glouton)."""
+    tp_ex = tp_pa = 0
+    matched_gold, matched_pred = set(), set()
+    for span in pred:
+        if span in gold:
+            tp_ex += 1
+            matched_gold.add(span)
+            matched_pred.add(span)
+    for span_p in pred - matched_pred:
+        for span_g in gold - matched_gold:
+            a, b = set(range(*span_p)), set(range(*span_g))
+            if len(a & b) / len(a | b) >= threshold:
+                tp_pa += 1
+                matched_gold.add(span_g)
+                matched_pred.add(span_p)
+                break
+    return tp_ex, tp_pa, len(pred - matched_pred), len(gold - matched_gold)
+
+
+def baseline_table(debug_data, corpus, strategy):
+    """{(code, label_set): (tp_exact, tp_partial, fp, fn, tn)} comme les évaluateurs d'origine."""
+    table = {}
+    for code, synonyms in ENTITY_TYPES.items():
+        by_syn = defaultdict(lambda: defaultdict(set))
+        for syn in synonyms:
+            for entry in debug_data.get(f"{code}__{syn}", []):
+                by_syn[syn][entry["text_id"]].add(tuple(entry["span"]))
+        tn = sum(len({tuple(e["spans"]) for e in doc["entities"] if e["code_entity"] != code}) for doc in corpus)
+        if strategy == "single":
+            label_sets = [(syn,) for syn in synonyms]
+        else:
+            label_sets = [c for k in range(2, len(synonyms) + 1) for c in itertools.combinations(synonyms, k)]
+        for combo in label_sets:
+            totals = [0, 0, 0, 0]
+            for doc in corpus:
+                gold = {tuple(e["spans"]) for e in doc["entities"] if e["code_entity"] == code}
+                if strategy == "combo":
+                    pred = {tuple(e["span"]) for e in debug_data.get(f"{code}__{'__'.join(combo)}", [])
+                            if e["text_id"] == doc["text_id"]}
+                else:
+                    sets = [by_syn[syn].get(doc["text_id"], set()) for syn in combo]
+                    pred = set.intersection(*sets) if strategy == "intersection" else set.union(*sets)
+                totals = [t + c for t, c in zip(totals, baseline_match(gold, pred))]
+            table[(code, "__".join(combo))] = (*totals, tn)
+    return table
+
+
+# ════════════════════ DONNÉES SYNTHÉTIQUES ════════════════════
+
+def synthetic_data(seed: int = 0, n_docs: int = 12):
+    """Corpus et prédictions aléatoires : spans exacts, décalés (partiels), chevauchants et faux."""
+    rng = random.Random(seed)
+    codes = list(ENTITY_TYPES)
+    corpus = []
+    for d in range(n_docs):
+        entities = []
+        for _ in range(rng.randint(0, 8)):
+            start = rng.randrange(0, 180)
+            entities.append({"code_entity": rng.choice(codes), "spans": [start, start + rng.randint(1, 12)],
+                             "entity": "x"})
+        corpus.append({"text_id": f"doc{d}", "text": "x" * 200, "entities": entities})
+
+    def predictions(code):
+        entries = []
+        for doc in corpus:
+            for ent in doc["entities"]:
+                if ent["code_entity"] != code or rng.random() < 0.3:
+                    continue
+                start, end = ent["spans"]
+                shift = rng.choice([0, 0, 1, -1, 3])
+                span = [max(0, start + shift), max(start + shift, 0) + (end - start) + rng.choice([0, 1, 2])]
+                entries.append({"text_id": doc["text_id"], "span": span})
+            for _ in range(rng.randint(0, 2)):
+                start = rng.randrange(0, 190)
+                entries.append({"text_id": doc["text_id"], "span": [start, start + rng.randint(1, 8)]})
+        return entries
+
+    debug_data = {}
+    for code, synonyms in ENTITY_TYPES.items():
+        for syn in synonyms:
+            debug_data[f"{code}__{syn}"] = predictions(code)
+        for k in range(2, len(synonyms) + 1):
+            for combo in itertools.combinations(synonyms, k):
+                debug_data[f"{code}__{'__'.join(combo)}"] = predictions(code)
+    return debug_data, corpus
+
+
+# ════════════════════ TESTS ════════════════════
+
+def test_match_spans_exact_then_partial():
+    gold = {(0, 10), (20, 30), (40, 44)}
+    pred = {(0, 10), (21, 30), (50, 60)}
+    assert match_spans(gold, pred, THRESHOLD) == (1, 1, 1, 1)
+
+
+def test_match_spans_gold_matched_once():
+    # deux prédictions recouvrent le même gold : un seul appariement partiel
+    assert match_spans({(10, 20)}, {(10, 19), (11, 20)}, THRESHOLD) == (0, 1, 1, 0)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_match_spans_matches_baseline_loop(seed):
+    rng = random.Random(seed)
+    gold = {(s, s + rng.randint(1, 10)) for s in (rng.randrange(0, 40) for _ in range(rng.randint(0, 8)))}
+    pred = {(s, s + rng.randint(1, 10)) for s in (rng.randrange(0, 40) for _ in range(rng.randint(0, 8)))}
+    assert match_spans(gold, pred, THRESHOLD) == baseline_match(gold, pred, THRESHOLD)
+
+
+@pytest.mark.parametrize("strategy", ["single", "union", "intersection", "combo"])
+def test_build_counts_matches_baseline(strategy):
+    debug_data, corpus = synthetic_data()
+    counts = build_counts(debug_data, corpus, strategy, threshold=THRESHOLD, min_k=2)
+    reference = baseline_table(debug_data, corpus, strategy)
+
+    assert set(counts["mode"].astype(str)) == set(MODES)
+    summed = counts.groupby(["entity_type", "label_set", "mode"], observed=True)[["TP", "FP", "FN"]].sum()
+    for (code, label_set), (tp_ex, tp_pa, fp, fn, _) in reference.items():
+        assert tuple(summed.loc[(code, label_set, "exact")]) == (tp_ex, fp, fn)
+        assert tuple(summed.loc[(code, label_set, "partial")]) == (tp_ex + tp_pa, fp, fn)
+
+
+@pytest.mark.parametrize("evaluator, strategy, label_column", [
+    (evaluate_individual_synonyms, "single", "synonym"),
+    (evaluate_union, "union", "combo"),
+    (evaluate_intersection, "intersection", "combo"),
+])
+def test_evaluator_output_matches_baseline(evaluator, strategy, label_column):
+    debug_data, corpus = synthetic_data(seed=1)
+    df = evaluator(debug_data, corpus)
+    reference = baseline_table(debug_data, corpus, strategy)
+
+    assert len(df) == len(reference)
+    for row in df.itertuples(index=False):
+        tp_ex, tp_pa, fp, fn, tn = reference[(row.entity_type, getattr(row, label_column))]
+        tp = tp_ex + tp_pa
+        assert (row.TP, row.FP, row.FN, row.TN) == (tp, fp, fn, tn)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        assert (row.precision, row.recall, row.f1) == pytest.approx((precision, recall, f1), abs=1e-6)
+
+
+def test_combo_exact_partial_table_matches_baseline():
+    debug_data, corpus = synthetic_data(seed=2)
+    df = metrics_table_exact_partial(build_counts(debug_data, corpus, "combo", threshold=THRESHOLD))
+    reference = baseline_table(debug_data, corpus, "combo")
+
+    assert len(df) == len(reference)
+    for row in df.itertuples(index=False):
+        tp_ex, tp_pa, fp, fn, _ = reference[(row.entity_type, row.combo)]
+        # mode exact : FP/FN après appariement partiel, comme l'évaluateur d'origine
+        for tp, suffix in ((tp_ex, "exact"), (tp_ex + tp_pa, "partial")):
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            assert getattr(row, f"precision_{suffix}") == pytest.approx(precision, abs=1e-4)
+            assert getattr(row, f"recall_{suffix}") == pytest.approx(recall, abs=1e-4)
+
+
+def test_macro_average_is_mean_of_document_scores():
+    counts = pd.DataFrame({
+        "entity_type": ["DISO"] * 4, "label_set": ["a", "a", "b", "b"], "mode": ["partial"] * 4,
+        "TP": [1, 0, 2, 2], "FP": [1, 0, 0, 2], "FN": [0, 2, 0, 0], "TN": [0] * 4,
+    })
+    macro = macro_average(counts).set_index("label_set")
+    # a : documents (P 0.5, R 1, F1 2/3) et (0, 0, 0) ; b : (1, 1, 1) et (0.5, 1, 2/3)
+    assert macro.loc["a", ["precision", "recall", "f1"]].tolist() == pytest.approx([0.25, 0.5, 1 / 3], abs=1e-6)
+    assert macro.loc["b", ["precision", "recall", "f1"]].tolist() == pytest.approx([0.75, 1.0, 5 / 6], abs=1e-6)
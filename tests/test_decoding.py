@@ -0,0 +1,67 @@
+import json
+
+import orjson
+import pytest
+
+from src.decoding import section_index, load_predictions, load_corpus, LazySections
+
+
+def prediction(text_id: str, start: int, end: int, text: str = "x") -> dict:
+    return {"text_id": text_id, "text": text, "span": [start, end], "entity_text": text[start:end], "label": "l"}
+
+
+# chaînes piégeuses pour le repérage des sections : guillemets échappés, crochets, accolades, unicode
+TRICKY = 'a "quoted" [bracket] {brace} \\ back\\slash ] } é ✓'
+PREDICTIONS = {
+    "DISO__disease": [prediction("t1", 0, 3, TRICKY), prediction("t2", 2, 5)],
+    "DISO__a [b]": [],
+    'CHEM__"drug"': [prediction("t1", 1, 4, TRICKY)],
+}
+
+
+@pytest.mark.parametrize("indent", [False, True])
+def test_section_index_bounds_parse_to_each_value(indent):
+    data = json.dumps(PREDICTIONS, indent=2 if indent else None, ensure_ascii=False).encode("utf-8")
+    index = section_index(data)
+    assert list(index) == list(PREDICTIONS)
+    for key, (start, end) in index.items():
+        assert orjson.loads(data[start:end]) == PREDICTIONS[key]
+
+
+def test_lazy_sections_match_full_decoding(tmp_path):
+    path = tmp_path / "debug_combinations.json"
+    path.write_text(json.dumps(PREDICTIONS, ensure_ascii=False), encoding="utf-8")
+    full = load_predictions(path)
+    lazy = LazySections(path)
+    assert list(lazy) == list(full)
+    assert {key: lazy[key] for key in lazy} == full
+    assert (tmp_path / "debug_combinations.json.index.json").exists()
+
+    # fichier modifié : l'index en cache est recalculé
+    path.write_text(json.dumps({"PHYS__x": [prediction("t3", 0, 1)]}), encoding="utf-8")
+    assert list(LazySections(path)) == ["PHYS__x"]
+
+
+def test_schema_errors_name_the_record(tmp_path):
+    path = tmp_path / "debug.json"
+    path.write_text(json.dumps({"DISO__d": [prediction("t1", 0, 1), {"text_id": "t2", "span": [0, 1]}]}),
+                    encoding="utf-8")
+    with pytest.raises(ValueError, match=r"DISO__d\[1\].*'text'"):
+        load_predictions(path)
+
+    path.write_text(json.dumps({"DISO__d": [{**prediction("t1", 0, 1), "span": [0, "1"]}]}), encoding="utf-8")
+    with pytest.raises(ValueError, match=r"DISO__d\[0\]"):
+        load_predictions(path)
+
+
+def test_load_corpus(tmp_path):
+    corpus = [{"text_id": "t1", "text": "fever", "entities": [{"code_entity": "DISO", "spans": [0, 5],
+                                                                "entity": "fever"}]}]
+    path = tmp_path / "fulldata.json"
+    path.write_text(json.dumps(corpus), encoding="utf-8")
+    assert load_corpus(path) == corpus
+
+    corpus[0]["entities"][0]["spans"] = [0]
+    path.write_text(json.dumps(corpus), encoding="utf-8")
+    with pytest.raises(ValueError, match=r"entities\[0\]"):
+        load_corpus(path)
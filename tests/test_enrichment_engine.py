@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from enrichment_engine import read_jsonl, append_jsonl, write_json_atomic
+
+
+def test_read_jsonl_skips_truncated_last_line(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    with path.open("w", encoding="utf-8") as f:
+        append_jsonl(f, {"kb_id": "K1", "definition": "é"})
+        append_jsonl(f, {"kb_id": "K2", "definition": "b"})
+        f.write('{"kb_id": "K3", "defin')  # arrêt brutal en cours d'écriture
+    assert read_jsonl(path) == [{"kb_id": "K1", "definition": "é"}, {"kb_id": "K2", "definition": "b"}]
+
+
+def test_read_jsonl_missing_file(tmp_path):
+    assert read_jsonl(tmp_path / "absent.jsonl") == []
+
+
+def test_write_json_atomic_replaces_and_cleans_up(tmp_path):
+    path = tmp_path / "kb.json"
+    path.write_text("[]", encoding="utf-8")
+    write_json_atomic([{"kb_id": "K1"}], path)
+    assert json.loads(path.read_text(encoding="utf-8")) == [{"kb_id": "K1"}]
+
+    with pytest.raises(TypeError):
+        write_json_atomic([object()], path)  # non sérialisable : l'ancien fichier reste intact
+    assert json.loads(path.read_text(encoding="utf-8")) == [{"kb_id": "K1"}]
+    assert [p.name for p in tmp_path.iterdir()] == ["kb.json"]
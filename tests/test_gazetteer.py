@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from src.gazetteer import normalize, kb_patterns, build_automaton, find_matches, leftmost_longest
+
+WORDS = ["heart", "failure", "art", "heart failure", "acute heart failure", "he", "ear", "rt", "fail"]
+
+
+def _word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def brute_force(keys: list, text: str) -> set:
+    """Toutes les occurrences de chaque motif, vérifiées une à une aux frontières de mots."""
+    norm = normalize(text)
+    found = set()
+    for pid, key in enumerate(keys):
+        start = norm.find(key)
+        while start != -1:
+            end = start + len(key)
+            left_ok = start == 0 or not (_word(norm[start - 1]) and _word(norm[start]))
+            right_ok = end == len(norm) or not (_word(norm[end]) and _word(norm[end - 1]))
+            if left_ok and right_ok:
+                found.add((start, end, pid))
+            start = norm.find(key, start + 1)
+    return found
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_aho_corasick_matches_brute_force(seed):
+    rng = random.Random(seed)
+    automaton = build_automaton({w: [("DISO", f"K{i}")] for i, w in enumerate(WORDS)})
+    text = "".join(rng.choice(["heart", " ", "failure", "Heart", "-", "art", "ear", "s", ".", "acute "])
+                   for _ in range(60))
+    assert set(find_matches(automaton, text)) == brute_force(automaton["keys"], text)
+
+
+def test_matches_respect_word_boundaries_and_case():
+    automaton = build_automaton({"art": [("DISO", "K1")], "heart failure": [("DISO", "K2")]})
+    matches = {(s, e) for s, e, _ in find_matches(automaton, "Heart Failure; art, hearts")}
+    assert matches == {(0, 13), (15, 18)}
+
+
+def test_leftmost_longest_drops_nested_matches():
+    assert leftmost_longest([(6, 13, 1), (0, 13, 0), (0, 5, 2), (14, 18, 3)]) == [(0, 13, 0), (14, 18, 3)]
+
+
+def test_kb_patterns_keeps_every_owner():
+    kb = [{"kb_id": "K1", "label": "Cold", "type": "DISO", "synonyms": ["common cold"]},
+          {"kb_id": "K2", "label": "cold", "type": "PHYS"}]
+    patterns = kb_patterns(kb)
+    assert patterns["cold"] == [("DISO", "K1"), ("PHYS", "K2")]
+    assert patterns["common cold"] == [("DISO", "K1")]
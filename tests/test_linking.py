@@ -0,0 +1,32 @@
+from src.linking import build_index, link_mentions
+
+KB = [
+    {"kb_id": "K1", "label": "seizure", "type": "DISO", "synonyms": ["epileptic seizure"]},
+    {"kb_id": "K2", "label": "aspirin", "type": "CHEM", "synonyms": []},
+    {"kb_id": "K3", "label": "cold", "type": "DISO", "synonyms": []},
+    {"kb_id": "K4", "label": "cold", "type": "PHYS", "synonyms": []},
+]
+
+
+def test_exact_then_fuzzy():
+    linked = link_mentions(build_index(KB), ["Aspirin", "seizures"], ["CHEM", "DISO"])
+    assert linked["kb_id"].tolist() == ["K2", "K1"]
+    assert linked["method"].tolist() == ["exact", "fuzzy"]
+
+
+def test_exact_link_respects_type():
+    linked = link_mentions(build_index(KB), ["cold", "cold"], ["PHYS", "DISO"])
+    assert linked["kb_id"].tolist() == ["K4", "K3"]
+
+
+def test_surface_of_other_type_is_not_linked_exactly():
+    linked = link_mentions(build_index(KB), ["aspirin"], ["DISO"], min_score=0.99)
+    assert linked["method"].tolist() == ["none"]
+
+
+def test_min_score_zero_leaves_unmatched_mentions_unlinked():
+    # aucun n-gramme commun : meilleur score 0, liste de candidats vide
+    linked = link_mentions(build_index(KB), ["zzqq", "seizures"], ["DISO", "DISO"], min_score=0)
+    assert linked["method"].tolist() == ["none", "fuzzy"]
+    assert linked["candidates"].iloc[0] == []
+    assert linked["kb_id"].iloc[1] == "K1"
@@ -0,0 +1,32 @@
+import json
+from collections import Counter
+
+from ner_transform import rewrite_example, load_mapping, transform_file
+
+
+def test_rewrite_example_replaces_known_labels_only():
+    stats = Counter()
+    example = {"tokenized_text": ["a", "b"], "ner": [[0, 0, "DISO"], [1, 1, "UNKNOWN"], [0, 1, "DISO"]]}
+    out = rewrite_example(example, {"DISO": "disease"}, stats)
+    assert out["ner"] == [[0, 0, "disease"], [1, 1, "UNKNOWN"], [0, 1, "disease"]]
+    assert out["tokenized_text"] == ["a", "b"]
+    assert example["ner"][0][2] == "DISO"  # l'exemple d'origine n'est pas modifié
+    assert stats == {"DISO": 2, "<unchanged>": 1}
+
+
+def test_load_mapping_picks_synonym(tmp_path):
+    path = tmp_path / "mapping.json"
+    path.write_text(json.dumps({"DISO": ["disease", "disorder"], "CHEM": "chemical", "PHYS": []}), encoding="utf-8")
+    assert load_mapping(path, pick=1) == {"DISO": "disorder", "CHEM": "chemical", "PHYS": "PHYS"}
+    assert load_mapping(path, pick=5)["DISO"] == "disorder"
+
+
+def test_transform_file_in_place(tmp_path):
+    path = tmp_path / "shard.jsonl"
+    records = [{"ner": [[0, 1, "DISO"]]}, {"ner": []}]
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    stats = transform_file(path, path, {"DISO": "disease"})
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert lines == [{"ner": [[0, 1, "disease"]]}, {"ner": []}]
+    assert stats["<examples>"] == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["shard.jsonl"]  # aucun fichier temporaire laissé
@@ -0,0 +1,87 @@
+import json
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.overlap import jaccard_matrix, approximate_overlap, spans_by_label_set
+
+
+def random_spans(seed: int = 0, n_sets: int = 12, n_spans: int = 60):
+    """Ensembles de labels tirés d'un vivier commun de spans, avec des quasi-doublons."""
+    rng = random.Random(seed)
+    pool = [(f"doc{rng.randrange(5)}", s, s + rng.randint(1, 6)) for s in rng.sample(range(500), n_spans)]
+    spans = {}
+    for i in range(n_sets):
+        base = rng.sample(pool, rng.randint(5, 40))
+        spans[f"set{i}"] = base
+        if i % 3 == 0:  # quasi-doublon : même ensemble, un span en moins
+            spans[f"set{i}_near"] = base[1:]
+    return spans
+
+
+def brute_force_jaccard(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def test_jaccard_matrix_matches_brute_force():
+    spans = random_spans()
+    df = jaccard_matrix(spans)
+    for a in spans:
+        for b in spans:
+            assert df.loc[a, b] == pytest.approx(brute_force_jaccard(spans[a], spans[b]))
+
+
+def test_spans_differ_across_documents():
+    df = jaccard_matrix({"a": [("doc1", 0, 5)], "b": [("doc2", 0, 5)]})
+    assert df.loc["a", "b"] == 0.0
+
+
+def test_jaccard_matrix_diagonal_is_set_before_dataframe():
+    # avec pandas >= 3 (copy-on-write), le tableau derrière un DataFrame est en lecture seule
+    df = jaccard_matrix({"a": [("d", 0, 1)], "b": [], "c": [("d", 0, 1), ("d", 2, 3)]}, diagonal=1.0)
+    assert np.diag(df.to_numpy()).tolist() == [1.0, 1.0, 1.0]
+    assert df.loc["a", "c"] == 0.5
+
+
+def test_minhash_pairs_agree_with_exact_jaccard():
+    spans = random_spans(seed=3)
+    cutoff = 0.5
+    exact = jaccard_matrix(spans)
+    names = list(spans)
+    truth = {(a, b) for i, a in enumerate(names) for b in names[i + 1:] if exact.loc[a, b] >= cutoff}
+
+    approx = approximate_overlap(spans, cutoff=cutoff, num_perm=256, verify=True)
+    found = set(zip(approx["label_a"], approx["label_b"]))
+    assert found <= truth  # verify=True : aucune paire sous le seuil exact
+    assert len(found) >= 0.9 * len(truth)
+    assert (approx["jaccard_exact"] - approx["jaccard_est"]).abs().max() < 0.15
+
+
+def test_overlap_combinations_runs(tmp_path, monkeypatch):
+    import src.overlap_combinations as oc
+
+    debug = {
+        "DISO__a__b": [{"text_id": "t1", "text": "x", "span": [0, 3], "entity_text": "x", "label": "a"}],
+        "DISO__a__c": [{"text_id": "t1", "text": "x", "span": [0, 3], "entity_text": "x", "label": "a"},
+                       {"text_id": "t2", "text": "x", "span": [4, 9], "entity_text": "x", "label": "c"}],
+        "DISO__b__c": [],
+    }
+    path = tmp_path / "debug_combinations.json"
+    path.write_text(json.dumps(debug), encoding="utf-8")
+    monkeypatch.setattr(oc, "DEBUG_COMBINATIONS_FILE", path)
+    monkeypatch.setattr(oc, "COMBINATIONS_OUT_DIR", tmp_path)
+    monkeypatch.setattr(oc, "ENTITY_TYPES", {"DISO": ["a", "b", "c"]})
+
+    oc.main()
+    df = pd.read_excel(tmp_path / "jaccard_matrix_DISO.xlsx", index_col=0)
+    assert np.diag(df.to_numpy()).tolist() == [1.0, 1.0, 1.0]
+    assert (tmp_path / "heatmap_DISO.png").exists()
+
+
+def test_spans_by_label_set_keeps_file_order():
+    debug = {"DISO__b": [], "CHEM__x": [], "DISO__a": [{"text_id": "t", "span": [1, 2]}]}
+    assert list(spans_by_label_set(debug, "DISO")) == ["b", "a"]
+    assert spans_by_label_set(debug, "DISO")["a"] == [("t", 1, 2)]